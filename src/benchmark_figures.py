@@ -0,0 +1,110 @@
+import os
+import time
+import argparse
+import numpy as np
+import map as dashboard
+from utils.FigurePool import FigurePool
+
+# wall time of drawing the charts after a filter change, built one after another in the callback
+# and at the same time in figure pools of several sizes, and the pool's dispatch overhead, the
+# round trip of a figure that is not spent building it. also the time a new worker takes to start
+# and load the dataset, and the memory of each worker that is private to it and that it shares
+# with the other processes, e.g. the memory mapped dataset files (linux only)
+#
+#   python src/benchmark_figures.py [--workers 1 2 4] [--repeat 5]
+
+
+###############################################################################
+# measure
+no_click = {'data': None, 'trigger': None}
+
+
+def interaction_tasks(year_range):
+    # every chart of a change of the year slider
+    filters = (year_range, None, None, None, None, None, None, 'keyword')
+    return dashboard.chart_tasks(dashboard.default_map_state, no_click, False, filters, 'attacks', [], set(), [])
+
+
+def noop():
+    return None
+
+
+def measure(pool, year_ranges, repeat):
+    dashboard.figure_pool = pool
+    # the first round starts the workers and fills their caches
+    for year_range in year_ranges:
+        dashboard.build_charts(interaction_tasks(year_range))
+
+    wall_times = []
+    for _ in range(repeat):
+        for year_range in year_ranges:
+            start = time.perf_counter()
+            dashboard.build_charts(interaction_tasks(year_range))
+            wall_times.append(time.perf_counter() - start)
+    return np.median(wall_times)
+
+
+def worker_memory():
+    # private and shared memory of the calling process in MB
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split()[:2] for line in f if line.endswith(' kB\n'))
+    except OSError:
+        return None
+    private = int(fields['Private_Clean:']) + int(fields['Private_Dirty:'])
+    shared = int(fields['Shared_Clean:']) + int(fields['Shared_Dirty:'])
+    return os.getpid(), private / 1024, shared / 1024
+
+
+def workers_memory(pool):
+    # median over the workers that ran one of the tasks
+    results = pool.run(pool.version, {i: (worker_memory, ()) for i in range(pool.workers)})
+    memory = {result[0]: result[1:] for result in results.values() if result is not None}
+    return np.median(list(memory.values()), axis=0) if memory else (np.nan, np.nan)
+
+
+def startup_time(pool):
+    # the first call of a new pool waits for a worker to start and load the dataset
+    start = time.perf_counter()
+    pool.run(pool.version, {'noop': (noop, ())})
+    return time.perf_counter() - start
+
+
+def dispatch_overhead(pool, repeat):
+    # round trip of a task that does nothing
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pool.run(pool.version, {'noop': (noop, ())})
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+def run(workers, repeat):
+    dashboard.create_app()
+    dataset = dashboard.wait_until_loaded()
+    year_ranges = [[year, dataset.year_max] for year in range(dataset.year_min, dataset.year_max, 10)]
+
+    print(f'{os.cpu_count()} cores, {len(year_ranges)} filter states, {repeat} repeats')
+    print(f'{"workers":<10}{"wall ms":>10}{"build ms":>10}{"overhead ms":>13}{"noop ms":>10}'
+          f'{"startup ms":>12}{"private MB":>12}{"shared MB":>11}')
+    sequential = measure(FigurePool(0), year_ranges, repeat)
+    print(f'{"callback":<10}{sequential * 1000:>10.1f}')
+    for n in workers:
+        pool = FigurePool(n, initializer=dashboard.init_figure_worker)
+        pool.get_executor(dataset.version)
+        startup = startup_time(pool)
+        wall_time = measure(pool, year_ranges, repeat)
+        summary = pool.summary()
+        private, shared = workers_memory(pool)
+        print(f'{n:<10}{wall_time * 1000:>10.1f}{summary["build_ms"]:>10.1f}{summary["overhead_ms"]:>13.1f}'
+              f'{dispatch_overhead(pool, repeat) * 1000:>10.1f}{startup * 1000:>12.1f}{private:>12.1f}{shared:>11.1f}')
+        pool.executor.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure building the charts in parallel worker processes.')
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, os.cpu_count()}))
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.workers, args.repeat)
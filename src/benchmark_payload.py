@@ -0,0 +1,95 @@
+import time
+import json
+import gzip
+import base64
+import argparse
+import brotli
+import numpy as np
+from plotly.io.json import to_json_plotly
+import map as dashboard
+import utils.Figures as figures
+from constants import default
+
+# bytes on the wire and parse time of the heatmap and beeswarm figures, with and without typed
+# arrays and per compression algorithm. figures are serialized like dash serializes callback
+# responses and compressed at the levels the server is configured with
+#
+#   python src/benchmark_payload.py [--repeat 5]
+
+
+###############################################################################
+# figures
+def build_heatmap(year_range):
+    # zoomed in far enough to draw the attacks rather than the country totals
+    map_state = {'zoom': default.rollup_zoom.value, 'center': dict(lat=default.lat.value, lon=default.lon.value)}
+    return dashboard.build_map_heatmap(map_state, {'data': None, 'trigger': None}, False, year_range, None,
+                                       None, None, None, None, None, 'keyword', 'attacks', [])
+
+
+def build_beeswarm(year_range):
+    return dashboard.build_chart_beeswarm({'data': None, 'trigger': None}, year_range, None, None, None, None, None, None,
+                                          'keyword')
+
+
+###############################################################################
+# measure
+def decode_typed_arrays(value):
+    # what plotly.js does on the client, a typed array view on the decoded bytes
+    if isinstance(value, dict):
+        if 'bdata' in value and 'dtype' in value:
+            return np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+        return {k: decode_typed_arrays(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode_typed_arrays(v) for v in value]
+    return value
+
+
+def compress(body, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(body, quality=config['COMPRESS_BR_LEVEL'])
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=config['COMPRESS_LEVEL'])
+    return body
+
+
+def decompress(body, encoding):
+    if encoding == 'br':
+        return brotli.decompress(body)
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    return body
+
+
+def measure(body, encoding, config, repeat):
+    compressed = compress(body, encoding, config)
+    parse_times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        decode_typed_arrays(json.loads(decompress(compressed, encoding)))
+        parse_times.append(time.perf_counter() - t)
+    return len(compressed), np.median(parse_times)
+
+
+def run(repeat):
+    app = dashboard.create_app()
+    dataset = dashboard.wait_until_loaded()
+    year_range = [dataset.year_min, dataset.year_max]
+
+    encode_figure = figures.encode_figure
+    print(f'{"figure":<10}{"arrays":<8}{"encoding":<10}{"bytes":>12}{"parse ms":>10}')
+    for name, build in [('heatmap', build_heatmap), ('beeswarm', build_beeswarm)]:
+        for arrays in ['json', 'typed']:
+            # json figures are the figure dicts as they were before typed arrays
+            figures.encode_figure = encode_figure if arrays == 'typed' else (lambda fig: fig)
+            body = to_json_plotly(build(year_range)).encode('utf-8')
+            for encoding in ['identity', 'gzip', 'br']:
+                size, parse_time = measure(body, encoding, app.server.config, repeat)
+                print(f'{name:<10}{arrays:<8}{encoding:<10}{size:>12,}{parse_time * 1000:>10.1f}')
+    figures.encode_figure = encode_figure
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure figure response sizes and parse times.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.repeat)
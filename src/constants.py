@@ -28,6 +28,10 @@ class default(Enum):
     highlight_opacity = 0.8
     highlight_color = f'rgba(61, 134, 215, {highlight_opacity})' # blue
     highlight_color_group = f'rgba(80, 163, 21, {highlight_opacity})'
+    similar_opacity = 0.9
+    similar_color = f'rgba(245, 166, 35, {similar_opacity})' # orange
+    similar_size = 8
+    similar_count = 5
     background_opacity = 0.5
     background_color = f'rgba(214, 227, 254, {background_opacity})' # light blue
     background_color_group = f'rgba(186, 204, 181, {background_opacity})'
@@ -45,6 +49,52 @@ class default(Enum):
     lat = 16.5
     lon = 10.4
 
+    # search
+    search_top_k = 500
+
+    # prefetch
+    prefetch_workers = 2
+    prefetch_max_pending = 16
+    prefetch_cpu_budget = 0.25 # share of one core
+
+    # playback
+    playback_cell_size = 0.25 # degrees
+    playback_frame_duration = 500 # ms
+
+    # export
+    export_chunk_size = 10000 # rows
+
+    # figures of an interaction built in parallel by this many worker processes, 0 builds them in the callback.
+    # every worker loads the dataset, sharing the memory mapped columns and neighbours but not the frames
+    # and indexes derived from them, so memory grows with the workers, and has its own cache, so a filter
+    # is computed again in each worker that builds a chart of it
+    figure_workers = 0
+
+    # query api
+    api_page_size = 100 # rows
+    api_max_page_size = 1000 # rows
+    api_max_batch = 50 # queries
+
+    # progressive rendering, results with more rows are drawn coarse first
+    progressive_rows = 50000
+    coarse_cell_size = 1.0 # degrees
+    coarse_sample_size = 5000 # rows
+    coarse_outliers = 50 # rows per target type
+
+    # group scatter, groups with fewer attacks are drawn as cells of a log grid
+    scatter_min_attacks = 10
+    scatter_cells_per_decade = 4
+
+    # map, below this zoom the attacks are drawn as totals per country
+    rollup_zoom = 2.5
+    rollup_max_size = 40 # px
+
+    # timeline, ranges of fewer years are shown per week rather than per month
+    timeline_week_years = 5
+
+    # reload
+    reload_interval = 10 # s between checks for a new dataset version
+
     # predefined dictionaries
     title_dict = dict(
         color=font_color,
@@ -0,0 +1,250 @@
+from utils.Cleaning import *
+from utils.Jitter import *
+from utils.Artifact import *
+from utils.Search import *
+from utils.Embedding import *
+from utils.Neighbours import *
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+
+# reproducible replacement for data_cleaning.ipynb:
+#   python src/etl.py [--data-dir src/data] [--chunksize 50000] [--full]
+#
+# stages are skipped when their input fingerprint is unchanged, and the raw export is
+# partitioned by year so that only new or changed years are cleaned again
+
+# bump when the output of a stage changes for the same input
+stage_versions = {
+    'partition': 1,
+    'artifact': 3,
+    'search': 1,
+    'embeddings': 1,
+    'neighbours': 1,
+}
+
+text_columns = ['summary', 'motive', 'scite1', 'target1', 'corp1']
+
+# width of the similar attacks graph
+n_neighbours = 10
+
+
+###############################################################################
+# fingerprints
+def fingerprint_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint_stage(stage, *inputs):
+    digest = hashlib.sha256(f'{stage}:{stage_versions[stage]}'.encode())
+    for value in inputs:
+        digest.update(json.dumps(value, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def read_raw_chunks(raw_path, chunksize, **kwargs):
+    return pd.read_csv(raw_path, encoding='ISO-8859-1', dtype=str, chunksize=chunksize, **kwargs)
+
+
+def fingerprint_years(raw_path, chunksize):
+    # order independent hash of the raw text of every row, per year
+    years = {}
+    for chunk in read_raw_chunks(raw_path, chunksize, keep_default_na=False):
+        row_hashes = pd.Series(pd.util.hash_pandas_object(chunk, index=False).to_numpy(),
+                               index=chunk['iyear'].astype(int).to_numpy())
+        grouped = row_hashes.groupby(level=0)
+        for year, n, h in zip(grouped.size().index, grouped.size(), grouped.sum()):
+            previous = years.get(str(year), dict(rows=0, hash=0))
+            years[str(year)] = dict(rows=previous['rows'] + int(n), hash=(previous['hash'] + int(h)) % (1 << 64))
+    return years
+
+
+###############################################################################
+# stages
+def stage_partition(manifest, raw_path, partition_path, chunksize, full):
+    partition_file = lambda year: os.path.join(partition_path, f'{year}.pkl')
+
+    fingerprint = fingerprint_stage('partition', fingerprint_file(raw_path))
+    previous = manifest.get('partition', {})
+    if (not full and previous.get('fingerprint') == fingerprint
+            and all(os.path.exists(partition_file(year)) for year in previous['years'])):
+        return False
+
+    years = fingerprint_years(raw_path, chunksize)
+    previous_years = {} if full else previous.get('years', {})
+
+    # only new or changed years are cleaned again
+    changed_years = [year for year, fp in years.items()
+                     if previous_years.get(year) != fp or not os.path.exists(partition_file(year))]
+    removed_years = [year for year in previous_years if year not in years]
+    print(f'partition: {len(changed_years)} changed years, {len(removed_years)} removed years')
+
+    os.makedirs(partition_path, exist_ok=True)
+    for year in removed_years:
+        if os.path.exists(partition_file(year)):
+            os.remove(partition_file(year))
+
+    if changed_years:
+        parts = {year: [] for year in changed_years}
+        changed_years_int = [int(year) for year in changed_years]
+        for chunk in read_raw_chunks(raw_path, chunksize):
+            chunk = chunk[chunk['iyear'].astype(int).isin(changed_years_int)]
+            if chunk.shape[0] == 0:
+                continue
+            chunk = clean_chunk(chunk)
+            for year, part in chunk.groupby('iyear'):
+                parts[str(int(year))].append(part)
+
+        for year, year_parts in parts.items():
+            df_year = pd.concat(year_parts, ignore_index=True)
+            violations = count_criterion_violations(df_year)
+            if violations > 0:
+                print(f'partition: {violations} attacks in {year} satisfy less than 2 criterias')
+            df_year.to_pickle(partition_file(year))
+
+    manifest['partition'] = dict(fingerprint=fingerprint, years=years)
+    return True
+
+
+def stage_artifact(manifest, partition_path, flags_path, population_path, artifact_path, full):
+    fingerprint = fingerprint_stage('artifact', manifest['partition']['years'],
+                                    fingerprint_file(flags_path), fingerprint_file(population_path))
+    if not full and manifest.get('artifact', {}).get('fingerprint') == fingerprint and os.path.exists(artifact_path):
+        return False
+
+    years = sorted(manifest['partition']['years'], key=int)
+    df = pd.concat([pd.read_pickle(os.path.join(partition_path, f'{year}.pkl')) for year in years], ignore_index=True)
+    df = df.sort_values('eventid', kind='stable').reset_index(drop=True)
+
+    df = add_derived_columns(df)
+
+    # jitter is hash seeded by eventid, so it is computed once here and stable across builds
+    df = add_jitter_coordinates(df, "latitude", "longitude", "latitude_jitter", "longitude_jitter")
+    df = add_jitter_beeswarm(df, jitter_amount=0.2)
+
+    # country dimension and (country, year) population, joined here instead of at runtime
+    df_countries_flags = pd.read_csv(flags_path)
+    countries, df['country_id'] = build_country_dimension(df, df_countries_flags)
+    df = df.drop(columns=['country_txt', 'region_txt'])
+
+    df_pop = pd.read_csv(population_path)
+    population_years = np.arange(df['iyear'].min(), df['iyear'].max() + 1, dtype=np.int16)
+    population = build_population_array(countries, df_pop, population_years)
+
+    write_artifact(df, artifact_path, text_columns, version=fingerprint[:16],
+                   tables=dict(countries=countries),
+                   arrays=dict(population=population, population_years=population_years))
+
+    manifest['artifact'] = dict(fingerprint=fingerprint)
+    return True
+
+
+def stage_search(manifest, artifact_path, search_path, full):
+    version = read_artifact_manifest(artifact_path)['version']
+    fingerprint = fingerprint_stage('search', version)
+    if not full and manifest.get('search', {}).get('fingerprint') == fingerprint and read_search_manifest(search_path):
+        return False
+
+    # tfidf over attack summaries, fitted once here instead of per query
+    summaries = read_artifact_text(artifact_path).read_column('summary')
+    with building_directory(search_path) as tmp_path:
+        build_search_index(summaries, tmp_path, version)
+
+    manifest['search'] = dict(fingerprint=fingerprint)
+    return True
+
+
+def stage_embeddings(manifest, artifact_path, embedding_path, encoder_name, full):
+    version = read_artifact_manifest(artifact_path)['version']
+    fingerprint = fingerprint_stage('embeddings', version, encoder_name)
+    if not full and manifest.get('embeddings', {}).get('fingerprint') == fingerprint and read_embedding_manifest(embedding_path):
+        return False
+
+    try:
+        encoder = get_encoder(encoder_name)
+    except ImportError as e:
+        print(f'embeddings: encoder {encoder_name} is not available ({e})')
+        return False
+
+    # summary vectors and an ivf index over them, encoded once here instead of per query
+    summaries = read_artifact_text(artifact_path).read_column('summary')
+    with building_directory(embedding_path) as tmp_path:
+        embeddings = build_embeddings(summaries, encoder, tmp_path, version)
+        build_ivf_index(embeddings, tmp_path)
+
+    manifest['embeddings'] = dict(fingerprint=fingerprint)
+    return True
+
+
+def stage_neighbours(manifest, artifact_path, neighbours_path, full):
+    version = read_artifact_manifest(artifact_path)['version']
+    fingerprint = fingerprint_stage('neighbours', version, n_neighbours, feature_weights)
+    if not full and manifest.get('neighbours', {}).get('fingerprint') == fingerprint and read_knn_manifest(neighbours_path):
+        return False
+
+    # similar attacks by location, date, attack, weapon and target type and casualties
+    df = read_artifact(artifact_path)
+    features = build_event_features(df)
+    neighbours, distances = build_knn_graph(features, n_neighbours)
+    with building_directory(neighbours_path) as tmp_path:
+        write_knn_graph(neighbours, distances, tmp_path, version)
+
+    manifest['neighbours'] = dict(fingerprint=fingerprint)
+    return True
+
+
+###############################################################################
+# run pipeline
+def run(data_dir, chunksize, encoder_name, full):
+    raw_path = os.path.join(data_dir, 'globalterrorism_2020.csv')
+    flags_path = os.path.join(data_dir, 'countries_flags_cleaned.csv')
+    population_path = os.path.join(data_dir, 'population_cleaned.csv')
+    etl_path = os.path.join(data_dir, 'etl')
+    partition_path = os.path.join(etl_path, 'years')
+    artifact_path = os.path.join(data_dir, 'artifact')
+    search_path = os.path.join(data_dir, 'search')
+    embedding_path = os.path.join(data_dir, 'embeddings')
+    neighbours_path = os.path.join(data_dir, 'neighbours')
+    manifest_path = os.path.join(etl_path, 'manifest.json')
+
+    manifest = {}
+    if os.path.exists(manifest_path) and not full:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    if full:
+        shutil.rmtree(partition_path, ignore_errors=True)
+
+    stages = [('partition', lambda: stage_partition(manifest, raw_path, partition_path, chunksize, full)),
+              ('artifact', lambda: stage_artifact(manifest, partition_path, flags_path, population_path, artifact_path, full)),
+              ('search', lambda: stage_search(manifest, artifact_path, search_path, full)),
+              ('embeddings', lambda: stage_embeddings(manifest, artifact_path, embedding_path, encoder_name, full)),
+              ('neighbours', lambda: stage_neighbours(manifest, artifact_path, neighbours_path, full))]
+    for name, stage in stages:
+        start = time.perf_counter()
+        ran = stage()
+        print(f"{name}: {'done' if ran else 'skipped'} in {time.perf_counter() - start:.2f}s")
+
+        # keep progress so an interrupted run resumes after the last finished stage
+        os.makedirs(etl_path, exist_ok=True)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the dataset artifact used by the app from the raw GTD export.')
+    parser.add_argument('--data-dir', default='src/data')
+    parser.add_argument('--chunksize', type=int, default=50000)
+    parser.add_argument('--encoder', default='minilm', choices=list(encoders), help='encoder used for summary embeddings')
+    parser.add_argument('--full', action='store_true', help='ignore fingerprints and rebuild everything')
+    args = parser.parse_args()
+
+    run(args.data_dir, args.chunksize, args.encoder, args.full)
@@ -1,25 +1,41 @@
-from utils.Jitter import *
 from utils.Utils import *
+from utils.Data import *
+from utils.Playback import *
+from utils.Encoding import *
+from utils.Figures import *
+from utils.Prefetch import *
+from utils.UrlState import *
+from utils.Export import *
+from utils.Sampling import *
+from utils.Timeline import *
+from utils.Api import *
+from utils.FigurePool import *
 from constants import default
 from dash import Dash, html, dcc, ctx, Input, Output, State, callback, no_update
 import dash_bootstrap_components as dbc
+from flask import Flask, Response, g, jsonify, request, has_request_context
 from flask_caching import Cache
+import numpy as np
 import pandas as pd
+import json
+from plotly.io.json import to_json_plotly
 import webbrowser
+import threading
+import contextvars
+from uuid import uuid4
+from contextlib import contextmanager
+import time
+import logging
 from threading import Timer
 import os
-import plotly.graph_objects as go
-
-###############################################################################
-# setup app
-port=8050
-external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
-app = Dash(__name__, external_stylesheets=external_stylesheets)
 
+# operational messages of the server, configured by whoever runs it
+logger = logging.getLogger(__name__)
 
 ###############################################################################
 # setup cache
-cache = Cache(app.server, config={
+# initialized on the server by create_app
+cache = Cache(config={
     'DEBUG':True,
     'CACHE_TYPE':'SimpleCache',
     'CACHE_DEFAULT_TIMEOUT':300
@@ -28,252 +44,812 @@ cache = Cache(app.server, config={
 
 ###############################################################################
 # setup data
-@cache.memoize()
-def read_data_terror():
-    df = pd.read_csv("src/data/globalterrorism_2020_cleaned.csv")
+# callbacks run concurrently on one in-memory dataset, with copy on write a frame derived from it
+# never writes through to it or to a cached filter result
+pd.set_option('mode.copy_on_write', True)
+
+# built from the raw GTD export by src/etl.py
+data_path = "src/data"
+
+# long free-text fields are only needed for a single clicked attack, so they are kept in the text store
+text_columns = ['summary', 'motive', 'scite1', 'target1', 'corp1']
+
+# the dataset is loaded in the background, so the server accepts connections while it loads.
+# the charts are only in the layout once it is loaded, so no chart callback runs before
+dataset = None
+dataset_loaded = threading.Event()
+startup = dict(started=time.perf_counter(), timings={}, total=None, error=None)
+
+
+startup_phases = Dataset.phases + ['initial_figures']
+
+
+# a new version is swapped in by replacing dataset. requests are pinned to the version they
+# started on, and functions read the dataset through get_dataset so they see the pinned one
+pinned_dataset = contextvars.ContextVar('pinned_dataset', default=None)
+
+
+def get_dataset():
+    return pinned_dataset.get() or dataset
+
+
+@contextmanager
+def use_dataset(version):
+    token = pinned_dataset.set(version)
+    try:
+        yield version
+    finally:
+        pinned_dataset.reset(token)
+
+
+def pin_dataset():
+    g.dataset_token = pinned_dataset.set(dataset)
+
+
+def unpin_dataset(exception):
+    if 'dataset_token' in g:
+        pinned_dataset.reset(g.pop('dataset_token'))
+
+
+def load_dataset():
+    global dataset
+    try:
+        loaded = Dataset(data_path, startup['timings'])
+        start = time.perf_counter()
+        build_default_figures(loaded)
+        startup['timings']['initial_figures'] = time.perf_counter() - start
+        dataset = loaded
+        startup['total'] = time.perf_counter() - startup['started']
+        timings = ', '.join(f'{phase} {seconds:.2f}s' for phase, seconds in startup['timings'].items())
+        logger.info('dataset %s: ready in %.2fs (%s)', dataset.version, startup['total'], timings)
+    except Exception as e:
+        startup['error'] = repr(e)
+        raise
+    finally:
+        dataset_loaded.set()
+
 
-    # jitter geospatial coordinates
-    df = add_jitter_coordinates(df, "latitude", "longitude", "latitude_jitter", "longitude_jitter")
+loader = None
+loader_lock = threading.Lock()
 
-    # jitter beeswarm
-    df = add_jitter_beeswarm(df, jitter_amount=0.2)
 
-    # simplify vehicle name
-    df.loc[df['weaptype1_txt'].str.contains('Vehicle'), 'weaptype1_txt'] = 'Vehicle'
+def start_loading_dataset():
+    global loader
+    with loader_lock:
+        if loader is None:
+            loader = threading.Thread(target=load_dataset, name='load-dataset', daemon=True)
+            loader.start()
+            threading.Thread(target=watch_dataset, name='watch-dataset', daemon=True).start()
 
-    # ensure 0 or None casualties can be plotted in heatmap
-    df['total_casualties_visualized'] = df['total_casualties'].replace(0, 1)
 
-    return df
+def is_ready():
+    return dataset_loaded.is_set() and dataset is not None
 
 
-df_terror = read_data_terror()
+def wait_until_loaded(timeout=None):
+    # for scripts using the charts without the server, after create_app
+    start_loading_dataset()
+    dataset_loaded.wait(timeout)
+    if dataset is None:
+        raise RuntimeError(f'dataset not loaded: {startup["error"]}')
+    return dataset
 
-all_attacktypes = pd.Series(df_terror['attacktype1_txt'].unique(), name='attacktype1_txt')
-all_weapontypes = pd.DataFrame(df_terror['weaptype1_txt'].unique(), columns=['weaptype1_txt'])
-all_targettypes = pd.Series(df_terror['targtype1_txt'].unique(), name='targtype1_txt')
 
-all_countries = df_terror[['country_txt', 'region_txt']].drop_duplicates().reset_index(drop=True)
+def reload_dataset():
+    # the new version is loaded next to the active one, and only swapped in once its default figures are built
+    global dataset
+    start = time.perf_counter()
+    loaded = Dataset(data_path)
+    build_default_figures(loaded)
+    if read_dataset_version(data_path) != loaded.version:
+        # the pipeline wrote another version while this one loaded, the next check picks it up
+        return
+
+    previous, dataset = dataset, loaded
+    # cache keys hold the version, so entries of the previous one are never read again and expire.
+    # only its default figures are kept without a timeout
+    cache.delete_memoized(build_default_figures, previous)
+    logger.info('dataset %s: swapped in for %s in %.2fs', loaded.version, previous.version, time.perf_counter() - start)
+
+
+def watch_dataset():
+    # polls the pipeline's output for a new version once the first one is loaded
+    dataset_loaded.wait()
+    failed_version = None
+    while dataset is not None:
+        time.sleep(default.reload_interval.value)
+        version = read_dataset_version(data_path)
+        if version is None or version in [dataset.version, failed_version]:
+            continue
+        try:
+            reload_dataset()
+        except Exception:
+            failed_version = version
+            logger.exception('dataset %s: reload failed', version)
+
+
+def get_similar_rows(eventid):
+    # keyed by eventid, as row positions in a click may be from a dataset version that has since been swapped
+    dataset = get_dataset()
+    text_row = dataset.get_row(eventid)
+    if text_row is None:
+        return np.array([], dtype=np.int64)
+    similar_rows = np.asarray(dataset.neighbours[text_row][:default.similar_count.value])
+    return similar_rows[similar_rows >= 0]
+
 
 customdata_list = ['eventid', 'latitude_jitter', 'longitude_jitter', 
                    'iday', 'imonth', 'iyear',
                    'country_txt', 'region_txt', 'provstate', 'city', 
-                   'summary', 'crit1', 'crit2', 'crit3', 'related',
+                   'text_row', 'crit1', 'crit2', 'crit3', 'related',
                    'attacktype1_txt', #'attacktype2_txt', 'attacktype3_txt',
                    'success', 'suicide',
                    'weaptype1_txt', 'weapsubtype1_txt', #'weaptype2_txt', 'weapsubtype2_txt', 'weaptype3_txt', 'weapsubtype3_txt',
                    'targtype1_txt', 'targsubtype1_txt', #'targtype2_txt', 'targsubtype2_txt', 'targtype3_txt', 'targsubtype3_txt',
-                   'corp1', #'corp2', 'corp3',
-                   'target1', #'target2', 'target3',
                    'natlty1_txt', #'natlty2_txt', 'natlty3_txt',
-                   'gname', 'guncertain1', 'nperps', 'motive',
+                   'gname', 'guncertain1', 'nperps',
                    'nkill', 'nkillter', 'nwound', 'nwoundte', 'property', 'propvalue', 'ishostkid', 'nhostkid', 'nhours', 'ndays',
                    'flag',
                    'total_casualties', 
-                   'scite1',
                    'propextent_txt',
                    'claimmode_txt']
 
 
 ###############################################################################
 # filter data
+# memoized on the dataset rather than its frame, whose repr is slow to build and not unique
 @cache.memoize()
-def filter_years(df, year_range):
+def filter_years(dataset, year_range):
+    df = dataset.df
     year_lower, year_upper = year_range
     df_filtered = df[(df['iyear'] >= year_lower) & (df['iyear'] <= year_upper)]
     return df_filtered
 
 @cache.memoize()
-def filter_data(df, year_range, attacktype, weapontype, targettype, group):
-    # filter years
-    df_filtered = filter_years(df, year_range)
-
-    # filter attack
-    if attacktype is not None:
-        if len(attacktype) > 0:
-            df_filtered = df_filtered[df_filtered['attacktype1_txt'].isin(attacktype)]
-    
-    if weapontype is not None:
-        if len(weapontype) > 0:
-            df_filtered = df_filtered[df_filtered['weaptype1_txt'].isin(weapontype)]
-    
-    # filter target
-    if targettype is not None:
-        if len(targettype) > 0:
-            df_filtered = df_filtered[df_filtered['targtype1_txt'].isin(targettype)]
-
-    # filter group
-    if group is not None:
-        if len(group) > 0:
-            df_filtered = df_filtered[df_filtered['gname'].isin(group)]
-    
-    return df_filtered
+def search_matches(dataset, year_range, search, search_mode):
+    # text rows of the attacks best matching a free-text search, ranked within the years, which every chart filters on.
+    # the charts leave out different filters, so matches ranked within each chart's filters would differ between them
+    index = dataset.embedding_index if search_mode == 'semantic' and dataset.embedding_index is not None else dataset.search_index
+    matches, _ = index.search(search, filter_years(dataset, year_range)['text_row'].to_numpy(), k=default.search_top_k.value)
+    return matches
+
+
+def filter_mask(dataset, df, year_range, date_range, attacktype, weapontype, targettype, group, search=None, search_mode='keyword'):
+    # rows of df within the filters, as a boolean mask
+    years = df['iyear'].to_numpy()
+    mask = (years >= year_range[0]) & (years <= year_range[1])
+
+    # filter dates within the years, attacks of unknown date are left out
+    if date_range is not None:
+        mask &= ((df['date'] >= date_range[0]) & (df['date'] <= date_range[1])).to_numpy()
+
+    # filter attack, weapon, target and group
+    for values, col in [(attacktype, 'attacktype1_txt'), (weapontype, 'weaptype1_txt'), (targettype, 'targtype1_txt'),
+                        (group, 'gname')]:
+        if values is not None and len(values) > 0:
+            mask &= df[col].isin(values).to_numpy()
+
+    # filter summaries by free-text search, the same matches for every chart
+    if search:
+        mask &= np.isin(df['text_row'].to_numpy(), search_matches(dataset, year_range, search, search_mode))
+
+    return mask
+
+
+@cache.memoize()
+def filter_data(dataset, year_range, date_range, attacktype, weapontype, targettype, group, search=None, search_mode='keyword'):
+    # filtered within the memoized rows of the years, which most filter changes share
+    df_filtered = filter_years(dataset, year_range)
+    return df_filtered[filter_mask(dataset, df_filtered, year_range, date_range, attacktype, weapontype, targettype, group,
+                                   search, search_mode)]
+
+
+# after a year range is served, the ranges next to it are filtered in the background so the
+# next slider step is a cache hit
+prefetcher = Prefetcher(max_workers=default.prefetch_workers.value,
+                        max_pending=default.prefetch_max_pending.value,
+                        cpu_budget=default.prefetch_cpu_budget.value)
+
+
+def serve_filter_data(year_range, date_range, attacktype, weapontype, targettype, group, search=None, search_mode='keyword'):
+    dataset = get_dataset()
+    dff = filter_data(dataset, year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode)
+
+    for neighbour_range in neighbouring_year_ranges(year_range, dataset.year_min, dataset.year_max):
+        key = repr((dataset, neighbour_range, date_range, attacktype, weapontype, targettype, group, search, search_mode))
+        prefetcher.submit(key, filter_data, dataset, neighbour_range, date_range, attacktype, weapontype, targettype, group,
+                          search, search_mode)
+
+    return dff
+
+
+###############################################################################
+# crossfilter
+# aggregates of the views under all filters except their own, built with the dataset by build_crossfilter
+def query_crossfilter(groups, year=None, date=None, **filters):
+    # only the given filters are applied, the groups ignore the others. the date range is always
+    # applied, as most groups filter on it and no range selects all dates
+    dataset = get_dataset()
+    selections = {}
+    if year is not None:
+        years = np.arange(dataset.year_min, dataset.year_max + 1)
+        selections['year'] = (years >= year[0]) & (years <= year[1])
+    selections['date'] = date_selection(date, dataset.year_min, dataset.crossfilter.dimensions['date'].n_codes)
+    for name, values in filters.items():
+        categories = dataset.df[crossfilter_columns[name]].cat.categories
+        selections[name] = np.concatenate([[False], categories.isin(values)]) if values else None
+    return dataset.crossfilter.query(selections, groups)
+
+
+def crossfilter_series(aggregate, name, field='rows'):
+    # aggregate of the observed categories, like a groupby with observed=True
+    dataset = get_dataset()
+    observed = np.flatnonzero(aggregate['rows'][1:] > 0)
+    categories = dataset.df[crossfilter_columns[name]].cat.categories
+    return pd.Series(aggregate[field][observed + 1], index=categories[observed])
+
+
+def count_types(dff, year_range, date_range, group, search):
+    # attacks per attack, weapon and target type and known casualties per target type,
+    # without the type filters as the parallel sets and beeswarm show all types
+    if search:
+        # a search leaves few rows, which are counted directly
+        return dict(attacktype=dff.groupby('attacktype1_txt', observed=True)['attacktype1_txt'].count(),
+                    weapontype=dff.groupby('weaptype1_txt', observed=True)['weaptype1_txt'].count(),
+                    targettype=dff.groupby('targtype1_txt', observed=True)['targtype1_txt'].count(),
+                    target_casualties=dff.groupby('targtype1_txt', observed=True)['total_casualties'].count())
+    result = query_crossfilter(['attack_counts', 'weapon_counts', 'target_counts'], year=year_range, date=date_range,
+                               group=group)
+    return dict(attacktype=crossfilter_series(result['attack_counts'], 'attacktype'),
+                weapontype=crossfilter_series(result['weapon_counts'], 'weapontype'),
+                targettype=crossfilter_series(result['target_counts'], 'targettype'),
+                target_casualties=crossfilter_series(result['target_counts'], 'targettype', 'count'))
+
+
+def match_types(dff, attacktype, weapontype, targettype):
+    # rows matching the type filters, as a new array so the shared frame is never written to
+    condition = np.ones(dff.shape[0], dtype=bool)
+    for col, values in [('attacktype1_txt', attacktype), ('weaptype1_txt', weapontype), ('targtype1_txt', targettype)]:
+        if values:
+            condition &= dff[col].isin(values).to_numpy()
+    return condition
+
+
+# population of each attack's country in the year of the attack, missing for international attacks
+def lookup_population(dff):
+    dataset = get_dataset()
+    return attack_population(dff, dataset.population, dataset.population_years)
+
+
+def per_million(dff, values=None):
+    values = 1 if values is None else dff[values].fillna(0).to_numpy()
+    return np.nan_to_num(values * 1e6 / lookup_population(dff))
+
+
+def per_million_of_region(dff, values=None):
+    dataset = get_dataset()
+    values = 1 if values is None else dff[values].fillna(0).to_numpy()
+    return np.nan_to_num(values * 1e6 / attack_region_population(dff, dataset.countries, dataset.population,
+                                                                 dataset.region_population, dataset.population_years))
 
 
 ###############################################################################
 # setup filters
+# only the options are replaced, re-creating the dropdown would fire the charts again
 @callback(
-    Output('crossfilter-group-container', 'children'),
-    State('crossfilter-group-dropdown', 'value'),
+    Output('crossfilter-group-dropdown', 'options'),
     Input('crossfilter-year-slider', 'value'),
+    prevent_initial_call=True
 )
-def update_group_dropdown(group_selections, year_range):
-    # filter years
-    df_filtered = filter_years(df_terror, year_range)
-
-    # count number of attacks for groups
-    groups_counts = df_filtered.groupby(['gname'])['gname'].count()
+@prefetcher.live
+def update_group_dropdown(year_range):
+    # count number of attacks for groups in the years
+    groups_counts = crossfilter_series(query_crossfilter(['group_counts'], year=year_range)['group_counts'], 'group')
 
     # sort ascending
     groups_sorted = groups_counts.sort_values(ascending=False)
 
     # Format required by dcc.Dropdown (label-value pairs)
-    options = [{'label': group, 'value': group} for group in groups_sorted.index]
-    
-    # Return the dcc.Dropdown component with the computed options
-    return dcc.Dropdown(
-        id='crossfilter-group-dropdown',
-        options=options,
-        value=group_selections,
-        placeholder='Show All Terror Groups',
-        multi=True,
-        clearable=False,
-        maxHeight=200,
-        optionHeight=35
-    )
+    return [{'label': group, 'value': group} for group in groups_sorted.index]
 
 
 ###############################################################################
 # setup layout
-app.layout = html.Div([
-    dcc.Store(id='global-clickData'),
+# filters when the url has none, and the map before it is moved
+default_state = dict(year_range=default.year_range.value, date_range=None, attacktype=None, weapontype=None, targettype=None,
+                     group=None, search=None, search_mode='keyword', metric='attacks')
+default_map_state = {'zoom': default.zoom.value, 'center': dict(lat=default.lat.value, lon=default.lon.value)}
 
-    # Top blue box with title and filters in 3 columns
-    html.Div([
-        html.H3("Exploration of The Global Terrorism Database", style={'color': 'white', 'text-align': 'center'}),
-        
+
+def url_state_options():
+    dataset = get_dataset()
+    options = {name: set(dataset.df[col].cat.categories) for name, col in crossfilter_columns.items()}
+    options['search_mode'] = {'keyword', 'semantic'}
+    options['metric'] = {'attacks', 'casualties', 'attacks_per_million', 'casualties_per_million'}
+    return options
+
+
+def request_state():
+    dataset = get_dataset()
+    # dash fetches the layout from the page, so the page's url with the filters is the referrer
+    url = request.referrer if has_request_context() else None
+    return decode_url_state(url, default_state, dataset.year_min, dataset.year_max, url_state_options())
+
+
+@cache.memoize()
+def build_initial_figures(dataset, year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode,
+                          metric):
+    # figures of a state as the callbacks would draw them, embedded in the layout so the first
+    # paint needs no callback
+    clickData = {'data': None, 'trigger': None}
+    filters = (year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode)
+    with use_dataset(dataset):
+        return dict(
+            heatmap=build_map_heatmap(default_map_state, clickData, False, *filters, metric, []),
+            parallel_sets=build_chart_parallel_sets(*filters),
+            beeswarm=build_chart_beeswarm(clickData, *filters),
+            scatter=build_chart_scatter(*filters),
+            timeline=build_chart_timeline(*filters)
+        )
+
+
+@cache.memoize(timeout=0)
+def build_default_figures(dataset):
+    # the default state is what most page loads show, so its figures are kept as long as the dataset is served
+    return build_initial_figures.uncached(dataset, *default_state.values())
+
+
+def build_layout(state):
+    dataset = get_dataset()
+    if state == default_state:
+        figures = build_default_figures(dataset)
+    else:
+        figures = build_initial_figures(dataset, *state.values())
+
+    return html.Div([
+        dcc.Location(id='url', refresh=False),
+        dcc.Store(id='global-clickData', data={'data': None, 'trigger': None}),
+        dcc.Store(id='session-id', data=uuid4().hex),
+        dcc.Store(id='refine-request', data=None),
+        dcc.Store(id='scatter-expanded', data=[]),
+        dcc.Store(id='date-range', data=state['date_range']),
+
+        # Top blue box with title and filters in 3 columns
         html.Div([
-            # Column 1 and 2
+            html.H3("Exploration of The Global Terrorism Database", style={'color': 'white', 'text-align': 'center'}),
+        
             html.Div([
-                # Range Slider spans columns 1 and 2
+                # Column 1 and 2
                 html.Div([
-                    dcc.RangeSlider(
-                        id='crossfilter-year-slider',
-                        min=df_terror['iyear'].min(),
-                        max=df_terror['iyear'].max(),
-                        step=None,
-                        value=default.year_range.value,
-                        marks={str(year): str(year) if year % 10 == 0 else '' for year in df_terror['iyear'].unique()},
-                        allowCross=False,
-                        dots=False,
-                        updatemode='mouseup',
-                        tooltip=dict(placement="top", always_visible=True),
-                    ),
-                ], style={'padding': '0px', 'width': '100%', 'display': 'inline-block', 'vertical-align': 'top'}),
+                    # Range Slider spans columns 1 and 2
+                    html.Div([
+                        dcc.RangeSlider(
+                            id='crossfilter-year-slider',
+                            min=dataset.year_min,
+                            max=dataset.year_max,
+                            step=None,
+                            value=state['year_range'],
+                            marks={str(year): str(year) if year % 10 == 0 else '' for year in dataset.df['iyear'].unique()},
+                            allowCross=False,
+                            dots=False,
+                            updatemode='mouseup',
+                            tooltip=dict(placement="top", always_visible=True),
+                        ),
+                    ], style={'padding': '0px', 'width': '100%', 'display': 'inline-block', 'vertical-align': 'top'}),
+
+                    # Column 1
+                    html.Div([
+                        dcc.Dropdown(
+                            id='crossfilter-attacktype-dropdown',
+                            options=[{'label': i, 'value': i} for i in dataset.df['attacktype1_txt'].unique()],
+                            value=state['attacktype'],
+                            placeholder='Show All Attack Types',
+                            multi=True,
+                            clearable=False
+                        ),
+                        dcc.Dropdown(
+                            id='crossfilter-weapontype-dropdown',
+                            options=[{'label': i, 'value': i} for i in dataset.df['weaptype1_txt'].unique()],
+                            value=state['weapontype'],
+                            placeholder='Show All Weapon Types',
+                            multi=True,
+                            clearable=False,
+                            style={'margin-top': '10px'}
+                        ),
+                    ], style={'padding': '10px', 'width': '48.2%', 'display': 'inline-block', 'vertical-align': 'top'}),
+
+                    # Column 2
+                    html.Div([
+                        dcc.Dropdown(
+                            id='crossfilter-targettype-dropdown',
+                            options=[{'label': i, 'value': i} for i in dataset.df['targtype1_txt'].unique()],
+                            value=state['targettype'],
+                            placeholder='Show All Target Types',
+                            multi=True,
+                            clearable=False
+                        ),
+                        html.Div(
+                            id='crossfilter-group-container',
+                            children=dcc.Dropdown(
+                                id='crossfilter-group-dropdown',
+                                options=update_group_dropdown(state['year_range']),
+                                value=state['group'],
+                                placeholder='Show All Terror Groups',
+                                multi=True,
+                                clearable=False,
+                                maxHeight=200,
+                                optionHeight=35
+                            ),
+                            style={'margin-top': '10px', 'padding': '0px'}
+                        )
+                    ], style={'padding': '10px', 'width': '48.2%', 'display': 'inline-block', 'vertical-align': 'top'}),
+                ], style={'width': '66%', 'display': 'inline-block', 'vertical-align': 'top'}),
 
-                # Column 1
+                # Column 3
                 html.Div([
-                    dcc.Dropdown(
-                        id='crossfilter-attacktype-dropdown',
-                        options=[{'label': i, 'value': i} for i in df_terror['attacktype1_txt'].unique()],
-                        value=None,
-                        placeholder='Show All Attack Types',
-                        multi=True,
-                        clearable=False
+                    html.Button('Reset Selection',
+                                id='button-reset-selection',
+                                n_clicks=0,
+                                style={'margin-top': '0px', 'background-color': 'white'}
+                                ),
+                    dcc.Input(
+                        id='crossfilter-search-input',
+                        type='search',
+                        value=state['search'],
+                        placeholder='Search Attack Summaries',
+                        debounce=True,
+                        style={'margin-left': '10px', 'width': '55%'}
                     ),
-                    dcc.Dropdown(
-                        id='crossfilter-weapontype-dropdown',
-                        options=[{'label': i, 'value': i} for i in df_terror['weaptype1_txt'].unique()],
-                        value=None,
-                        placeholder='Show All Weapon Types',
-                        multi=True,
-                        clearable=False,
-                        style={'margin-top': '10px'}
-                    ),
-                ], style={'padding': '10px', 'width': '48.2%', 'display': 'inline-block', 'vertical-align': 'top'}),
-
-                # Column 2
-                html.Div([
-                    dcc.Dropdown(
-                        id='crossfilter-targettype-dropdown',
-                        options=[{'label': i, 'value': i} for i in df_terror['targtype1_txt'].unique()],
-                        value=None,
-                        placeholder='Show All Target Types',
-                        multi=True,
-                        clearable=False
+                    dcc.RadioItems(
+                        id='toggle-search-mode',
+                        options=[
+                            {'label': 'Keyword Search', 'value': 'keyword'},
+                            {'label': 'Semantic Search', 'value': 'semantic', 'disabled': dataset.embedding_index is None}
+                        ],
+                        value=state['search_mode'],
+                        inline=True,
+                        style={'margin-top': '5px'},
+                        labelStyle={'margin-right': '20px'}
                     ),
                     html.Div(
-                        id='crossfilter-group-container',
-                        children=update_group_dropdown(None, default.year_range.value),
-                        style={'margin-top': '10px', 'padding': '0px'}
+                        id="info-box",
+                        children=update_info_box({'data': None, 'trigger': None}),
+                        style={'margin-top': '10px', 'clear': 'both'}
                     )
-                ], style={'padding': '10px', 'width': '48.2%', 'display': 'inline-block', 'vertical-align': 'top'}),
-            ], style={'width': '66%', 'display': 'inline-block', 'vertical-align': 'top'}),
+                ], style={'padding': '10px', 'width': '33%', 'display': 'inline-block'}),
+            ], style={'display': 'flex', 'flex-direction': 'row'})
+        ], style={'background-color': default.highlight_color.value, 'padding': '0px', 'color': 'white'}),
 
-            # Column 3
+        # Main charts
+        html.Div([
+            # Timeline
             html.Div([
-                html.Button('Reset Selection',
-                            id='button-reset-selection',
-                            n_clicks=0,
-                            style={'margin-top': '0px', 'background-color': 'white'}
-                            ),
-                html.Div(
-                    id="info-box",
-                    style={'margin-top': '10px', 'clear': 'both'}
-                )
-            ], style={'padding': '10px', 'width': '33%', 'display': 'inline-block'}),
-        ], style={'display': 'flex', 'flex-direction': 'row'})
-    ], style={'background-color': default.highlight_color.value, 'padding': '0px', 'color': 'white'}),
+                dcc.Graph(id='chart-timeline', figure=figures['timeline'], selectedData=None)
+            ], style={'grid-area': 'timeline'}),
 
-    # Main charts
-    html.Div([
-        # Heatmap
-        html.Div([
-            dcc.Store(id='map-state', data={'zoom': default.zoom.value, 'center': dict(lat=default.lat.value, lon=default.lon.value)}),
-            dcc.RadioItems(
-                id='toggle-metric',
-                options=[
-                    {'label': 'Show Number of Attacks', 'value': 'attacks'},
-                    {'label': 'Show Total Casualties', 'value': 'casualties'}
-                ],
-                value='attacks',
-                inline=True,
-                style={'margin-top': '10px'},
-                labelStyle={'margin-right': '20px'}
-            ),
-            dcc.Graph(id='map-heatmap', hoverData=None, clickData=None)
-        ], style={'grid-area': 'heatmap'}),
+            # Heatmap
+            html.Div([
+                dcc.Store(id='map-state', data=default_map_state),
+                dcc.Store(id='map-level', data=map_level(default_map_state)),
+                dcc.RadioItems(
+                    id='toggle-metric',
+                    options=[
+                        {'label': 'Show Number of Attacks', 'value': 'attacks'},
+                        {'label': 'Show Total Casualties', 'value': 'casualties'},
+                        {'label': 'Show Attacks per Million', 'value': 'attacks_per_million'},
+                        {'label': 'Show Casualties per Million', 'value': 'casualties_per_million'}
+                    ],
+                    value=state['metric'],
+                    inline=True,
+                    style={'margin-top': '10px'},
+                    labelStyle={'margin-right': '20px'}
+                ),
+                dcc.Checklist(
+                    id='toggle-playback',
+                    options=[{'label': 'Play years', 'value': 'playback'}],
+                    value=[],
+                    inline=True,
+                    style={'margin-top': '5px'}
+                ),
+                dcc.Graph(id='map-heatmap', figure=figures['heatmap'], hoverData=None, clickData=None)
+            ], style={'grid-area': 'heatmap'}),
 
-        # Parallel sets
-        html.Div([
-            dcc.Graph(id='chart-parallel-sets', clickData=None)
-        ], style={'grid-area': 'parallel-sets'}),
+            # Parallel sets
+            html.Div([
+                dcc.Graph(id='chart-parallel-sets', figure=figures['parallel_sets'], clickData=None)
+            ], style={'grid-area': 'parallel-sets'}),
 
-        # Beeswarm
-        html.Div([
-            dcc.Graph(id='chart-beeswarm', clickData=None, hoverData=None)
-        ], style={'grid-area': 'beeswarm', 'margin-top': '-40px'}),
+            # Beeswarm
+            html.Div([
+                dcc.Graph(id='chart-beeswarm', figure=figures['beeswarm'], clickData=None, hoverData=None)
+            ], style={'grid-area': 'beeswarm', 'margin-top': '-40px'}),
 
-        # Scatterplot
+            # Scatterplot
+            html.Div([
+                dcc.Graph(id='chart-scatter', figure=figures['scatter'], clickData=None, hoverData=None)
+            ], style={'grid-area': 'scatterplot', 'margin-top': '0px'}),
+
+        ], style={
+            'display': 'grid',
+            'grid-template-areas': '''
+                "timeline timeline"
+                "heatmap parallel-sets"
+                "beeswarm scatterplot"
+            ''',
+            'grid-template-columns': '1fr 1fr',
+            'grid-template-rows': 'auto auto auto',
+            'gap': '0px',
+            'align-items': 'center',
+            'justify-items': 'center',
+            'width': '100%',
+            'padding': '0px'
+        })
+    ])
+
+
+def build_loading_layout():
+    # served while the dataset loads, and replaced by the full layout once it is loaded
+    return html.Div(id='page-content', children=[
         html.Div([
-            dcc.Graph(id='chart-scatter', clickData=None, hoverData=None)
-        ], style={'grid-area': 'scatterplot', 'margin-top': '0px'}),
-
-    ], style={
-        'display': 'grid',
-        'grid-template-areas': '''
-            "heatmap parallel-sets"
-            "beeswarm scatterplot"
-        ''',
-        'grid-template-columns': '1fr 1fr',
-        'grid-template-rows': 'auto auto',
-        'gap': '0px',
-        'align-items': 'center',
-        'justify-items': 'center',
-        'width': '100%',
-        'padding': '0px'
-    })
-])
+            html.H3("Exploration of The Global Terrorism Database", style={'color': 'white', 'text-align': 'center'}),
+            html.P("Loading the data...", style={'color': 'white', 'text-align': 'center', 'padding-bottom': '10px'})
+        ], style={'background-color': default.highlight_color.value, 'padding': '0px'}),
+        dcc.Interval(id='startup-interval', interval=500)
+    ])
+
+
+def serve_layout():
+    if not is_ready():
+        return build_loading_layout()
+    try:
+        return build_layout(request_state())
+    except Exception:
+        # a link that can not be decoded or drawn opens the default view rather than a blank page
+        logger.exception('layout: %s falls back to the default filters', request.referrer)
+        return build_layout(default_state)
+
+
+@callback(
+    Output('page-content', 'children'),
+    Input('startup-interval', 'n_intervals'),
+    prevent_initial_call=True
+)
+def swap_in_layout(n_intervals):
+    if startup['error'] is not None:
+        return html.P("The data could not be loaded.", style={'text-align': 'center'})
+    if not is_ready():
+        return no_update
+    return build_layout(request_state())
+
+
+@callback(
+    Output('url', 'search'),
+    Input('crossfilter-year-slider', 'value'),
+    Input('date-range', 'data'),
+    Input('crossfilter-attacktype-dropdown', 'value'),
+    Input('crossfilter-weapontype-dropdown', 'value'),
+    Input('crossfilter-targettype-dropdown', 'value'),
+    Input('crossfilter-group-dropdown', 'value'),
+    Input('crossfilter-search-input', 'value'),
+    Input('toggle-search-mode', 'value'),
+    Input('toggle-metric', 'value'),
+    prevent_initial_call=True
+)
+def update_url(year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode, metric):
+    state = dict(year_range=year_range, date_range=date_range, attacktype=attacktype, weapontype=weapontype, targettype=targettype,
+                 group=group, search=search, search_mode=search_mode, metric=metric)
+    return encode_url_state(state, default_state)
+
+
+###############################################################################
+# health and readiness
+def healthz():
+    # the process is alive, unless the dataset failed to load and it has to be restarted
+    if startup['error'] is not None:
+        return jsonify(status='failed', error=startup['error']), 500
+    return jsonify(status='ok')
+
+
+def readyz():
+    # ready once the dataset is loaded, with the seconds spent in each phase of loading it
+    timings = {phase: round(seconds, 3) for phase, seconds in startup['timings'].items()}
+    if not is_ready():
+        phase = next((phase for phase in startup_phases if phase not in timings), None)
+        return jsonify(status='failed' if startup['error'] is not None else 'loading', phase=phase,
+                       elapsed=round(time.perf_counter() - startup['started'], 3), timings=timings,
+                       error=startup['error']), 503
+    return jsonify(status='ready', version=dataset.version, total=round(startup['total'], 3), timings=timings,
+                   figure_pool=figure_pool.summary())
+
+
+###############################################################################
+# export
+# the app's own derived columns are left out unless asked for
+internal_columns = ['total_casualties_visualized', 'latitude_jitter', 'longitude_jitter', 'beeswarm_jitter',
+                    'country_id', 'text_row', 'flag', 'date']
+
+
+def export():
+    # filtered by the same query parameters as the page's url, e.g. /export?years=1990-2000&format=parquet.
+    # columns=eventid,summary selects columns, compression=gzip compresses csv or sets the parquet codec
+    if not is_ready():
+        return jsonify(error='the dataset is still loading'), 503
+    dataset = get_dataset()
+
+    all_columns = list(dataset.df.columns) + text_columns
+    columns = [col for value in request.args.getlist('columns') for col in value.split(',') if col]
+    if not columns:
+        columns = [col for col in all_columns if col not in internal_columns]
+    unknown = [col for col in columns if col not in all_columns]
+    if unknown:
+        return jsonify(error=f'unknown columns: {", ".join(unknown)}'), 400
+
+    export_format = request.args.get('format', 'csv')
+    compression = request.args.get('compression')
+    if export_format not in ['csv', 'parquet'] or compression not in [None, 'gzip']:
+        return jsonify(error='format is csv or parquet, compression is gzip'), 400
+    if export_format == 'parquet' and not parquet_available():
+        return jsonify(error='parquet export needs pyarrow'), 400
+
+    state = decode_url_state(request.url, default_state, dataset.year_min, dataset.year_max, url_state_options())
+    # the rows are taken from the dataset's frame chunk by chunk, rather than filtered into a memoized frame
+    rows = np.flatnonzero(filter_mask(dataset, dataset.df, state['year_range'], state['date_range'], state['attacktype'],
+                                      state['weapontype'], state['targettype'], state['group'], state['search'],
+                                      state['search_mode']))
+    chunks = export_chunks(dataset.df, columns, dataset.text_store, default.export_chunk_size.value, rows)
+
+    if export_format == 'parquet':
+        stream = write_parquet(chunks, compression or 'snappy')
+        filename, mimetype = 'attacks.parquet', 'application/vnd.apache.parquet'
+    elif compression == 'gzip':
+        stream = write_gzip(write_csv(chunks))
+        filename, mimetype = 'attacks.csv.gz', 'application/gzip'
+    else:
+        stream = write_csv(chunks)
+        filename, mimetype = 'attacks.csv', 'text/csv'
+    return Response(stream, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+###############################################################################
+# query api
+# the numbers of the charts as json, filtered by the query parameters of the page's url.
+# GET /api/v1/groups?years=1990-2000&limit=10 answers one query, POST /api/v1/batch answers
+# {"queries": [{"kind": "groups", "filters": {"years": "1990-2000"}, "offset": 0, "limit": 10}, ...]}
+api_row_columns = ['eventid', 'iyear', 'imonth', 'iday', 'country_txt', 'region_txt', 'city', 'gname',
+                   'attacktype1_txt', 'weaptype1_txt', 'targtype1_txt', 'total_casualties']
+api_filter_names = ['year_range', 'date_range', 'attacktype', 'weapontype', 'targettype', 'group', 'search', 'search_mode']
+
+
+def api_count(dff, aggregates, query):
+    return dict(attacks=int(dff.shape[0]), casualties=float(dff['total_casualties'].sum()),
+                known_casualties=int(dff['total_casualties'].count()))
+
+
+def api_groups(dff, aggregates, query):
+    # attacks and casualties per group, most attacks first
+    if query['state']['search']:
+        # a search leaves few rows, which are aggregated directly
+        grouped = dff.groupby('gname', observed=True)['total_casualties']
+        totals = pd.DataFrame({'attacks': grouped.size(), 'casualties': grouped.sum(), 'known_casualties': grouped.count()})
+    else:
+        # the crossfilter group ignores the group filter, which is applied to its totals
+        group_casualties = aggregates['group_casualties']
+        totals = pd.DataFrame({'attacks': crossfilter_series(group_casualties, 'group', 'rows'),
+                               'casualties': crossfilter_series(group_casualties, 'group', 'sum'),
+                               'known_casualties': crossfilter_series(group_casualties, 'group', 'count')})
+        if query['state']['group']:
+            totals = totals[totals.index.isin(query['state']['group'])]
+    totals = totals.rename_axis('group').reset_index().sort_values(['attacks', 'group'], ascending=[False, True])
+    return paginate(totals, query['offset'], query['limit'])
+
+
+def api_flows(dff, aggregates, query):
+    # attacks per combination of attack, weapon and target type, the sets of the parallel sets
+    flows = (dff.groupby(['attacktype1_txt', 'weaptype1_txt', 'targtype1_txt'], observed=True).size()
+                .rename('attacks')
+                .reset_index()
+                .rename(columns={'attacktype1_txt': 'attacktype', 'weaptype1_txt': 'weapontype', 'targtype1_txt': 'targettype'})
+                .sort_values('attacks', ascending=False, kind='stable'))
+    return paginate(flows, query['offset'], query['limit'])
+
+
+def api_top_events(dff, aggregates, query):
+    # attacks with most casualties first
+    top = dff.sort_values('total_casualties', ascending=False, na_position='last', kind='stable')
+    return paginate(top, query['offset'], query['limit'], query['columns'], get_dataset().text_store)
+
+
+def api_rows(dff, aggregates, query):
+    return paginate(dff, query['offset'], query['limit'], query['columns'], get_dataset().text_store)
+
+
+api_kinds = {'count': api_count, 'groups': api_groups, 'flows': api_flows, 'top_events': api_top_events, 'rows': api_rows}
+# crossfilter groups a kind reads when there is no search
+api_crossfilter_groups = {'groups': 'group_casualties'}
+
+
+def parse_api_query(kind, url, offset, limit, columns):
+    # a query normalized so queries of the same rows are equal, raises ValueError when it is invalid
+    dataset = get_dataset()
+    if kind not in api_kinds:
+        raise ValueError(f'unknown kind {kind}, the kinds are {", ".join(api_kinds)}')
+    state = decode_url_state(url, default_state, dataset.year_min, dataset.year_max, url_state_options())
+    query = dict(kind=kind, state=normalize_state({name: state[name] for name in api_filter_names}))
+    query['offset'], query['limit'] = parse_page(offset, limit, default.api_page_size.value, default.api_max_page_size.value)
+    if kind in ['top_events', 'rows']:
+        query['columns'] = columns or api_row_columns
+        unknown = [col for col in query['columns'] if col not in list(dataset.df.columns) + text_columns]
+        if unknown:
+            raise ValueError(f'unknown columns: {", ".join(unknown)}')
+    return query
+
+
+def evaluate_api_queries(queries):
+    # cached answers are returned as they are, the others are evaluated together per filter state,
+    # so the rows of a state are filtered and its crossfilter groups queried once
+    dataset = get_dataset()
+    results = [cache.get(query_key(dataset.version, query)) for query in queries]
+    pending = {}
+    for i, query in enumerate(queries):
+        if results[i] is None:
+            pending.setdefault(query_key(dataset.version, query['state']), []).append(i)
+
+    for indexes in pending.values():
+        state = queries[indexes[0]]['state']
+        dff = filter_data(dataset, *[state[name] for name in api_filter_names])
+        kinds = set(queries[i]['kind'] for i in indexes)
+        groups = sorted(api_crossfilter_groups[kind] for kind in kinds if kind in api_crossfilter_groups)
+        aggregates = {}
+        if groups and not state['search']:
+            aggregates = query_crossfilter(groups, year=state['year_range'], date=state['date_range'],
+                                           attacktype=state['attacktype'], weapontype=state['weapontype'],
+                                           targettype=state['targettype'], group=state['group'])
+        for i in indexes:
+            results[i] = api_kinds[queries[i]['kind']](dff, aggregates, queries[i])
+            cache.set(query_key(dataset.version, queries[i]), results[i])
+    return results
+
+
+def api_index():
+    return jsonify(version=get_dataset().version if is_ready() else None, kinds=list(api_kinds),
+                   filters=['years', 'dates'] + list_params + ['search', 'search_mode'], columns=api_row_columns)
+
+
+def api_query(kind):
+    # columns=eventid,summary selects the columns of rows and top_events, offset and limit page through them
+    if not is_ready():
+        return jsonify(error='the dataset is still loading'), 503
+    columns = [col for value in request.args.getlist('columns') for col in value.split(',') if col]
+    try:
+        query = parse_api_query(kind, request.url, request.args.get('offset'), request.args.get('limit'), columns)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(version=get_dataset().version, query=query, result=evaluate_api_queries([query])[0])
+
+
+def api_batch():
+    if not is_ready():
+        return jsonify(error='the dataset is still loading'), 503
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('queries'), list) or not body['queries']:
+        return jsonify(error='the body is {"queries": [{"kind": ..., "filters": {...}}, ...]}'), 400
+    if len(body['queries']) > default.api_max_batch.value:
+        return jsonify(error=f'at most {default.api_max_batch.value} queries per batch'), 400
+
+    queries = []
+    for i, item in enumerate(body['queries']):
+        try:
+            if not isinstance(item, dict) or not isinstance(item.get('filters', {}), dict):
+                raise ValueError('a query is {"kind": ..., "filters": {...}, "offset": ..., "limit": ..., "columns": [...]}')
+            columns = item.get('columns')
+            columns = columns.split(',') if isinstance(columns, str) else columns
+            queries.append(parse_api_query(item.get('kind'), filters_url(item.get('filters', {})), item.get('offset'),
+                                           item.get('limit'), columns))
+        except (ValueError, TypeError) as e:
+            return jsonify(error=f'query {i}: {e}'), 400
+    results = evaluate_api_queries(queries)
+    return jsonify(version=get_dataset().version,
+                   results=[dict(query=query, result=result) for query, result in zip(queries, results)])
 
 
 ###############################################################################
@@ -282,7 +858,8 @@ app.layout = html.Div([
     Output('global-clickData', 'data'),
     Input('map-heatmap', 'clickData'),
     Input('chart-beeswarm', 'clickData'),
-    Input('button-reset-selection', 'n_clicks')
+    Input('button-reset-selection', 'n_clicks'),
+    prevent_initial_call=True
 )
 def update_global_clickdata(map_clickData, beeswarm_clickData, n_clicks):
     global_clickData = None
@@ -290,6 +867,9 @@ def update_global_clickdata(map_clickData, beeswarm_clickData, n_clicks):
     # update global click data based on which event triggered a callback
     trigger = list(ctx.triggered_prop_ids.keys())
     if 'map-heatmap.clickData' in trigger:
+        # grid cells in playback mode and country totals are not attacks
+        if 'customdata' not in map_clickData['points'][0]:
+            return no_update
         trigger = 'map-heatmap.clickData'
         global_clickData = map_clickData['points'][0]['customdata']
     elif 'chart-beeswarm.clickData' in trigger:
@@ -304,37 +884,34 @@ def update_global_clickdata(map_clickData, beeswarm_clickData, n_clicks):
 
 ###############################################################################
 # update heatmap
-@callback(
-    Output('map-heatmap', 'figure'),
-    State('map-state', 'data'),
-    Input('global-clickData', 'data'),
-    Input('crossfilter-year-slider', 'value'),
-    Input('crossfilter-attacktype-dropdown', 'value'),
-    Input('crossfilter-weapontype-dropdown', 'value'),
-    Input('crossfilter-targettype-dropdown', 'value'),
-    Input('crossfilter-group-dropdown', 'value'),
-    Input('toggle-metric', 'value'),
-    running=[(Output('crossfilter-attacktype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-weapontype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-targettype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-year-slider', 'disabled'), True, False),
-             (Output('crossfilter-group-dropdown', 'disabled'), True, False),
-             (Output('toggle-metric', 'disabled'), True, False)],
-    prevent_initial_call=True)
-def update_map_heatmap(map_state, clickData, year_range, attacktype, weapontype, targettype, group, metric):
+def build_map_heatmap(map_state, clickData, recenter, year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode, metric, playback, coarse=False):
+    dataset = get_dataset()
+
     # get cached data
-    dff = filter_data(df_terror, year_range, attacktype, weapontype, targettype, group)
+    dff = serve_filter_data(year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode)
     
     if metric == 'casualties':
-        z_value = 'total_casualties_visualized'
+        z = dff['total_casualties_visualized']
         max_density = 50
         colorbar_title = "Casualties"
-        title = 'Where do casualties occur?'
+        title_text = 'Where do casualties occur?'
+    elif metric == 'attacks_per_million':
+        z = per_million(dff)
+        max_density = 5
+        colorbar_title = "Attacks per million"
+        title_text = 'Where do attacks occur relative to population?'
+    elif metric == 'casualties_per_million':
+        z = per_million(dff, 'total_casualties_visualized')
+        max_density = 50
+        colorbar_title = "Casualties per million"
+        title_text = 'Where do casualties occur relative to population?'
     else:
-        z_value = None
+        z = None
         max_density = 50
         colorbar_title = "Attacks"
-        title = 'Where do attacks occur?'
+        title_text = 'Where do attacks occur?'
+    tickvals = np.linspace(0, max_density, 6)
+    ticktext = [f'{tick:g}' for tick in tickvals[:-1]] + [f'{max_density:g}+']
 
     # reversed truncated ice scale
     color_scale = [
@@ -350,66 +927,31 @@ def update_map_heatmap(map_state, clickData, year_range, attacktype, weapontype,
     zoom = map_state['zoom']
     center = map_state['center']
 
-    trigger = list(ctx.triggered_prop_ids.keys())
-    if 'global-clickData.data' in trigger and clickData['data'] is not None:
-        if clickData['trigger'] != 'map-heatmap.clickData':
-            clicked_lat = clickData['data'][1]
-            clicked_lon = clickData['data'][2]
-            center = {'lat':clicked_lat, 'lon':clicked_lon}
-
-    fig = go.Figure()
-    fig.add_trace(
-        go.Densitymap(
-            lat=dff['latitude_jitter'],
-            lon=dff['longitude_jitter'],
-            z=dff[z_value] if z_value else None,
-            radius=default.marker_size.value,
-            opacity=1,
-            zmin=0,
-            zmax=max_density,
-            colorscale=color_scale,
-            colorbar=dict(
-                title=colorbar_title,
-                tickvals=[0, 10, 20, 30, 40, 50],   # Define tick values
-                ticktext=["0", "10", "20", "30", "40", "50+"],  # Custom tick labels
-            ),
-            showscale=True,
-            name="",
-        )
-    )
+    # center on a point selected in another chart
+    if recenter:
+        clicked_lat = clickData['data'][1]
+        clicked_lon = clickData['data'][2]
+        center = {'lat':clicked_lat, 'lon':clicked_lon}
 
-    fig.update_traces(customdata=dff[customdata_list],
-                      # update hover box
-                      hovertemplate="<b>%{customdata[3]}-%{customdata[4]}-%{customdata[5]} %{customdata[9]}, %{customdata[6]}</b><br>"
-                                    "Group: %{customdata[25]}<br>"
-                                    "Attack type: %{customdata[15]}<br>"
-                                    "Weapon type: %{customdata[18]}<br>"
-                                    "Target type: %{customdata[20]}<br>",
-                      hoverlabel=dict(
-                          bgcolor=default.highlight_color.value,
-                          bordercolor=default.hover_bordercolor.value,
-                          font=default.hover_font_dict.value
-                      )
-    )
-    
-    fig.update_layout(
-        title=dict(
-            text=title,
-            yref="container",
-            yanchor="top",
-            y=0.96,
-            xref="paper",
-            xanchor="center",
-            x=0.5,
-            font=default.title_dict.value
-        ),
+    if playback:
+        return build_map_playback(dff, z, title_text, colorbar_title, color_scale, max_density, tickvals, ticktext, center, zoom)
+
+    if map_level(map_state) == 'countries':
+        # at world zoom the totals per country are drawn rather than a density of all attacks
+        totals = country_totals(year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode, metric)
+        data = [build_map_rollup(totals, colorbar_title, color_scale)]
+    else:
+        data = [build_map_density(dff, z, colorbar_title, color_scale, max_density, tickvals, ticktext, coarse)]
+
+    layout = dict(
+        title=title(title_text, 0.96),
         margin=dict(l=0, r=0, t=40, b=45),
-        coloraxis_colorbar=dict(
+        coloraxis=dict(colorbar=dict(
             title=dict(
                 text=colorbar_title,
-                font=default.label_dict.value),
-            titleside="right",
-        ),
+                font=default.label_dict.value,
+                side="right"),
+        )),
         map=dict(
             style="light", # open-street-map
             center=center,
@@ -425,6 +967,21 @@ def update_map_heatmap(map_state, clickData, year_range, attacktype, weapontype,
         # get current point
         clicked_lat = clickData['data'][1]
         clicked_lon = clickData['data'][2]
+
+        # highlight similar attacks regardless of the filters
+        similar = dataset.df.iloc[get_similar_rows(clickData['data'][0])]
+        data.append(dict(
+            type='scattermap',
+            mode='markers',
+            lon=similar['longitude_jitter'].to_numpy(),
+            lat=similar['latitude_jitter'].to_numpy(),
+            marker=dict(size=default.similar_size.value,
+                        color=default.similar_color.value),
+            name='Similar',
+            hoverinfo='skip', # no hover info
+            showlegend=False, # don't show in legend
+        ))
+
         related = clickData['data'][14]
         if related:
             # format ids of related attacks
@@ -433,47 +990,204 @@ def update_map_heatmap(map_state, clickData, year_range, attacktype, weapontype,
             related_gps = dff[dff['eventid'].isin(related_split)][['eventid', 'latitude_jitter', 'longitude_jitter']]
             for idx, (_, row) in  enumerate(related_gps.iterrows()):
                 # highlight related attacks and draw lines to them
-                fig.add_trace(
-                    go.Scattermap(
-                        mode='lines+markers',
-                        lon=[clicked_lon, row['longitude_jitter']],
-                        lat=[clicked_lat, row['latitude_jitter']],
-                        line=dict(width=3, 
-                                  color=default.related_color.value),
-                        marker=dict(size=default.related_size.value, 
-                                    color=default.related_color.value),
-                        name=f'Related {idx+1}',
-                        hoverinfo='skip', # no hover info
-                        showlegend=False, # don't show in legend
-                    ),
-                )
+                data.append(dict(
+                    type='scattermap',
+                    mode='lines+markers',
+                    lon=[clicked_lon, row['longitude_jitter']],
+                    lat=[clicked_lat, row['latitude_jitter']],
+                    line=dict(width=3, 
+                              color=default.related_color.value),
+                    marker=dict(size=default.related_size.value, 
+                                color=default.related_color.value),
+                    name=f'Related {idx+1}',
+                    hoverinfo='skip', # no hover info
+                    showlegend=False, # don't show in legend
+                ))
         # plot clicked point if it's still in the filtered data
         clicked_eventid = clickData['data'][0]
         is_eventid_present = dff['eventid'].isin([clicked_eventid]).any()
         if is_eventid_present:
-            fig.add_trace(
-                go.Scattermap(
-                    mode='markers',
-                    lon=[clicked_lon],
-                    lat=[clicked_lat],
-                    marker=dict(size=default.selection_size.value, 
-                                color=default.selection_color.value),
-                    hoverinfo='skip', # no hover info
-                    showlegend=False, # don't show in legend
-                ),
-            )
+            data.append(dict(
+                type='scattermap',
+                mode='markers',
+                lon=[clicked_lon],
+                lat=[clicked_lat],
+                marker=dict(size=default.selection_size.value, 
+                            color=default.selection_color.value),
+                hoverinfo='skip', # no hover info
+                showlegend=False, # don't show in legend
+            ))
     
-    return fig
+    return build_figure(data, layout)
+
+
+def build_map_rollup(totals, colorbar_title, color_scale):
+    # a marker per country at the mean location of its attacks, sized and colored by its total.
+    # without customdata, as a click on a country does not select an attack
+    dataset = get_dataset()
+    centroids = dataset.country_centroids
+    shown = np.flatnonzero((totals['country'] > 0) & ~np.isnan(centroids['lat']))
+    values = totals['country'][shown]
+    max_value = values.max() if values.shape[0] else 1
+
+    countries = dataset.countries.iloc[shown]
+    region_values = totals['region'][countries['region_id'].to_numpy()]
+    value_format = '{:,.1f}' if 'million' in totals['metric'] else '{:,.0f}'
+    text = [f"<b>{country}</b><br>{colorbar_title}: {value_format.format(value)}<br>"
+            f"{colorbar_title} in {region}: {value_format.format(region_value)}"
+            for country, region, value, region_value
+            in zip(countries['country_txt'], countries['region_txt'], values, region_values)]
+
+    return dict(
+        type='scattermap',
+        mode='markers',
+        lat=centroids['lat'][shown],
+        lon=centroids['lon'][shown],
+        marker=dict(size=np.sqrt(values / max_value) * default.rollup_max_size.value,
+                    sizemin=3,
+                    color=values,
+                    cmin=0,
+                    cmax=max_value,
+                    colorscale=color_scale,
+                    colorbar=dict(title=dict(text=colorbar_title)),
+                    showscale=True,
+                    opacity=0.8),
+        text=text,
+        name="",
+        hovertemplate="%{text}",
+        hoverlabel=hoverlabel(default.highlight_color.value)
+    )
+
+
+def map_level(map_state):
+    # countries at world zoom, attacks once zoomed in. a map not moved yet is at the default zoom
+    zoom = map_state['zoom'] if map_state['zoom'] is not None else default.zoom.value
+    return 'countries' if zoom < default.rollup_zoom.value else 'attacks'
+
+
+# totals of the metric per country and region under all filters
+rollup_groups = {'attacks': ('country_attacks', 'rows'), 'casualties': ('country_casualties', 'sum'),
+                 'attacks_per_million': ('country_attacks', 'sum'),
+                 'casualties_per_million': ('country_casualties_per_million', 'sum')}
+# the rates of a region are over its population, summing its countries' rates would overstate them
+region_rate_groups = {'attacks_per_million': 'region_attacks_per_million',
+                      'casualties_per_million': 'region_casualties_per_million'}
+
+
+def country_totals(year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode, metric):
+    dataset = get_dataset()
+    n_countries = len(dataset.countries)
+    if search:
+        # a search leaves few rows, which are summed directly
+        dff = serve_filter_data(year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode)
+        values = {'attacks': None, 'casualties': dff['total_casualties'].fillna(0).to_numpy(),
+                  'attacks_per_million': per_million(dff),
+                  'casualties_per_million': per_million(dff, 'total_casualties')}[metric]
+        country = np.bincount(dff['country_id'].to_numpy(), weights=values, minlength=n_countries).astype(np.float64)
+        region = None
+        if metric in region_rate_groups:
+            region_id = dataset.countries['region_id'].to_numpy()[dff['country_id'].to_numpy()]
+            values = per_million_of_region(dff, None if metric == 'attacks_per_million' else 'total_casualties')
+            region = np.bincount(region_id, weights=values, minlength=len(dataset.regions))
+    else:
+        name, field = rollup_groups[metric]
+        region_name = region_rate_groups.get(metric)
+        aggregates = query_crossfilter([name] + ([region_name] if region_name else []), year=year_range, date=date_range,
+                                       attacktype=attacktype, weapontype=weapontype, targettype=targettype, group=group)
+        country = aggregates[name][field].astype(np.float64)
+        region = aggregates[region_name]['sum'].astype(np.float64) if region_name else None
+    if region is None:
+        region = np.bincount(dataset.countries['region_id'].to_numpy(), weights=country, minlength=len(dataset.regions))
+    return dict(country=country, region=region, metric=metric)
+
+
+def build_map_density(dff, z, colorbar_title, color_scale, max_density, tickvals, ticktext, coarse):
+    trace = dict(
+        type='densitymap',
+        radius=default.marker_size.value,
+        opacity=1,
+        zmin=0,
+        zmax=max_density,
+        colorscale=color_scale,
+        colorbar=dict(
+            title=dict(text=colorbar_title),
+            tickvals=tickvals,   # Define tick values
+            ticktext=ticktext,  # Custom tick labels
+        ),
+        showscale=True,
+        name="",
+        hoverlabel=hoverlabel(default.highlight_color.value)
+    )
+    if coarse:
+        # attacks summed per cell of a coarse grid, without hover until the attacks are drawn
+        bins = build_density_bins(dff, 1 if z is None else np.asarray(z), default.coarse_cell_size.value)
+        trace.update(lat=bins['lat'], lon=bins['lon'], z=bins['z'].sum(axis=1), hoverinfo='skip')
+    else:
+        trace.update(lat=dff['latitude_jitter'].to_numpy(),
+                     lon=dff['longitude_jitter'].to_numpy(),
+                     customdata=dff[customdata_list].to_numpy(),
+                     # update hover box
+                     hovertemplate=attack_hovertemplate)
+        if z is not None:
+            trace['z'] = np.asarray(z)
+    return trace
+
+
+def build_map_playback(dff, z, title_text, colorbar_title, color_scale, max_density, tickvals, ticktext, center, zoom):
+    # all years of the selection binned in one pass, played back client side
+    weights = 1.0 if z is None else np.nan_to_num(np.asarray(z, dtype=np.float64))
+    bins = build_density_bins(dff, weights, default.playback_cell_size.value)
+    summaries = build_year_summaries(dff, weights)
+    frames, updatemenus, sliders = build_playback_frames(bins, summaries, title_text, default.playback_frame_duration.value)
+
+    data = [dict(
+        type='densitymap',
+        lat=bins['lat'],
+        lon=bins['lon'],
+        z=bins['z'][:, 0] if bins['z'].shape[1] else [],
+        radius=default.marker_size.value,
+        opacity=1,
+        zmin=0,
+        zmax=max_density,
+        colorscale=color_scale,
+        colorbar=dict(
+            title=dict(text=colorbar_title),
+            tickvals=tickvals,
+            ticktext=ticktext,
+        ),
+        showscale=True,
+        hoverinfo='skip',
+        name="",
+    )]
+
+    layout = dict(
+        title=title(frames[0]['layout']['title']['text'] if frames else title_text, 0.96),
+        margin=dict(l=0, r=0, t=40, b=45),
+        map=dict(
+            style="light",
+            center=center,
+            zoom=zoom,
+        ),
+        updatemenus=updatemenus,
+        sliders=sliders,
+        width=900,
+        height=500
+    )
+
+    return build_figure(data, layout, frames)
 
 
 # update heatmap state
+# the level only changes when the zoom crosses default.rollup_zoom, which redraws the heatmap
 @callback(
     Output('map-state', 'data'),
+    Output('map-level', 'data'),
     Input('map-heatmap', 'relayoutData'),
     Input('global-clickData', 'data'),
+    State('map-level', 'data'),
     prevent_initial_call=True
 )
-def update_map_state(relayoutData, clickData):
+def update_map_state(relayoutData, clickData, level):
     if relayoutData is not None:
         current_zoom = relayoutData.get('map.zoom')
         current_center = relayoutData.get('map.center')
@@ -484,26 +1198,35 @@ def update_map_state(relayoutData, clickData):
         if 'global-clickData.data' in trigger and clickData['data'] is not None:
             clicked_lat = clickData['data'][1]
             clicked_lon = clickData['data'][2]
-            return {'zoom': current_zoom,
-                    'center': {'lat':clicked_lat, 'lon':clicked_lon}}
+            map_state = {'zoom': current_zoom,
+                         'center': {'lat':clicked_lat, 'lon':clicked_lon}}
+            return map_state, updated_level(map_state, level)
 
         # if triggered by relayout then update state
         if 'map-heatmap.relayoutData' in trigger:
-            return {'zoom': current_zoom, 
-                    'center': current_center}
+            map_state = {'zoom': current_zoom, 
+                         'center': current_center}
+            return map_state, updated_level(map_state, level)
     
-    return no_update
+    return no_update, no_update
+
+
+def updated_level(map_state, level):
+    return no_update if map_level(map_state) == level else map_level(map_state)
 
 
 ###############################################################################
 # update infobox
 @callback(
     Output('info-box', 'children'),
-    Input('global-clickData', 'data'))
+    Input('global-clickData', 'data'),
+    prevent_initial_call=True)
 def update_info_box(clickData):
-    if clickData['data'] is None:
+    # the clicked attack is looked up by eventid, and dropped if it is not in the current dataset
+    dataset = get_dataset()
+    text_row = None if clickData['data'] is None else dataset.get_row(clickData['data'][0])
+    if text_row is None:
         return html.Div(
-            id='info-box', 
             style={
                 'width': '100%',
                 'height': '100px',
@@ -526,11 +1249,14 @@ def update_info_box(clickData):
     region = clickData['data'][7]
     provstate = clickData['data'][8]
     city = clickData['data'][9]
-    summary = clickData['data'][10]
     crit1 = clickData['data'][11]
     crit2 = clickData['data'][12]
     crit3 = clickData['data'][13]
     related = clickData['data'][14]
+
+    # free-text fields are fetched from the text store for the clicked attack only
+    text = dataset.text_store.get_row(text_row, text_columns)
+    summary = text['summary']
     
     # Attack types
     attacktype1 = clickData['data'][15]
@@ -558,55 +1284,55 @@ def update_info_box(clickData):
     #targsubtype3 = point_data['data'][28]
     
     # Corporate 
-    corp1 = clickData['data'][22]
+    corp1 = text['corp1']
     #corp2 = point_data['data'][30]
     #corp3 = point_data['data'][31]
     
     # Target
-    target1 = clickData['data'][23]
+    target1 = text['target1']
     #target2 = point_data['data'][33]
     #target3 = point_data['data'][34]
     
     # Target nationaly
-    natlty1 = clickData['data'][24]
+    natlty1 = clickData['data'][22]
     #natlty2 = point_data['data'][36]
     #natlty3 = point_data['data'][37]
     
     # Groups
-    group = clickData['data'][25]
-    guncertain = clickData['data'][26]
-    nperps = clickData['data'][27]
-    motive = clickData['data'][28]
+    group = clickData['data'][23]
+    guncertain = clickData['data'][24]
+    nperps = clickData['data'][25]
+    motive = text['motive']
     
     # Casualties and injuries
-    nkill = 'Unknown' if clickData['data'][29] is None else clickData['data'][29]
-    nkillter = clickData['data'][30]
-    nwound = 'Unknown' if clickData['data'][31] is None else clickData['data'][31]
-    nwoundte = clickData['data'][32]
+    nkill = 'Unknown' if clickData['data'][26] is None else clickData['data'][26]
+    nkillter = clickData['data'][27]
+    nwound = 'Unknown' if clickData['data'][28] is None else clickData['data'][28]
+    nwoundte = clickData['data'][29]
     
     # Property damage
-    property = clickData['data'][33]
-    propvalue = clickData['data'][34]
+    property = clickData['data'][30]
+    propvalue = clickData['data'][31]
     
     # Hostage information
-    ishostkid = clickData['data'][35]
-    nhostkid = clickData['data'][36]
-    nhours = clickData['data'][37]
-    ndays = clickData['data'][38]
+    ishostkid = clickData['data'][32]
+    nhostkid = clickData['data'][33]
+    nhours = clickData['data'][34]
+    ndays = clickData['data'][35]
     
     # Flag
-    flag = clickData['data'][39]
+    flag = clickData['data'][36]
 
     # our column
-    total_casualties = clickData['data'][40]
+    total_casualties = clickData['data'][37]
 
     # source
-    scite1 = clickData['data'][41]
+    scite1 = text['scite1']
 
     # extent of damage (class)
-    propextent = clickData['data'][42]
+    propextent = clickData['data'][38]
 
-    claimmode = clickData['data'][43]
+    claimmode = clickData['data'][39]
 
     selection_style = {"width": f"{default.selection_size.value}px", 
                        "height": f"{default.selection_size.value}px",
@@ -622,6 +1348,13 @@ def update_info_box(clickData):
                        "display": "inline-block",
                        "marginRight": f"{default.related_size.value}px"}
 
+    similar_style = {"width": f"{default.similar_size.value}px", 
+                     "height": f"{default.similar_size.value}px",
+                     "backgroundColor": default.similar_color.value,
+                     "borderRadius": "50%",
+                     "display": "inline-block",
+                     "marginRight": f"{default.similar_size.value}px"}
+
     criterion_colormap = {0:default.background_color.value, 1:default.selection_color.value}
     criterion_info = {1:dict(value=crit1, symbol='➊', details=html.Div(['Indication that act is aimed at attaining a', html.Br(), 'political, economic, religious or social goal'])),
                       2:dict(value=crit2, symbol='➋', details=html.Div(['Evidence of intention to coerce, intimidate', html.Br(), 'or convey message to larger audience(s)', html.Br(), 'other than the immediate victim(s).'])),
@@ -674,9 +1407,19 @@ def update_info_box(clickData):
         box_content.append(html.Div([html.Br(), html.Strong('Summary of attack:'), html.Br(), html.Span(summary)]))
     box_content.append(html.Div([html.Br(), html.Strong("Source: "), html.Span(scite1)]))
 
+    # similar attacks from the precomputed neighbour graph
+    similar = dataset.df.iloc[get_similar_rows(eventid)]
+    if similar.shape[0] > 0:
+        box_content.append(html.Div([html.Br(), html.Strong("Similar attacks:")]))
+        for _, row in similar.iterrows():
+            date = f"{row['iday']:.0f}-{row['imonth']:.0f}-{row['iyear']}".replace('nan', '?')
+            casualties = 'unknown' if pd.isna(row['total_casualties']) else f"{row['total_casualties']:.0f}"
+            box_content.append(html.Div([html.Span(style=similar_style),
+                                         html.Span(f"{date} {row['city']}, {row['country_txt']}: "
+                                                   f"{row['attacktype1_txt']} by {row['gname']}, {casualties} casualties")]))
+
     # return info box
     info_box = html.Div(
-        id='info-box', 
         style={
             'width': '100%',
             'height': '200px',
@@ -692,46 +1435,24 @@ def update_info_box(clickData):
 
 ###############################################################################
 # update parallel sets
-@callback(
-        Output('chart-parallel-sets', 'figure'),
-        Input('crossfilter-year-slider', 'value'),
-        Input('crossfilter-attacktype-dropdown', 'value'),
-        Input('crossfilter-weapontype-dropdown', 'value'),
-        Input('crossfilter-targettype-dropdown', 'value'),
-        Input('crossfilter-group-dropdown', 'value'),
-        running=[(Output('crossfilter-attacktype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-weapontype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-targettype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-year-slider', 'disabled'), True, False),
-             (Output('crossfilter-group-dropdown', 'disabled'), True, False),
-             (Output('toggle-metric', 'disabled'), True, False)])
-def update_chart_parallel_sets(year_range, attacktype, weapontype, targettype, group):
+def build_chart_parallel_sets(year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode):
     #dff = filter_years(df_terror, year_range)
-    dff = filter_data(df_terror, year_range, None, None, None, group)
+    dff = serve_filter_data(year_range, date_range, None, None, None, group, search, search_mode)
 
     # set value for color based on filters
-    dff['highlight'] = 1
-    if (weapontype or attacktype or targettype):
-        # define condition by boolean vector or True
-        weapon_condition = dff['weaptype1_txt'].isin(weapontype) if weapontype else True
-        attack_condition = dff['attacktype1_txt'].isin(attacktype) if attacktype else True
-        target_condition = dff['targtype1_txt'].isin(targettype) if targettype else True
-        condition = weapon_condition & attack_condition & target_condition
-
-        # set opacity based on condition
-        dff.loc[condition == True, 'highlight'] = 1
-        dff.loc[condition == False, 'highlight'] = 0
-    
+    highlight = match_types(dff, attacktype, weapontype, targettype).astype(np.int8)
+
     # define order of dimensions based on number of attacks consistent with beeswarm
-    attack_order = dff.groupby(['attacktype1_txt'])['attacktype1_txt'].count().sort_values(ascending=False).index
-    weapon_order = dff.groupby(['weaptype1_txt'])['weaptype1_txt'].count().sort_values(ascending=False).index
-    target_order = dff.groupby(['targtype1_txt'])['targtype1_txt'].count().sort_values(ascending=False).index
+    type_counts = count_types(dff, year_range, date_range, group, search)
+    attack_order = type_counts['attacktype'].sort_values(ascending=False).index
+    weapon_order = type_counts['weapontype'].sort_values(ascending=False).index
+    target_order = type_counts['targettype'].sort_values(ascending=False).index
 
     # set dimensions with labels
     dimensions=[
-        dict(values=dff['attacktype1_txt'], label="Attacks", categoryarray=attack_order),
-        dict(values=dff['weaptype1_txt'], label="Weapons", categoryarray=weapon_order),
-        dict(values=dff['targtype1_txt'], label="Targets", categoryarray=target_order)
+        dict(values=dff['attacktype1_txt'].to_numpy(), label="Attacks", categoryarray=list(attack_order)),
+        dict(values=dff['weaptype1_txt'].to_numpy(), label="Weapons", categoryarray=list(weapon_order)),
+        dict(values=dff['targtype1_txt'].to_numpy(), label="Targets", categoryarray=list(target_order))
     ]
 
     # set color scale for highlights
@@ -739,62 +1460,36 @@ def update_chart_parallel_sets(year_range, attacktype, weapontype, targettype, g
                         [1, default.highlight_color.value]] # blue when filters
 
     # parallel categories
-    fig = go.Figure(
-        go.Parcats(
-            dimensions=dimensions,
-            line=dict(
-                color=dff['highlight'], # color based on level of highlight
-                colorscale=hightlight_scale,
-                shape='hspline', # smooth curves rather than linear lines
-            ),
-            labelfont=default.label_dict.value,
-            tickfont=dict(color=default.font_color.value, family=default.font_type.value, size=10, weight=10),
-            sortpaths='forward',
-            hoveron='category',
-            hoverinfo='count'
-        )
-    )
-
-    # Update layout for improved readability and consistency
-    fig.update_layout(
-        title=dict(
-            text="How are attacks, weapons and targets related?",
-            yref="container",
-            yanchor="top",
-            y=0.95,
-            xref="paper",
-            xanchor="center",
-            x=0.5,
-            font=default.title_dict.value
+    data = [dict(
+        type='parcats',
+        dimensions=dimensions,
+        line=dict(
+            color=highlight, # color based on level of highlight
+            colorscale=hightlight_scale,
+            shape='hspline', # smooth curves rather than linear lines
         ),
+        labelfont=default.label_dict.value,
+        tickfont=dict(color=default.font_color.value, family=default.font_type.value, size=10, weight=10),
+        sortpaths='forward',
+        hoveron='category',
+        hoverinfo='count'
+    )]
+
+    # layout for improved readability and consistency
+    layout = dict(
+        title=title("How are attacks, weapons and targets related?", 0.95),
         font=default.label_dict.value,
         margin=dict(l=150, r=100, t=70, b=10), # ensure labels can be read
         plot_bgcolor=default.plot_bgcolor.value,
         width=900,
         height=500
     )
-     
-    return fig
+
+    return build_figure(data, layout)
 
 
 # update filters interactively in parallel sets
-@callback(
-    Output('crossfilter-attacktype-dropdown', 'value'),
-    Output('crossfilter-weapontype-dropdown', 'value'),
-    Output('crossfilter-targettype-dropdown', 'value'),
-    State('crossfilter-attacktype-dropdown', 'value'),
-    State('crossfilter-weapontype-dropdown', 'value'),
-    State('crossfilter-targettype-dropdown', 'value'),
-    State('crossfilter-year-slider', 'value'),
-    State('crossfilter-group-dropdown', 'value'),
-    Input('chart-parallel-sets', 'clickData'),
-    running=[(Output('crossfilter-attacktype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-weapontype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-targettype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-year-slider', 'disabled'), True, False),
-             (Output('crossfilter-group-dropdown', 'disabled'), True, False),
-             (Output('toggle-metric', 'disabled'), True, False)])
-def update_parallel_categories_filters(attacktype, weapontype, targettype, year_range, group, clickData):
+def update_parallel_categories_filters(attacktype, weapontype, targettype, year_range, date_range, group, search, search_mode, clickData):
     def update_filter(filter_current, filter_new_list):
         # if the attribute value is the same for all clicked points
         if len(filter_new_list) == 1:
@@ -816,7 +1511,7 @@ def update_parallel_categories_filters(attacktype, weapontype, targettype, year_
         return filter_current
 
     # filter data
-    dff = filter_data(df_terror, year_range, None, None, None, group)
+    dff = serve_filter_data(year_range, date_range, None, None, None, group, search, search_mode)
 
     attacktype_current = attacktype
     weapontype_current = weapontype
@@ -843,27 +1538,12 @@ def update_parallel_categories_filters(attacktype, weapontype, targettype, year_
 
 ###############################################################################
 # update beeswarm
-@callback(
-        Output('chart-beeswarm', 'figure'),
-        Input('global-clickData', 'data'),
-        Input('crossfilter-year-slider', 'value'),
-        Input('crossfilter-attacktype-dropdown', 'value'),
-        Input('crossfilter-weapontype-dropdown', 'value'),
-        Input('crossfilter-targettype-dropdown', 'value'),
-        Input('crossfilter-group-dropdown', 'value'),
-        running=[(Output('crossfilter-attacktype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-weapontype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-targettype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-year-slider', 'disabled'), True, False),
-             (Output('crossfilter-group-dropdown', 'disabled'), True, False),
-             (Output('toggle-metric', 'disabled'), True, False)])
-def update_chart_beeswarm(clickData, year_range, attacktype, weapontype, targettype, group):
-    dff = filter_data(df_terror, year_range, None, None, None, group)
+def build_chart_beeswarm(clickData, year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode, coarse=False):
+    dff = serve_filter_data(year_range, date_range, None, None, None, group, search, search_mode)
 
     # Sort and map categories
     category_order = (
-        dff.groupby('targtype1_txt')['total_casualties']
-        .count()
+        count_types(dff, year_range, date_range, group, search)['target_casualties']
         .sort_values(ascending=True)
         .index
         .tolist()
@@ -871,17 +1551,11 @@ def update_chart_beeswarm(clickData, year_range, attacktype, weapontype, targett
     category_to_y = {cat: i for i, cat in enumerate(category_order)}
 
     # apply jitter
-    dff['y_jittered'] = dff['targtype1_txt'].map(category_to_y) + dff['beeswarm_jitter']
+    y_jittered = dff['targtype1_txt'].map(category_to_y).astype(float).to_numpy() + dff['beeswarm_jitter'].to_numpy()
     
 
     # Set default highlight and define filters
-    dff['highlight'] = 1
-    if weapontype or attacktype or targettype:
-        weapon_condition = dff['weaptype1_txt'].isin(weapontype) if weapontype else True
-        attack_condition = dff['attacktype1_txt'].isin(attacktype) if attacktype else True
-        target_condition = dff['targtype1_txt'].isin(targettype) if targettype else True
-        condition = weapon_condition & attack_condition & target_condition
-        dff.loc[~condition, 'highlight'] = 0
+    highlight = match_types(dff, attacktype, weapontype, targettype).astype(np.int8)
 
     # Highlight based on related and clickData 
     if clickData['data'] is not None:
@@ -890,11 +1564,11 @@ def update_chart_beeswarm(clickData, year_range, attacktype, weapontype, targett
         if related:
             # format ids of related attacks
             related_split = get_related_ids(related)
-            dff.loc[dff['eventid'].isin(related_split), 'highlight'] = 2
+            highlight[dff['eventid'].isin(related_split).to_numpy()] = 2
         
         # get click
         clicked_eventid = clickData['data'][0]
-        dff.loc[dff['eventid'] == clicked_eventid, 'highlight'] = 3
+        highlight[(dff['eventid'] == clicked_eventid).to_numpy()] = 3
 
 
     # Set color mapping
@@ -903,85 +1577,50 @@ def update_chart_beeswarm(clickData, year_range, attacktype, weapontype, targett
                        2: [default.related_color.value, default.related_size.value],
                        3: [default.selection_color.value, default.selection_size.value]}
 
-    # Create figure and add traces
-    fig = go.Figure()
+    # a coarse beeswarm keeps the attacks with most casualties of every target type and a sample of the rest
+    shown = np.ones(dff.shape[0], dtype=bool)
+    if coarse:
+        shown = sample_with_outliers(dff['eventid'].to_numpy(), dff['total_casualties'].to_numpy(dtype=np.float64),
+                                     dff['targtype1_txt'].cat.codes.to_numpy(), default.coarse_sample_size.value,
+                                     default.coarse_outliers.value, keep=highlight >= 2)
+
+    # an empty result, e.g. a search without matches, or one without known casualties keeps the axis of one casualty
+    x_max = dff['total_casualties'].max()
+    if not x_max > 0:
+        x_max = 1
 
     # scatterplot of background, highlight, related and selection
+    data = []
+    scaling_factor = -0.1*x_max
     for i in [0, 1, 2, 3]:
-        dff_condition = dff[dff['highlight'] == i]
-        scaling_factor = -0.1*dff['total_casualties'].max()
-        dff_condition['total_casualties'] = dff_condition['total_casualties'].fillna(scaling_factor)
-        fig.add_trace(
-            go.Scatter(
-                x=dff_condition['total_casualties'],
-                y=dff_condition['y_jittered'],
-                mode='markers',
-                marker=dict(size=highlight_scale[i][1], 
-                            color=highlight_scale[i][0]),
-                name="",
-                customdata=dff_condition[customdata_list].to_numpy(),
-                hovertemplate="<b>%{customdata[3]}-%{customdata[4]}-%{customdata[5]} %{customdata[9]}, %{customdata[6]}</b><br>"
-                              "Group: %{customdata[25]}<br>"
-                              "Attack type: %{customdata[15]}<br>"
-                              "Weapon type: %{customdata[18]}<br>"
-                              "Target type: %{customdata[20]}<br>",
-                hoverlabel=dict(
-                    bgcolor=highlight_scale[i][0],
-                    bordercolor=default.hover_bordercolor.value,
-                    font=default.hover_font_dict.value
-                )
-            )
-        )
-    
+        condition = (highlight == i) & shown
+        dff_condition = dff[condition]
+        data.append(dict(
+            type='scatter',
+            x=dff_condition['total_casualties'].fillna(scaling_factor).to_numpy(),
+            y=y_jittered[condition],
+            mode='markers',
+            marker=dict(size=highlight_scale[i][1],
+                        color=highlight_scale[i][0]),
+            name="",
+            customdata=dff_condition[customdata_list].to_numpy(),
+            hovertemplate=attack_hovertemplate,
+            hoverlabel=hoverlabel(highlight_scale[i][0])
+        ))
+
 
     # Calculate the range for ticks
-    x_min = -0.1*dff['total_casualties'].max()  # Include negative placeholder
-    x_max = dff['total_casualties'].max()
+    x_min = -0.1*x_max  # Include negative placeholder
     tickvals = dynamic_ticks(0, x_max)  # Exclude the negative placeholder for the range
     tickvals = np.insert(tickvals, 0, x_min)  # Add the negative placeholder
     ticktext = ["Unknown" if val < 0 else f"{int(val)}" for val in tickvals]
-    
-    # Update layout
-    fig.update_layout(
+
+    layout = dict(
         uirevision=default.redrawid.value,
-        title=dict(
-            text="Which attacks have the highest number of casualties?",
-            yref="container",
-            yanchor="top",
-            y=0.95,
-            xref="paper",
-            xanchor="center",
-            x=0.5,
-            font=default.title_dict.value
-        ),
+        title=title("Which attacks have the highest number of casualties?", 0.95),
         margin=dict(l=0, r=0, t=40, b=0),
-        xaxis=dict(
-            tickvals=tickvals,
-            ticktext=ticktext,
-            zeroline=True,
-            zerolinecolor=default.gridline_color.value,
-            zerolinewidth=default.gridline_width.value,
-            title=dict(
-                text='Number of casualties',
-                font=default.label_dict.value
-            ),
-            showgrid=True, 
-            gridcolor=default.gridline_color.value, 
-            gridwidth=default.gridline_width.value),
-        yaxis=dict(
-            zeroline=True,
-            zerolinecolor=default.gridline_color.value,
-            zerolinewidth=default.gridline_width.value,
-            tickvals=list(category_to_y.values()),
-            ticktext=list(category_to_y.keys()),
-            title=dict(
-                text='Target Type',
-                font=default.label_dict.value
-            ),
-            showgrid=True,
-            gridcolor=default.gridline_color.value,
-            gridwidth=default.gridline_width.value
-        ),
+        xaxis=axis('Number of casualties', tickvals=tickvals, ticktext=ticktext),
+        yaxis=axis('Target Type', tickvals=list(category_to_y.values()), ticktext=list(category_to_y.keys())),
         font=default.label_dict.value,
         showlegend=False,
         plot_bgcolor=default.plot_bgcolor.value,
@@ -992,14 +1631,14 @@ def update_chart_beeswarm(clickData, year_range, attacktype, weapontype, targett
                 type="line",
                 x0=scaling_factor/2,
                 x1=scaling_factor/2,
-                y0=-0.05*dff['y_jittered'].max(),
-                y1=1.05*dff['y_jittered'].max(),
+                y0=-0.05*np.nanmax(y_jittered, initial=0),
+                y1=1.05*np.nanmax(y_jittered, initial=0),
                 line=dict(color="black", width=2)
             )
         ]
     )
 
-    return fig
+    return build_figure(data, layout)
 
 
 # Define a utility to compute "nice" intervals and number of ticks
@@ -1023,29 +1662,21 @@ def dynamic_ticks(data_min, data_max, axis_length=900, target_tick_spacing=100):
 
 ###############################################################################
 # update scatter
-@callback(
-    Output('chart-scatter', 'figure'),
-    Input('crossfilter-year-slider', 'value'),
-    Input('crossfilter-attacktype-dropdown', 'value'),
-    Input('crossfilter-weapontype-dropdown', 'value'),
-    Input('crossfilter-targettype-dropdown', 'value'),
-    Input('crossfilter-group-dropdown', 'value'),
-    running=[(Output('crossfilter-attacktype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-weapontype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-targettype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-year-slider', 'disabled'), True, False),
-             (Output('crossfilter-group-dropdown', 'disabled'), True, False),
-             (Output('toggle-metric', 'disabled'), True, False)],
-    prevent_initial_call=True)
-def update_chart_scatter(year_range, attacktype, weapontype, targettype, group):
-    # get cached data
-    dff = filter_data(df_terror, year_range, attacktype, weapontype, targettype, None)
-
+def build_chart_scatter(year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode, expanded=None):
     # get number of attacks and sum of casualties per group
-    dff_grouped = (dff.groupby(['gname'])['total_casualties']
-                      .agg(['count', 'sum'])
-                      .reset_index(drop=False)
-                      .rename(columns={'count':'n_attacks', 'sum':'n_casualties'}))
+    if search:
+        # a search leaves few rows, which are aggregated directly
+        dff = serve_filter_data(year_range, date_range, attacktype, weapontype, targettype, None, search, search_mode)
+        dff_grouped = (dff.groupby(['gname'], observed=True)['total_casualties']
+                          .agg(['count', 'sum'])
+                          .reset_index(drop=False)
+                          .rename(columns={'count':'n_attacks', 'sum':'n_casualties'}))
+    else:
+        group_casualties = query_crossfilter(['group_casualties'], year=year_range, date=date_range, attacktype=attacktype,
+                                             weapontype=weapontype, targettype=targettype)['group_casualties']
+        dff_grouped = pd.DataFrame({'n_attacks': crossfilter_series(group_casualties, 'group', 'count'),
+                                    'n_casualties': crossfilter_series(group_casualties, 'group', 'sum')})
+        dff_grouped = dff_grouped.rename_axis('gname').reset_index(drop=False)
 
     # Set default highlight and define filters
     dff_grouped['highlight'] = 1
@@ -1059,37 +1690,73 @@ def update_chart_scatter(year_range, attacktype, weapontype, targettype, group):
     highlight_scale = {0: [default.background_color_group.value, default.marker_size.value], 
                        1: [default.highlight_color_group.value, default.marker_size.value]}
     
-    fig = go.Figure()
-
+    # groups with few attacks are drawn as cells of a log grid, unless selected or in an expanded cell.
+    # the cells are binned from the per group totals above, the last column of customdata is the cell
+    n_attacks = dff_grouped['n_attacks'].to_numpy(dtype=np.float64)
+    n_casualties = dff_grouped['n_casualties'].to_numpy(dtype=np.float64)
+    cells_per_decade = default.scatter_cells_per_decade.value
+    dff_grouped['cell'] = log_cells(n_attacks, cells_per_decade) * 1000 + log_cells(n_casualties, cells_per_decade)
+    tail = ((n_attacks < default.scatter_min_attacks.value)
+            & ~dff_grouped['gname'].isin(group or []).to_numpy()
+            & ~dff_grouped['cell'].isin(expanded or []).to_numpy())
+
+    data = []
     for i in [0, 1]:
-        condition = dff_grouped['highlight'] == i
-        fig.add_trace(
-            go.Scatter(
-                x=dff_grouped.loc[condition, 'n_attacks'],
-                y=dff_grouped.loc[condition, 'n_casualties'],
-                mode='markers',
-                marker=dict(size=highlight_scale[i][1], 
-                            color=highlight_scale[i][0]),
-                name="",
-                customdata=dff_grouped.loc[condition, ['gname', 'n_attacks', 'n_casualties']].to_numpy(),
-                hovertemplate="<b>%{customdata[0]}</b><br>"
-                              "Attacks: %{customdata[1]}<br>"
-                              "Casualties: %{customdata[2]}",
-                hoverlabel=dict(
-                    bgcolor=highlight_scale[i][0],
-                    bordercolor=default.hover_bordercolor.value,
-                    font=default.hover_font_dict.value
-                )
-            )
-        )
+        condition = (dff_grouped['highlight'] == i) & ~tail
+        customdata = dff_grouped.loc[condition, ['gname', 'n_attacks', 'n_casualties']].assign(cell=None)
+        data.append(dict(
+            type='scatter',
+            x=dff_grouped.loc[condition, 'n_attacks'].to_numpy(),
+            y=dff_grouped.loc[condition, 'n_casualties'].to_numpy(),
+            mode='markers',
+            marker=dict(size=highlight_scale[i][1],
+                        color=highlight_scale[i][0]),
+            name="",
+            customdata=customdata.to_numpy(),
+            hovertemplate="<b>%{customdata[0]}</b><br>"
+                          "Attacks: %{customdata[1]}<br>"
+                          "Casualties: %{customdata[2]}",
+            hoverlabel=hoverlabel(highlight_scale[i][0])
+        ))
+
+    # a marker per cell at the mean of its groups, sized by their number
+    cells, members = np.unique(dff_grouped['cell'].to_numpy()[tail], return_inverse=True)
+    n_groups = np.bincount(members, minlength=cells.shape[0])
+    ranges = []
+    for values in [n_attacks[tail], n_casualties[tail]]:
+        low = np.full(cells.shape[0], np.inf)
+        high = np.full(cells.shape[0], -np.inf)
+        np.minimum.at(low, members, values)
+        np.maximum.at(high, members, values)
+        ranges.append([f'{l:g}' if l == h else f'{l:g}-{h:g}' for l, h in zip(low, high)])
+    # the cells hold groups outside the group filter
+    cell_highlight = 0 if group else 1
+    data.append(dict(
+        type='scatter',
+        x=np.bincount(members, weights=n_attacks[tail], minlength=cells.shape[0]) / np.maximum(n_groups, 1),
+        y=np.bincount(members, weights=n_casualties[tail], minlength=cells.shape[0]) / np.maximum(n_groups, 1),
+        mode='markers',
+        marker=dict(size=highlight_scale[cell_highlight][1] * (1 + np.log10(np.maximum(n_groups, 1))),
+                    color=highlight_scale[cell_highlight][0],
+                    symbol='square',
+                    opacity=0.6),
+        name="",
+        customdata=np.array([[f'{n} group' if n == 1 else f'{n} groups', a, c, int(cell)] for n, a, c, cell in zip(n_groups, *ranges, cells)], dtype=object),
+        hovertemplate="<b>%{customdata[0]}</b><br>"
+                      "Attacks: %{customdata[1]}<br>"
+                      "Casualties: %{customdata[2]}<br>"
+                      "Click to show the groups",
+        hoverlabel=hoverlabel(highlight_scale[cell_highlight][0])
+    ))
 
 
     # add lines
-    mean_casualties_per_attack = dff_grouped['n_casualties'].sum()/dff_grouped['n_attacks'].sum()
-    max_casualties = dff_grouped['n_casualties'].max()
-    x_stop = max_casualties/mean_casualties_per_attack
+    # without groups or casualties, e.g. a search without matches, the line has no length
+    mean_casualties_per_attack = n_casualties.sum()/max(n_attacks.sum(), 1)
+    max_casualties = np.max(n_casualties, initial=0)
+    x_stop = max_casualties/mean_casualties_per_attack if mean_casualties_per_attack > 0 else 0
     extension = 1.1
-    fig.update_layout(
+    layout = dict(
         uirevision=default.redrawid.value,
         shapes=[
             dict(
@@ -1100,7 +1767,7 @@ def update_chart_scatter(year_range, attacktype, weapontype, targettype, group):
                 y1=x_stop*mean_casualties_per_attack*extension,
                 line=dict(
                     color='grey',
-                    width=2, 
+                    width=2,
                     dash='dash'
                 )
             )
@@ -1124,46 +1791,11 @@ def update_chart_scatter(year_range, attacktype, weapontype, targettype, group):
                 xanchor='left',
                 yanchor='top'
             )
-        ]
-    )
-
-    # Update layout
-    fig.update_layout(
-        title=dict(
-            text="Which groups cause most casualties?",
-            yref="container",
-            yanchor="top",
-            y=0.97,
-            xref="paper",
-            xanchor="center",
-            x=0.5,
-            font=default.title_dict.value
-        ),
+        ],
+        title=title("Which groups cause most casualties?", 0.97),
         margin=dict(l=0, r=0, t=40, b=0),
-        xaxis=dict(
-            zeroline=True,
-            zerolinecolor=default.gridline_color.value,
-            zerolinewidth=default.gridline_width.value,
-            title=dict(
-                text='Number of attacks',
-                font=default.label_dict.value
-            ),
-            showgrid=True, 
-            gridcolor=default.gridline_color.value, 
-            gridwidth=default.gridline_width.value
-        ),
-        yaxis=dict(
-            zeroline=True,
-            zerolinecolor=default.gridline_color.value,
-            zerolinewidth=default.gridline_width.value,
-            title=dict(
-                text='Sum of casualties',
-                font=default.label_dict.value
-            ),
-            showgrid=True,
-            gridcolor=default.gridline_color.value,
-            gridwidth=default.gridline_width.value
-        ),
+        xaxis=axis('Number of attacks'),
+        yaxis=axis('Sum of casualties'),
         font=default.label_dict.value,
         showlegend=False,
         plot_bgcolor=default.plot_bgcolor.value,
@@ -1171,20 +1803,10 @@ def update_chart_scatter(year_range, attacktype, weapontype, targettype, group):
         height=700
     )
 
-    return fig
+    return build_figure(data, layout)
 
 
 # update group filter by click in scatter
-@callback(
-    Output('crossfilter-group-dropdown', 'value'),
-    State('crossfilter-group-dropdown', 'value'),
-    Input('chart-scatter', 'clickData'),
-    running=[(Output('crossfilter-attacktype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-weapontype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-targettype-dropdown', 'disabled'), True, False),
-             (Output('crossfilter-year-slider', 'disabled'), True, False),
-             (Output('crossfilter-group-dropdown', 'disabled'), True, False),
-             (Output('toggle-metric', 'disabled'), True, False)])
 def update_group_filter(group, clickData):
     # if clicked
     if clickData is not None:
@@ -1208,13 +1830,363 @@ def update_group_filter(group, clickData):
     return no_update
 
 
+###############################################################################
+# update timeline
+def timeline_resolution(year_range):
+    return 'week' if year_range[1] - year_range[0] < default.timeline_week_years.value else 'month'
+
+
+def build_chart_timeline(year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode):
+    dataset = get_dataset()
+    resolution = timeline_resolution(year_range)
+    starts = period_starts(year_range, resolution)
+
+    # attacks and known casualties per day under all filters except the date range
+    if search:
+        # a search leaves few rows, which are counted directly
+        dff = serve_filter_data(year_range, None, attacktype, weapontype, targettype, group, search, search_mode)
+        codes = day_codes(dff['date'], dataset.year_min)
+        n_codes = n_day_codes(dataset.year_min, dataset.year_max)
+        rows = np.bincount(codes, minlength=n_codes)
+        casualties = np.bincount(codes, weights=dff['total_casualties'].fillna(0).to_numpy(), minlength=n_codes)
+    else:
+        date_counts = query_crossfilter(['date_counts'], year=year_range, attacktype=attacktype, weapontype=weapontype,
+                                        targettype=targettype, group=group)['date_counts']
+        rows, casualties = date_counts['rows'], date_counts['sum']
+
+    # rolled up into the weeks or months of the years
+    n_attacks = rollup(rows, dataset.year_min, starts, year_range[1])
+    n_casualties = rollup(casualties, dataset.year_min, starts, year_range[1])
+
+    # highlight the periods of the date range
+    highlight = np.ones(len(starts), dtype=np.int8)
+    if date_range is not None:
+        highlight = ((starts >= date_range[0]) & (starts <= date_range[1])).astype(np.int8)
+
+    highlight_scale = {0: default.background_color_group.value, 1: default.highlight_color_group.value}
+    period = dict(month=dict(xperiod='M1', hoverdate='%b %Y'),
+                  week=dict(xperiod=7 * 24 * 3600 * 1000, hoverdate='Week of %d %b %Y'))[resolution]
+    x = starts.strftime('%Y-%m-%d').to_numpy()
+
+    data = []
+    for i in [0, 1]:
+        condition = highlight == i
+        data.append(dict(
+            type='bar',
+            x=x[condition],
+            y=n_attacks[condition],
+            xperiod=period['xperiod'],
+            xperiodalignment='middle',
+            marker=dict(color=highlight_scale[i]),
+            name="",
+            hovertemplate="<b>%{x|" + period['hoverdate'] + "}</b><br>"
+                          "Attacks: %{y}",
+            hoverlabel=hoverlabel(highlight_scale[i])
+        ))
+    data.append(dict(
+        type='scatter',
+        x=x,
+        y=n_casualties,
+        xperiod=period['xperiod'],
+        xperiodalignment='middle',
+        yaxis='y2',
+        mode='lines',
+        line=dict(color='grey', width=1),
+        name="",
+        hovertemplate="<b>%{x|" + period['hoverdate'] + "}</b><br>"
+                      "Casualties: %{y}",
+        hoverlabel=hoverlabel('grey')
+    ))
+
+    layout = dict(
+        uirevision=default.redrawid.value,
+        title=title(f"When do attacks occur? (per {resolution}, drag to select dates)", 0.95),
+        margin=dict(l=0, r=0, t=40, b=0),
+        xaxis=axis('', type='date'),
+        yaxis=axis('Number of attacks'),
+        yaxis2=axis('Known casualties', overlaying='y', side='right', showgrid=False, rangemode='tozero'),
+        font=default.label_dict.value,
+        barmode='overlay',
+        bargap=0.1,
+        dragmode='select',
+        selectdirection='h',
+        showlegend=False,
+        plot_bgcolor=default.plot_bgcolor.value,
+        width=1400,
+        height=250
+    )
+
+    return build_figure(data, layout)
+
+
+def brushed_date_range(selectedData, year_range):
+    # the brushed dates widened to whole periods of the timeline, a cleared brush clears the range
+    if not selectedData or 'range' not in selectedData:
+        return None
+    return snap_date_range(selectedData['range']['x'], period_starts(year_range, timeline_resolution(year_range)), year_range[1])
+
+
+###############################################################################
+# update charts
+# one callback for all charts, so a click that changes the filters redraws every chart once
+# rather than updating the dropdowns and redrawing again from their change.
+# triggers not listed here redraw all charts
+chart_dependencies = {
+    'global-clickData.data': ['heatmap', 'beeswarm'],
+    'toggle-metric.value': ['heatmap'],
+    'toggle-playback.value': ['heatmap'],
+    'map-level.data': ['heatmap'],
+}
+
+@callback(
+    Output('map-heatmap', 'figure'),
+    Output('chart-parallel-sets', 'figure'),
+    Output('chart-beeswarm', 'figure'),
+    Output('chart-scatter', 'figure'),
+    Output('chart-timeline', 'figure'),
+    Output('crossfilter-attacktype-dropdown', 'value'),
+    Output('crossfilter-weapontype-dropdown', 'value'),
+    Output('crossfilter-targettype-dropdown', 'value'),
+    Output('crossfilter-group-dropdown', 'value'),
+    Output('refine-request', 'data'),
+    Output('scatter-expanded', 'data'),
+    Output('date-range', 'data'),
+    State('map-state', 'data'),
+    State('session-id', 'data'),
+    State('scatter-expanded', 'data'),
+    State('date-range', 'data'),
+    Input('global-clickData', 'data'),
+    Input('crossfilter-year-slider', 'value'),
+    Input('crossfilter-attacktype-dropdown', 'value'),
+    Input('crossfilter-weapontype-dropdown', 'value'),
+    Input('crossfilter-targettype-dropdown', 'value'),
+    Input('crossfilter-group-dropdown', 'value'),
+    Input('crossfilter-search-input', 'value'),
+    Input('toggle-search-mode', 'value'),
+    Input('toggle-metric', 'value'),
+    Input('toggle-playback', 'value'),
+    Input('chart-parallel-sets', 'clickData'),
+    Input('chart-scatter', 'clickData'),
+    Input('chart-timeline', 'selectedData'),
+    Input('map-level', 'data'),
+    prevent_initial_call=True,
+    running=[(Output('crossfilter-attacktype-dropdown', 'disabled'), True, False),
+             (Output('crossfilter-weapontype-dropdown', 'disabled'), True, False),
+             (Output('crossfilter-targettype-dropdown', 'disabled'), True, False),
+             (Output('crossfilter-year-slider', 'disabled'), True, False),
+             (Output('crossfilter-group-dropdown', 'disabled'), True, False),
+             (Output('toggle-metric', 'disabled'), True, False),
+             (Output('toggle-playback', 'disabled'), True, False)])
+@prefetcher.live
+def update_charts(map_state, session_id, expanded, date_range, clickData, year_range, attacktype, weapontype, targettype, group,
+                  search, search_mode, metric, playback, parallel_sets_clickData, scatter_clickData, timeline_selectedData,
+                  level):
+    trigger = list(ctx.triggered_prop_ids.keys())
+
+    # a brush on the timeline sets the date range, other years clear it
+    date_range_value = no_update
+    if 'chart-timeline.selectedData' in trigger:
+        date_range = date_range_value = brushed_date_range(timeline_selectedData, year_range)
+    elif 'crossfilter-year-slider.value' in trigger and date_range is not None:
+        date_range = date_range_value = None
+
+    # filters changed by a click in a chart are applied here and written back to the dropdowns
+    filter_values = [no_update] * 4
+    if 'chart-parallel-sets.clickData' in trigger:
+        attacktype, weapontype, targettype = update_parallel_categories_filters(attacktype, weapontype, targettype, year_range,
+                                                                                date_range, group, search, search_mode,
+                                                                                parallel_sets_clickData)
+        filter_values[:3] = [attacktype, weapontype, targettype]
+
+    # a click on a cell of the scatter expands it into its groups, or collapses it again
+    expanded_value = no_update
+    scatter_cell = None
+    if 'chart-scatter.clickData' in trigger:
+        scatter_cell = scatter_clickData['points'][0]['customdata'][3]
+        if scatter_cell is None:
+            group = update_group_filter(group, scatter_clickData)
+            filter_values[3] = group
+        else:
+            expanded = [cell for cell in expanded if cell != scatter_cell] if scatter_cell in expanded else expanded + [scatter_cell]
+            expanded_value = expanded
+
+    # charts that depend on what triggered the callback
+    if scatter_cell is not None:
+        charts = {'scatter'}
+    elif trigger and all(t in chart_dependencies for t in trigger):
+        charts = set(chart for t in trigger for chart in chart_dependencies[t])
+    else:
+        charts = {'heatmap', 'parallel-sets', 'beeswarm', 'scatter', 'timeline'}
+
+    # large results are drawn coarse first, refine_charts draws them in full once the inputs are enabled again
+    coarse = set()
+    if is_large_result(year_range, date_range, group, search, search_mode):
+        # playback and country totals are drawn from aggregates, which are small at any size
+        coarse = charts & ({'beeswarm'} if playback or level == 'countries' else {'heatmap', 'beeswarm'})
+
+    recenter = ('global-clickData.data' in trigger and clickData['data'] is not None
+                and clickData['trigger'] != 'map-heatmap.clickData')
+    filters = (year_range, date_range, attacktype, weapontype, targettype, group, search, search_mode)
+    tasks = chart_tasks(map_state, clickData, recenter, filters, metric, playback, coarse, expanded)
+    figures = build_charts({chart: task for chart, task in tasks.items() if chart in charts})
+    heatmap, parallel_sets, beeswarm, scatter, timeline = (figures.get(chart, no_update) for chart in tasks)
+
+    # this call supersedes the refinement of earlier calls, the charts they left coarse are refined with these inputs
+    refine = no_update
+    if charts & {'heatmap', 'beeswarm'}:
+        pending = cache.get(refine_key(session_id))
+        still_coarse = set(pending['charts']) - charts if pending else set()
+        refine = dict(token=uuid4().hex, charts=sorted(coarse | still_coarse),
+                      inputs=[clickData, recenter, *filters, metric, playback])
+        cache.set(refine_key(session_id), dict(token=refine['token'], charts=refine['charts']))
+        if not refine['charts']:
+            refine = no_update
+
+    return (heatmap, parallel_sets, beeswarm, scatter, timeline, *filter_values, refine, expanded_value, date_range_value)
+
+
+# figures built in parallel
+def load_dataset_without_server():
+    # the dataset in a process that serves no requests, such as a worker: without the loader, watcher
+    # and prefetch threads of the app, and with a cache of its own
+    global dataset, prefetcher
+    prefetcher = Prefetcher(max_pending=0)
+    server = Flask(__name__)
+    cache.init_app(server)
+    cache.app = server
+    dataset = Dataset(data_path)
+    return dataset
+
+
+def init_figure_worker():
+    # a worker is a new process rather than a fork of the server's threads, so it loads the dataset from disk
+    load_dataset_without_server()
+
+
+figure_pool = FigurePool(default.figure_workers.value, initializer=init_figure_worker)
+
+
+def build_chart_json(version, build, args):
+    # runs in a worker, which builds the figure of the version it loaded and serializes it,
+    # as serializing the numpy arrays of a figure takes about as long as building it.
+    # a worker started while a new version was written may have loaded that one instead
+    if get_dataset().version != version:
+        raise RuntimeError(f'worker has {get_dataset()!r} rather than {version}')
+    return to_json_plotly(build(*args))
+
+
+def chart_tasks(map_state, clickData, recenter, filters, metric, playback, coarse, expanded):
+    # builder and arguments of each chart
+    return {'heatmap': (build_map_heatmap, (map_state, clickData, recenter, *filters, metric, playback, 'heatmap' in coarse)),
+            'parallel-sets': (build_chart_parallel_sets, filters),
+            'beeswarm': (build_chart_beeswarm, (clickData, *filters, 'beeswarm' in coarse)),
+            'scatter': (build_chart_scatter, (*filters, expanded)),
+            'timeline': (build_chart_timeline, filters)}
+
+
+def build_chart(chart, build, args):
+    # a chart that fails to build keeps the figure it shows, so the other charts of the callback are still drawn
+    try:
+        return build(*args)
+    except Exception:
+        logger.exception('chart %s: failed to build', chart)
+        return no_update
+
+
+def build_charts(tasks):
+    # figures of tasks, a dict of a builder and its arguments per chart. with figure workers the
+    # figures are built at the same time, and the ones a worker failed to build are built here
+    if figure_pool.workers == 0 or len(tasks) < 2:
+        return {name: build_chart(name, build, args) for name, (build, args) in tasks.items()}
+    version = get_dataset().version
+    payloads = figure_pool.run(version, {name: (build_chart_json, (version, build, args)) for name, (build, args) in tasks.items()})
+    return {name: json.loads(payloads[name]) if name in payloads else build_chart(name, build, args)
+            for name, (build, args) in tasks.items()}
+
+
+def is_large_result(year_range, date_range, group, search, search_mode):
+    # rows of the beeswarm, the heatmap's rows are a subset of them
+    dff = serve_filter_data(year_range, date_range, None, None, None, group, search, search_mode)
+    return dff.shape[0] > default.progressive_rows.value
+
+
+# latest refinement of a page, and the charts it still has to refine
+def refine_key(session_id):
+    return f'refine-{session_id}'
+
+
+def is_current_refinement(session_id, refine):
+    # a page's requests may be served by another process, whose refinements are not known here
+    latest = cache.get(refine_key(session_id))
+    return latest is None or latest['token'] == refine['token']
+
+
+@callback(
+    Output('map-heatmap', 'figure', allow_duplicate=True),
+    Output('chart-beeswarm', 'figure', allow_duplicate=True),
+    Input('refine-request', 'data'),
+    State('map-state', 'data'),
+    State('session-id', 'data'),
+    prevent_initial_call=True
+)
+@prefetcher.live
+def refine_charts(refine, map_state, session_id):
+    # full figures of the charts drawn coarse, discarded when newer inputs superseded them
+    clickData, recenter, *filters, metric, playback = refine['inputs']
+
+    heatmap = beeswarm = no_update
+    if 'heatmap' in refine['charts'] and is_current_refinement(session_id, refine):
+        heatmap = build_chart('heatmap', build_map_heatmap, (map_state, clickData, recenter, *filters, metric, playback))
+    if 'beeswarm' in refine['charts'] and is_current_refinement(session_id, refine):
+        beeswarm = build_chart('beeswarm', build_chart_beeswarm, (clickData, *filters))
+
+    if not is_current_refinement(session_id, refine):
+        return no_update, no_update
+    cache.set(refine_key(session_id), dict(token=refine['token'], charts=[]))
+    return heatmap, beeswarm
+
+
 ###############################################################################
 # deploy app
+port=8050
+external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
+
+def create_app():
+    # the server accepts connections at once, the dataset is loaded in the background.
+    # the layout changes once it is loaded, so callbacks may refer to components not in the current one
+    # flask-compress reads its settings when dash sets it up, so they are set on the server before.
+    # by default it prefers zstd and brotli, which are larger than gzip for the layout and callback responses
+    server = Flask(__name__)
+    server.config['COMPRESS_ALGORITHM'] = ['gzip']
+    server.config['COMPRESS_LEVEL'] = 6
+    app = Dash(__name__, server=server, external_stylesheets=external_stylesheets, compress=True,
+               suppress_callback_exceptions=True)
+
+    cache.init_app(app.server)
+    # the prefetch threads use the cache outside of a request
+    cache.app = app.server
+
+    app.layout = serve_layout
+    app.server.before_request(pin_dataset)
+    app.server.teardown_request(unpin_dataset)
+    app.server.add_url_rule('/healthz', view_func=healthz)
+    app.server.add_url_rule('/readyz', view_func=readyz)
+    app.server.add_url_rule('/export', view_func=export)
+    app.server.add_url_rule('/api/v1', view_func=api_index)
+    app.server.add_url_rule('/api/v1/batch', view_func=api_batch, methods=['POST'])
+    app.server.add_url_rule('/api/v1/<kind>', view_func=api_query)
+
+    start_loading_dataset()
+    return app
+
+
 def open_browser():
     if not os.environ.get("WERKZEUG_RUN_MAIN"):
 	    webbrowser.open_new("http://localhost:{}".format(port))
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    app = create_app()
     Timer(1, open_browser).start()
-    app.run(debug=True, port=port)
\ No newline at end of file
+    app.run(debug=True, port=port, threaded=True)
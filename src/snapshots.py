@@ -0,0 +1,151 @@
+import os
+import re
+import time
+import argparse
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import plotly.io as pio
+import map as dashboard
+from utils.UrlState import decode_url_state
+
+# the charts of many filter states, built like the callbacks build them and written as
+# html, json and, where kaleido is installed, png. states are read one per line as the query
+# string of the page's url, optionally preceded by a name:
+#
+#   1990s-bombings ?years=1990-1999&attacktype=Bombing%2FExplosion
+#   ?years=2001-2010&metric=casualties
+#
+#   python src/snapshots.py states.txt [--out snapshots] [--formats html json png] [--workers 4]
+#
+# workers are spawned and each loads the dataset, as a fork would copy the locks of any thread of this process
+
+
+###############################################################################
+# figures
+no_click = {'data': None, 'trigger': None}
+filter_names = ['year_range', 'date_range', 'attacktype', 'weapontype', 'targettype', 'group', 'search', 'search_mode']
+
+
+def filters(state):
+    return [state[name] for name in filter_names]
+
+
+def build_heatmap(state):
+    return dashboard.build_map_heatmap(dashboard.default_map_state, no_click, False, *filters(state), state['metric'], [])
+
+
+def build_parallel_sets(state):
+    return dashboard.build_chart_parallel_sets(*filters(state))
+
+
+def build_beeswarm(state):
+    return dashboard.build_chart_beeswarm(no_click, *filters(state))
+
+
+def build_scatter(state):
+    return dashboard.build_chart_scatter(*filters(state))
+
+
+def build_timeline(state):
+    return dashboard.build_chart_timeline(*filters(state))
+
+
+figure_builders = {
+    'heatmap': build_heatmap,
+    'parallel-sets': build_parallel_sets,
+    'beeswarm': build_beeswarm,
+    'scatter': build_scatter,
+    'timeline': build_timeline,
+}
+
+
+def render(fig, path, fmt):
+    # figures carry typed arrays, which plotly.js reads but plotly's validation does not
+    if fmt == 'html':
+        pio.write_html(fig, path + '.html', include_plotlyjs='cdn', validate=False)
+    elif fmt == 'json':
+        pio.write_json(fig, path + '.json', validate=False)
+    elif fmt == 'png':
+        pio.write_image(fig, path + '.png', validate=False)
+
+
+###############################################################################
+# workers
+def init_worker():
+    # without the app's threads, as speculative prefetching and reloading only help interactive use
+    dashboard.load_dataset_without_server()
+
+
+def snapshot(name, url, out_path, formats):
+    dataset = dashboard.dataset
+    state = decode_url_state(url, dashboard.default_state, dataset.year_min, dataset.year_max, dashboard.url_state_options())
+    os.makedirs(os.path.join(out_path, name), exist_ok=True)
+
+    timings = []
+    for figure, build in figure_builders.items():
+        start = time.perf_counter()
+        fig = build(state)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for fmt in formats:
+            render(fig, os.path.join(out_path, name, figure), fmt)
+        timings.append((figure, build_time, time.perf_counter() - start))
+    return name, timings
+
+
+###############################################################################
+# run
+def read_states(path):
+    states = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split(maxsplit=1)
+            name, url = parts if len(parts) == 2 else (f'{len(states):03d}', parts[0])
+            states.append((re.sub(r'[^\w.-]+', '-', name), url))
+    return states
+
+
+def report(timings, n_states, wall_time):
+    print(f'{"figure":<15}{"n":>6}{"build ms":>10}{"render ms":>11}{"per worker/s":>14}')
+    for figure in figure_builders:
+        build_times = np.array([t[1] for t in timings if t[0] == figure])
+        render_times = np.array([t[2] for t in timings if t[0] == figure])
+        per_worker = len(build_times) / (build_times.sum() + render_times.sum())
+        print(f'{figure:<15}{len(build_times):>6}{np.median(build_times) * 1000:>10.1f}'
+              f'{np.median(render_times) * 1000:>11.1f}{per_worker:>14.1f}')
+    print(f'{n_states} states, {len(timings)} figures in {wall_time:.2f}s, {len(timings) / wall_time:.1f} figures/s')
+
+
+def run(states_path, out_path, formats, workers):
+    if 'png' in formats and importlib.util.find_spec('kaleido') is None:
+        print('png: kaleido is not installed, skipping static images')
+        formats = [fmt for fmt in formats if fmt != 'png']
+
+    states = read_states(states_path)
+    context = multiprocessing.get_context('spawn')
+
+    start = time.perf_counter()
+    timings = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as executor:
+        futures = [executor.submit(snapshot, name, url, out_path, formats) for name, url in states]
+        for future in as_completed(futures):
+            name, state_timings = future.result()
+            timings.extend(state_timings)
+            print(f'{name}: done')
+    report(timings, len(states), time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the charts of many filter states as report figures.')
+    parser.add_argument('states', help='file with one filter state per line, as the query string of the page url')
+    parser.add_argument('--out', default='snapshots')
+    parser.add_argument('--formats', nargs='+', default=['html', 'json'], choices=['html', 'json', 'png'])
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    run(args.states, args.out, args.formats, args.workers)
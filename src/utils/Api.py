@@ -0,0 +1,51 @@
+import json
+import hashlib
+import numpy as np
+from urllib.parse import urlencode
+from utils.UrlState import list_params
+from utils.Export import export_chunks
+
+# the query api answers the numbers of the charts as json. a query is a kind and the filters of a
+# page url, normalized so queries that select the same rows share a cache entry, and row results
+# are returned one page at a time
+
+
+def filters_url(filters):
+    # filters of a json query as the query string of a page url, e.g. {'years': '1990-2000', 'group': ['ETA']}
+    return '?' + urlencode(filters, doseq=True)
+
+
+def normalize_state(state):
+    # the order of a filter's values does not change its rows
+    return {name: sorted(value) if name in list_params and value else value for name, value in state.items()}
+
+
+def query_key(version, query):
+    # cache key of a normalized query of a dataset version
+    canonical = json.dumps(query, sort_keys=True, separators=(',', ':'))
+    return f'api-{version}-' + hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def parse_page(offset, limit, default_limit, max_limit):
+    offset = int(offset) if offset is not None else 0
+    limit = int(limit) if limit is not None else default_limit
+    if offset < 0 or not 0 < limit <= max_limit:
+        raise ValueError(f'offset is at least 0 and limit between 1 and {max_limit}')
+    return offset, limit
+
+
+def records(frame):
+    # rows as json objects, with missing values as null and numpy scalars as python ones
+    values = frame.astype(object).where(frame.notna(), None)
+    return [{col: value.item() if isinstance(value, np.generic) else value for col, value in row.items()}
+            for row in values.to_dict('records')]
+
+
+def paginate(frame, offset, limit, columns=None, text_store=None):
+    # a page of the rows, with text columns read from the text store for the rows of the page only
+    page = frame.iloc[offset:offset + limit]
+    if columns is not None:
+        page = next(export_chunks(page, columns, text_store, limit))
+    total = frame.shape[0]
+    return dict(total=total, offset=offset, limit=limit,
+                next_offset=offset + limit if offset + limit < total else None, items=records(page))
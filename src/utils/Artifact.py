@@ -0,0 +1,98 @@
+import os
+import json
+import shutil
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+from utils.TextStore import write_text_store, TextStore
+
+# the app's dataset artifact: one .npy file per column, string columns as category codes,
+# long free-text fields in a separate text store, and small dimension tables and arrays keyed by them
+
+
+@contextmanager
+def building_directory(path):
+    # build next to the active directory and swap it in at the end, so a running app never reads a half
+    # written stage, and files it has memory mapped are unlinked with the old directory instead of rewritten
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    yield tmp_path
+
+    old_path = path + '.old'
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+def write_artifact(df, path, text_columns, version, tables=None, arrays=None):
+    with building_directory(path) as tmp_path:
+        os.makedirs(os.path.join(tmp_path, 'columns'))
+
+        write_text_store(df, text_columns, os.path.join(tmp_path, 'text'))
+        df = df.drop(columns=text_columns)
+
+        columns = []
+        for col in df.columns:
+            if is_numeric_dtype(df[col]):
+                values = df[col]
+                if values.notna().all() and (values % 1 == 0).all():
+                    values = pd.to_numeric(values, downcast='integer')
+                np.save(os.path.join(tmp_path, 'columns', f'{col}.npy'), values.to_numpy())
+                columns.append(dict(name=col, kind='numeric'))
+            else:
+                categorical = pd.Categorical(df[col])
+                np.save(os.path.join(tmp_path, 'columns', f'{col}.npy'), categorical.codes)
+                columns.append(dict(name=col, kind='category', categories=[str(c) for c in categorical.categories]))
+
+        tables = tables or {}
+        for name, table in tables.items():
+            table.to_csv(os.path.join(tmp_path, f'{name}.csv'), index=False)
+
+        arrays = arrays or {}
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+
+        manifest = dict(version=version, n_rows=int(df.shape[0]), columns=columns, text_columns=list(text_columns),
+                        tables=list(tables), arrays=list(arrays))
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+
+def read_artifact_manifest(path):
+    with open(os.path.join(path, 'manifest.json')) as f:
+        return json.load(f)
+
+
+def read_artifact(path):
+    manifest = read_artifact_manifest(path)
+
+    # the columns are memory mapped read only and not copied into the frame, so the processes that load the
+    # same version, e.g. the figure workers, share their pages in the page cache
+    data = {}
+    for column in manifest['columns']:
+        values = np.load(os.path.join(path, 'columns', f"{column['name']}.npy"), mmap_mode='r')
+        if column['kind'] == 'category':
+            values = pd.Categorical.from_codes(values, categories=column['categories'])
+        data[column['name']] = values
+    df = pd.DataFrame(data, copy=False)
+
+    # key into the text store
+    df['text_row'] = np.arange(manifest['n_rows'])
+
+    return df
+
+
+def read_artifact_table(path, name):
+    return pd.read_csv(os.path.join(path, f'{name}.csv'), keep_default_na=False)
+
+
+def read_artifact_array(path, name):
+    return np.load(os.path.join(path, f'{name}.npy'))
+
+
+def read_artifact_text(path):
+    return TextStore(os.path.join(path, 'text'))
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+
+# vectorized versions of the cleaning rules in data_cleaning.ipynb, applied per chunk of the raw GTD export
+
+###############################################################################
+# column families
+dropped_columns = [
+    # date
+    'approxdate', 'extended', 'resolution',
+    # incident information
+    'doubtterr', 'alternative', 'alternative_txt',
+    # incident location
+    'vicinity', 'location', 'specificity',
+    # attack information
+    'attacktype2', 'attacktype2_txt', 'attacktype3', 'attacktype3_txt',
+    # weapon information
+    'weaptype2', 'weaptype2_txt', 'weapsubtype2', 'weapsubtype2_txt',
+    'weaptype3', 'weaptype3_txt', 'weapsubtype3', 'weapsubtype3_txt',
+    'weaptype4', 'weaptype4_txt', 'weapsubtype4', 'weapsubtype4_txt',
+    # target victim information
+    'targtype2', 'targtype2_txt', 'targsubtype2', 'targsubtype2_txt',
+    'corp2', 'target2', 'natlty2', 'natlty2_txt',
+    'targtype3', 'targtype3_txt', 'targsubtype3', 'targsubtype3_txt',
+    'corp3', 'target3', 'natlty3', 'natlty3_txt',
+    # perpetrator information
+    'gsubname', 'gname2', 'gsubname2', 'gname3', 'gsubname3', 'guncertain2', 'guncertain3',
+    'compclaim', 'claim2', 'claimmode2', 'claimmode2_txt', 'claim3', 'claimmode3', 'claimmode3_txt',
+    # casualities and consequences
+    'nkillus', 'nwoundus', 'propcomment', 'nhostkidus', 'divert', 'kidhijcountry',
+    'ransomamtus', 'ransompaidus', 'ransomnote', 'hostkidoutcome', 'hostkidoutcome_txt',
+    # additional information and sources
+    'INT_LOG', 'INT_IDEO', 'INT_MISC', 'INT_ANY', 'addnotes', 'scite2', 'scite3', 'dbsource'
+]
+
+# columns kept as text, everything else is parsed as a number
+string_columns = [
+    'country_txt', 'region_txt', 'provstate', 'city', 'summary', 'related',
+    'attacktype1_txt', 'targtype1_txt', 'targsubtype1_txt', 'corp1', 'target1', 'natlty1_txt',
+    'gname', 'motive', 'claimmode_txt', 'weaptype1_txt', 'weapsubtype1_txt', 'weapdetail',
+    'propextent_txt', 'scite1'
+]
+
+# codes meaning unknown, which are set to missing
+unknown_codes = {
+    'imonth': [0],
+    'iday': [0],
+    'nperps': [-99, -9],
+    'nperpcap': [-99, -9],
+    'propvalue': [-9, -99],
+    'nhostkid': [-9, -99],
+    'nhours': [-9, -99],
+    'ndays': [-9, -99],
+    'ransomamt': [-9, -99],
+    'ransompaid': [-9, -99],
+}
+
+# booleans that are 0 unless proven otherwise
+boolean_unknown_codes = {
+    'claimed': [-9],
+    'property': [-9],
+    'ishostkid': [-9],
+    'ransom': [-9],
+}
+
+# naming in the GTD corrected to the official country list
+country_corrections = {
+    'Bosnia-Herzegovina': 'Bosnia and Herzegovina',
+    'Ivory Coast': 'Cote d\'Ivoire',
+    'Czech Republic': 'Czechia',
+    'Democratic Republic of the Congo': 'Democratic Republic of Congo',
+    'Swaziland': 'Eswatini',
+    'Macau': 'Macao',
+    'Macedonia': 'North Macedonia',
+    'West Bank and Gaza Strip': 'Palestine',
+    'St. Kitts and Nevis': 'Saint Kitts and Nevis',
+    'St. Lucia': 'Saint Lucia',
+    'Slovak Republic': 'Slovakia',
+    'Vatican City': 'Vatican',
+    'Republic of the Congo': 'Congo',
+    'Zaire': 'Democratic Republic of Congo',
+    'New Hebrides': 'Vanuatu',
+    'East Germany (GDR)': 'East Germany (Former)',
+    'West Germany (FRG)': 'West Germany (Former)',
+    'South Yemen': 'South Yemen (Former)',
+    'Czechoslovakia': 'Czechoslovakia (Former)',
+    'People\'s Republic of the Congo': 'People\'s Republic of the Congo (Former)',
+    'Yugoslavia': 'Yugoslavia (Former)',
+    'North Yemen': 'North Yemen (Former)',
+    'Rhodesia': 'Rhodesia (Former)',
+    'Soviet Union': 'Soviet Union (Former)',
+    'Serbia-Montenegro': 'Serbia-Montenegro (Former)',
+}
+
+
+###############################################################################
+# cleaning
+def parse_types(df):
+    # raw chunks are read as text so that parsing does not depend on chunk boundaries
+    numeric_columns = [col for col in df.columns if col not in string_columns]
+    df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
+    return df
+
+
+def clean_chunk(df):
+    df_cleaned = parse_types(df.drop(columns=dropped_columns, errors='ignore'))
+
+    # unknown codes to missing
+    for col, codes in unknown_codes.items():
+        df_cleaned[col] = df_cleaned[col].mask(df_cleaned[col].isin(codes))
+
+    # unknown booleans to 0
+    for col, codes in boolean_unknown_codes.items():
+        df_cleaned[col] = df_cleaned[col].mask(df_cleaned[col].isin(codes) | df_cleaned[col].isna(), 0)
+
+    # keep all attacks without location but set invalid location to missing
+    df_cleaned['latitude'] = df_cleaned['latitude'].where(df_cleaned['latitude'].between(-90, 90))
+    df_cleaned['longitude'] = df_cleaned['longitude'].where(df_cleaned['longitude'].between(-180, 180))
+
+    # add column with total casualties
+    df_cleaned['total_casualties'] = df_cleaned['nkill'] + df_cleaned['nwound']
+
+    # correct naming of countries
+    df_cleaned['country_txt'] = df_cleaned['country_txt'].replace(country_corrections)
+
+    return df_cleaned
+
+
+def count_criterion_violations(df):
+    # at least 2 criterias must be satisfied
+    return int(((df['crit1'] + df['crit2'] + df['crit3']) < 2).sum())
+
+
+def build_country_dimension(df, df_countries_flags):
+    # one row per country with a small integer key, regions get their own key
+    countries = (df[['country_txt', 'region_txt']]
+                 .drop_duplicates(subset=['country_txt'])
+                 .sort_values('country_txt')
+                 .reset_index(drop=True))
+    countries.insert(0, 'country_id', np.arange(countries.shape[0], dtype=np.int16))
+
+    regions = sorted(countries['region_txt'].unique())
+    countries.insert(2, 'region_id', pd.Categorical(countries['region_txt'], categories=regions).codes.astype(np.int16))
+
+    # former countries and international have no flag
+    flags = df_countries_flags.dropna(subset=['flag']).drop_duplicates(subset=['country']).set_index('country')['flag']
+    countries['flag'] = countries['country_txt'].map(flags).fillna('').astype(str)
+
+    # key each attack by country id instead of country, region and flag strings
+    country_id = pd.Categorical(df['country_txt'], categories=countries['country_txt']).codes.astype(np.int16)
+
+    return countries, country_id
+
+
+def build_population_array(countries, df_pop, years):
+    # population[country_id, year - years[0]], missing where there is no estimate
+    population = (df_pop.pivot_table(index='country', columns='year', values='population_estimate', aggfunc='first')
+                        .reindex(index=countries['country_txt'], columns=years))
+    return population.to_numpy(dtype=np.float64)
+
+
+def add_derived_columns(df):
+    # simplify vehicle name
+    df['weaptype1_txt'] = df['weaptype1_txt'].mask(df['weaptype1_txt'].str.contains('Vehicle', na=False), 'Vehicle')
+
+    # ensure 0 or None casualties can be plotted in heatmap
+    df['total_casualties_visualized'] = df['total_casualties'].replace(0, 1)
+
+    return df
@@ -0,0 +1,107 @@
+import threading
+import numpy as np
+
+# crossfilter over integer coded dimensions, in the spirit of crossfilter.js.
+# every row has a bitmask with one bit per dimension that filters it out. reduce groups keep
+# per key aggregates of the rows that pass every filter except the dimensions they ignore,
+# and are updated from the rows whose bit flipped when a filter changes instead of a rescan
+
+
+class Dimension:
+    def __init__(self, bit, codes, n_codes):
+        self.bit = np.uint32(1 << bit)
+        self.codes = codes
+        self.n_codes = n_codes
+        # rows grouped by code, so the rows of a code are order[offsets[code]:offsets[code + 1]]
+        self.order = np.argsort(codes, kind='stable')
+        self.offsets = np.searchsorted(codes[self.order], np.arange(n_codes + 1))
+        self.selected = np.ones(n_codes, dtype=bool)
+
+    def rows(self, codes):
+        # rows of all given codes
+        starts = self.offsets[codes]
+        lengths = self.offsets[codes + 1] - starts
+        positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+        return self.order[positions]
+
+
+class Group:
+    def __init__(self, key, values, ignore_mask):
+        self.key = key
+        self.values = values
+        self.ignore_mask = ignore_mask
+
+    def reset(self, bits):
+        included = (bits & ~self.ignore_mask) == 0
+        self.rows = np.zeros(self.key.n_codes, dtype=np.int64)
+        self.count = np.zeros(self.key.n_codes, dtype=np.int64)
+        self.sum = np.zeros(self.key.n_codes, dtype=np.float64)
+        self.add(np.flatnonzero(included), 1)
+
+    def add(self, rows, sign):
+        keys = self.key.codes[rows]
+        n_codes = self.key.n_codes
+        self.rows += sign * np.bincount(keys, minlength=n_codes)
+        if self.values is not None:
+            values = self.values[rows]
+            known = ~np.isnan(values)
+            self.count += sign * np.bincount(keys[known], minlength=n_codes)
+            self.sum += sign * np.bincount(keys[known], weights=values[known], minlength=n_codes)
+
+    def update(self, rows, bits_before, bits_after):
+        was_included = (bits_before & ~self.ignore_mask) == 0
+        is_included = (bits_after & ~self.ignore_mask) == 0
+        self.add(rows[was_included & ~is_included], -1)
+        self.add(rows[~was_included & is_included], 1)
+
+
+class Crossfilter:
+    def __init__(self, n_rows):
+        self.n_rows = n_rows
+        self.bits = np.zeros(n_rows, dtype=np.uint32)
+        self.dimensions = {}
+        self.groups = {}
+        # filters are shared by all callbacks, a query applies its filters and reads its groups under the lock
+        self.lock = threading.Lock()
+
+    def add_dimension(self, name, codes, n_codes):
+        self.dimensions[name] = Dimension(len(self.dimensions), np.asarray(codes, dtype=np.int64), n_codes)
+
+    def add_group(self, name, key, values=None, ignore=()):
+        # aggregates per code of the key dimension: number of rows, and count and sum of the known values
+        ignore_mask = np.uint32(0)
+        for dimension in ignore:
+            ignore_mask |= self.dimensions[dimension].bit
+        group = Group(self.dimensions[key], None if values is None else np.asarray(values, dtype=np.float64), ignore_mask)
+        group.reset(self.bits)
+        self.groups[name] = group
+
+    def filter(self, name, selected):
+        # selected is a boolean per code, None selects all
+        dimension = self.dimensions[name]
+        selected = np.ones(dimension.n_codes, dtype=bool) if selected is None else selected
+        changed_codes = np.flatnonzero(selected != dimension.selected)
+        if changed_codes.shape[0] == 0:
+            return
+        dimension.selected = selected
+
+        rows = dimension.rows(changed_codes)
+        bits_before = self.bits[rows]
+        bits_after = bits_before ^ dimension.bit
+        self.bits[rows] = bits_after
+
+        # a change touching most rows is cheaper to recount
+        for group in self.groups.values():
+            if rows.shape[0] > self.n_rows // 2:
+                group.reset(self.bits)
+            elif not group.ignore_mask & dimension.bit:
+                group.update(rows, bits_before, bits_after)
+
+    def query(self, filters, groups):
+        # copies of the groups' aggregates with the given filters applied
+        with self.lock:
+            for name, selected in filters.items():
+                self.filter(name, selected)
+            return {name: dict(rows=self.groups[name].rows.copy(),
+                               count=self.groups[name].count.copy(),
+                               sum=self.groups[name].sum.copy()) for name in groups}
@@ -0,0 +1,157 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from utils.Artifact import *
+from utils.Search import SearchIndex, read_search_manifest
+from utils.Embedding import EmbeddingIndex, read_embedding_manifest
+from utils.Neighbours import read_knn_graph, read_knn_manifest
+from utils.Crossfilter import Crossfilter
+from utils.Timeline import attack_dates, day_codes, n_day_codes
+
+# everything the app reads from the pipeline's output, loaded in phases so startup can be timed.
+# a loaded dataset is never modified, and its repr is the artifact version so it can be passed
+# to memoized functions instead of the frame
+
+# crossfilter dimensions of the filters, with the column each filters on
+crossfilter_columns = {'attacktype': 'attacktype1_txt', 'weapontype': 'weaptype1_txt', 'targettype': 'targtype1_txt', 'group': 'gname'}
+type_dimensions = ['attacktype', 'weapontype', 'targettype']
+
+
+def read_data_terror(artifact_path, countries, regions):
+    df = read_artifact(artifact_path)
+
+    # country, region and flag by lookup in the country dimension
+    country_id = df['country_id'].to_numpy()
+    df['country_txt'] = pd.Categorical.from_codes(country_id, categories=countries['country_txt'])
+    df['region_txt'] = pd.Categorical.from_codes(countries['region_id'].to_numpy()[country_id], categories=regions)
+    df['flag'] = countries['flag'].to_numpy()[country_id]
+    df['date'] = attack_dates(df)
+
+    return df
+
+
+def attack_population(df, population, population_years):
+    # population of each attack's country in the year of the attack, missing for international attacks
+    return population[df['country_id'].to_numpy(), df['iyear'].to_numpy() - population_years[0]]
+
+
+def region_population(countries, population, n_regions):
+    # population of each region per year, of its countries with a known population
+    region_id = countries['region_id'].to_numpy()
+    return np.stack([np.nansum(population[region_id == region], axis=0) for region in range(n_regions)])
+
+
+def attack_region_population(df, countries, population, region_population, population_years):
+    # population of each attack's region in the year of the attack. missing where its country's population is,
+    # so a region's rate only counts the attacks of the countries in its population
+    country_id = df['country_id'].to_numpy()
+    years = df['iyear'].to_numpy() - population_years[0]
+    region_id = countries['region_id'].to_numpy()[country_id]
+    return np.where(np.isnan(population[country_id, years]), np.nan, region_population[region_id, years])
+
+
+def country_centroids(df, n_countries):
+    # mean location of each country's attacks, where the map draws its totals. missing for countries without located attacks
+    located = df['latitude'].notna().to_numpy() & df['longitude'].notna().to_numpy()
+    country_id = df['country_id'].to_numpy()[located]
+    n_located = np.bincount(country_id, minlength=n_countries).astype(np.float64)
+    n_located[n_located == 0] = np.nan
+    return dict(lat=np.bincount(country_id, weights=df['latitude'].to_numpy()[located], minlength=n_countries) / n_located,
+                lon=np.bincount(country_id, weights=df['longitude'].to_numpy()[located], minlength=n_countries) / n_located)
+
+
+def read_embedding_index(embedding_path, version):
+    # semantic search is only available if the embedding stage of the pipeline has been run on this version
+    manifest = read_embedding_manifest(embedding_path)
+    return EmbeddingIndex(embedding_path) if manifest and manifest['version'] == version else None
+
+
+def read_dataset_version(path):
+    # version of the dataset on disk, or None while the pipeline is writing a new one.
+    # the neighbours are its last stage, and the embeddings before them are optional
+    artifact_path = os.path.join(path, 'artifact')
+    manifests = [read_artifact_manifest(artifact_path) if os.path.exists(os.path.join(artifact_path, 'manifest.json')) else None,
+                 read_search_manifest(os.path.join(path, 'search')),
+                 read_knn_manifest(os.path.join(path, 'neighbours'))]
+    versions = set(manifest['version'] if manifest else None for manifest in manifests)
+    return versions.pop() if len(versions) == 1 else None
+
+
+def build_crossfilter(df, year_min, year_max, population, region_population, region_id, n_regions):
+    # aggregates of the views under all filters except their own, updated incrementally as filters change.
+    # population and region_population are the population of each attack's country and region in its year
+    crossfilter = Crossfilter(df.shape[0])
+    crossfilter.add_dimension('year', df['iyear'].to_numpy() - year_min, year_max - year_min + 1)
+    crossfilter.add_dimension('date', day_codes(df['date'], year_min), n_day_codes(year_min, year_max))
+    crossfilter.add_dimension('country', df['country_id'].to_numpy(), len(df['country_txt'].cat.categories))
+    crossfilter.add_dimension('region', region_id, n_regions)
+    for name, col in crossfilter_columns.items():
+        # code 0 is a missing value
+        crossfilter.add_dimension(name, df[col].cat.codes.to_numpy() + 1, len(df[col].cat.categories) + 1)
+    crossfilter.add_group('attack_counts', 'attacktype', ignore=type_dimensions)
+    crossfilter.add_group('weapon_counts', 'weapontype', ignore=type_dimensions)
+    crossfilter.add_group('target_counts', 'targettype', values=df['total_casualties'], ignore=type_dimensions)
+    crossfilter.add_group('group_casualties', 'group', values=df['total_casualties'], ignore=['group'])
+    crossfilter.add_group('group_counts', 'group', ignore=type_dimensions + ['group', 'date'])
+    crossfilter.add_group('date_counts', 'date', values=df['total_casualties'], ignore=['date'])
+    # totals per country under every filter, per million of the country's population in the year of each attack
+    casualties = df['total_casualties'].to_numpy()
+    crossfilter.add_group('country_attacks', 'country', values=1e6 / population)
+    crossfilter.add_group('country_casualties', 'country', values=casualties)
+    crossfilter.add_group('country_casualties_per_million', 'country', values=casualties * 1e6 / population)
+    # a region's rate is its total over its population, not the sum of its countries' rates
+    crossfilter.add_group('region_attacks_per_million', 'region', values=np.nan_to_num(1e6 / region_population))
+    crossfilter.add_group('region_casualties_per_million', 'region', values=np.nan_to_num(casualties * 1e6 / region_population))
+    return crossfilter
+
+
+class Dataset:
+    phases = ['artifact', 'text_store', 'search_index', 'embedding_index', 'neighbours', 'crossfilter']
+
+    def __init__(self, path, timings=None):
+        # seconds per phase are written to timings as each phase finishes
+        self.timings = {} if timings is None else timings
+        artifact_path = os.path.join(path, 'artifact')
+
+        start = time.perf_counter()
+        self.version = read_artifact_manifest(artifact_path)['version']
+        # country dimension keyed by country_id, and population[country_id, year - population_years[0]]
+        self.countries = read_artifact_table(artifact_path, 'countries')
+        self.regions = self.countries.drop_duplicates('region_id').sort_values('region_id')['region_txt']
+        self.population = read_artifact_array(artifact_path, 'population')
+        self.population_years = read_artifact_array(artifact_path, 'population_years')
+        self.region_population = region_population(self.countries, self.population, len(self.regions))
+        self.df = read_data_terror(artifact_path, self.countries, self.regions)
+        self.country_centroids = country_centroids(self.df, len(self.countries))
+        self.year_min = int(self.df['iyear'].min())
+        self.year_max = int(self.df['iyear'].max())
+        self.timings['artifact'] = time.perf_counter() - start
+
+        self.text_store = self.timed('text_store', read_artifact_text, artifact_path)
+        self.search_index = self.timed('search_index', SearchIndex, os.path.join(path, 'search'))
+        self.embedding_index = self.timed('embedding_index', read_embedding_index, os.path.join(path, 'embeddings'), self.version)
+        # precomputed similar attacks, neighbours[text_row] holds the rows of the most similar attacks
+        self.neighbours = self.timed('neighbours', read_knn_graph, os.path.join(path, 'neighbours'))
+        self.crossfilter = self.timed('crossfilter', build_crossfilter, self.df, self.year_min, self.year_max,
+                                      attack_population(self.df, self.population, self.population_years),
+                                      attack_region_population(self.df, self.countries, self.population,
+                                                               self.region_population, self.population_years),
+                                      self.countries['region_id'].to_numpy()[self.df['country_id'].to_numpy()],
+                                      len(self.regions))
+
+    def get_row(self, eventid):
+        # rows are sorted by eventid in the etl, None for an attack that is not in this version
+        eventids = self.df['eventid'].to_numpy()
+        row = int(np.searchsorted(eventids, eventid))
+        return row if row < len(eventids) and eventids[row] == eventid else None
+
+    def timed(self, phase, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.timings[phase] = time.perf_counter() - start
+        return result
+
+    def __repr__(self):
+        # memoize keys on the repr of the arguments, this keeps them short and per version
+        return f'Dataset({self.version})'
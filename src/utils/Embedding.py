@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import zlib
+import numpy as np
+import scipy.sparse as sp
+
+
+###############################################################################
+# encoders
+# an encoder has a name, a dimension and encode(texts) returning l2 normalized float32 rows
+class HashingEncoder:
+    # deterministic bag of words encoder that needs no model download, e.g. for tests
+    name = 'hashing'
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def encode(self, texts):
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in re.findall(r'\w+', (text or '').lower()):
+                h = zlib.crc32(token.encode('utf-8'))
+                embeddings[i, h % self.dim] += 1 if (h >> 16) & 1 else -1
+        return normalize_rows(embeddings)
+
+
+class SentenceTransformerEncoder:
+    name = 'minilm'
+
+    def __init__(self, model_name='all-MiniLM-L6-v2'):
+        # optional dependency, only needed where embeddings are built or queried
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        texts = ['' if text is None else text for text in texts]
+        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+encoders = {
+    HashingEncoder.name: HashingEncoder,
+    SentenceTransformerEncoder.name: SentenceTransformerEncoder,
+}
+
+
+def get_encoder(name):
+    return encoders[name]()
+
+
+def normalize_rows(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.where(norms > 0, norms, 1)
+
+
+###############################################################################
+# build
+def build_embeddings(texts, encoder, path, version, batch_size=1024):
+    os.makedirs(path, exist_ok=True)
+
+    # written in batches straight into a memory mapped float16 matrix
+    embeddings = np.lib.format.open_memmap(os.path.join(path, 'embeddings.npy'), mode='w+',
+                                           dtype=np.float16, shape=(len(texts), encoder.dim))
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        embeddings[start:start + len(batch)] = encoder.encode(batch)
+    embeddings.flush()
+
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(dict(version=version, encoder=encoder.name, n_rows=len(texts), dim=encoder.dim), f)
+
+    return embeddings
+
+
+def assign_to_centroids(x, centroids, batch_size=65536):
+    assignment = np.empty(x.shape[0], dtype=np.int32)
+    for start in range(0, x.shape[0], batch_size):
+        batch = np.asarray(x[start:start + batch_size], dtype=np.float32)
+        assignment[start:start + batch.shape[0]] = np.argmax(batch @ centroids.T, axis=1)
+    return assignment
+
+
+def train_centroids(x, n_lists, n_iter=10, sample_size=50000, seed=0):
+    # spherical k-means on a sample of the rows
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(x[np.sort(rng.choice(x.shape[0], min(sample_size, x.shape[0]), replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample.shape[0], n_lists, replace=False)]
+
+    for _ in range(n_iter):
+        assignment = assign_to_centroids(sample, centroids)
+        membership = sp.csr_matrix((np.ones(sample.shape[0], dtype=np.float32), (assignment, np.arange(sample.shape[0]))),
+                                   shape=(n_lists, sample.shape[0]))
+        sums = membership @ sample
+        # empty lists keep their previous centroid
+        empty = np.asarray(membership.sum(axis=1)).ravel() == 0
+        sums[empty] = centroids[empty]
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+def build_ivf_index(embeddings, path, n_lists=None):
+    # inverted file index, rows grouped by their nearest centroid
+    n_lists = n_lists or max(1, min(int(np.sqrt(embeddings.shape[0])), embeddings.shape[0]))
+    centroids = train_centroids(embeddings, n_lists)
+    assignment = assign_to_centroids(embeddings, centroids)
+
+    ivf_rows = np.argsort(assignment, kind='stable').astype(np.int32)
+    ivf_offsets = np.searchsorted(assignment[ivf_rows], np.arange(n_lists + 1)).astype(np.int64)
+
+    np.save(os.path.join(path, 'centroids.npy'), centroids.astype(np.float32))
+    np.save(os.path.join(path, 'ivf_rows.npy'), ivf_rows)
+    np.save(os.path.join(path, 'ivf_offsets.npy'), ivf_offsets)
+
+
+def read_embedding_manifest(path):
+    manifest_path = os.path.join(path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+###############################################################################
+# query
+class EmbeddingIndex:
+    def __init__(self, path, encoder=None):
+        self.manifest = read_embedding_manifest(path)
+        self.encoder = encoder or get_encoder(self.manifest['encoder'])
+        self.embeddings = np.load(os.path.join(path, 'embeddings.npy'), mmap_mode='r')
+        self.centroids = np.load(os.path.join(path, 'centroids.npy'))
+        self.ivf_rows = np.load(os.path.join(path, 'ivf_rows.npy'))
+        self.ivf_offsets = np.load(os.path.join(path, 'ivf_offsets.npy'))
+
+    def candidates(self, query_vector, n_probe):
+        # rows in the n_probe lists closest to the query
+        n_probe = min(n_probe, self.centroids.shape[0])
+        lists = np.argpartition(self.centroids @ query_vector, -n_probe)[-n_probe:]
+        return np.concatenate([self.ivf_rows[self.ivf_offsets[i]:self.ivf_offsets[i + 1]] for i in lists])
+
+    def search(self, query, rows=None, k=10, n_probe=8, exact_below=20000):
+        query_vector = self.encoder.encode([query])[0]
+
+        if rows is not None and len(rows) <= exact_below:
+            # small restrictions are scanned exactly, probing could miss most of them
+            candidates = np.sort(np.asarray(rows))
+        else:
+            candidates = np.sort(self.candidates(query_vector, n_probe))
+            if rows is not None:
+                candidates = candidates[np.isin(candidates, rows)]
+
+        scores = np.asarray(self.embeddings[candidates], dtype=np.float32) @ query_vector
+        if scores.shape[0] > k:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(scores.shape[0])
+        top = top[np.argsort(scores[top])[::-1]]
+
+        return candidates[top], scores[top]
@@ -0,0 +1,73 @@
+import base64
+import numpy as np
+
+# numeric trace arrays are sent as base64 typed arrays ({dtype, bdata, shape}), which plotly.js
+# decodes straight into a typed array instead of parsing a long list of json numbers
+
+# smallest dtype that plotly.js accepts for the value range, in order of preference
+integer_dtypes = [np.int8, np.uint8, np.int16, np.uint16, np.int32, np.uint32]
+
+# trace attributes that are never sent as typed arrays
+skipped_attributes = {'customdata', 'text', 'hovertext', 'ids', 'name', 'type', 'selectedpoints', 'dimensions'}
+
+
+def typed_array(values):
+    # base64 typed array for a numeric array, None if the values can not be sent as one
+    values = np.asarray(values)
+    if values.ndim not in (1, 2) or values.size == 0:
+        return None
+    if values.dtype.kind == 'b':
+        values = values.astype(np.uint8)
+    elif values.dtype.kind == 'f' and np.isfinite(values).all() and (values % 1 == 0).all() and (np.abs(values) < 2**32).all():
+        # whole numbers such as counts are sent as the smallest integer type
+        values = values.astype(np.int64)
+    if values.dtype.kind in 'iu':
+        lower, upper = values.min(), values.max()
+        dtype = next((d for d in integer_dtypes if np.iinfo(d).min <= lower and upper <= np.iinfo(d).max), None)
+        if dtype is None:
+            # int64 has no typed array in plotly.js
+            values = values.astype(np.float64)
+        else:
+            values = values.astype(dtype)
+    if values.dtype.kind == 'f':
+        # coordinates, casualties and jitter do not need more than float32 on screen
+        values = values.astype(np.float32)
+    elif values.dtype.kind not in 'iu':
+        return None
+
+    encoded = dict(dtype=values.dtype.str[1:],
+                   bdata=base64.b64encode(np.ascontiguousarray(values).tobytes()).decode('ascii'))
+    if values.ndim == 2:
+        encoded['shape'] = f'{values.shape[0]}, {values.shape[1]}'
+    return encoded
+
+
+def is_numeric_list(value):
+    # plain lists only when every item is a number, e.g. not a list of colors or None
+    return all(isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in value)
+
+
+def encode_trace(trace):
+    encoded = {}
+    for key, value in trace.items():
+        if key in skipped_attributes:
+            encoded[key] = value
+        elif isinstance(value, dict):
+            encoded[key] = encode_trace(value)
+        elif isinstance(value, (np.ndarray, list, tuple)) and len(value) > 0 and not isinstance(value[0], (dict, str)):
+            array = typed_array(value) if isinstance(value, np.ndarray) or is_numeric_list(value) else None
+            encoded[key] = value if array is None else array
+        else:
+            encoded[key] = value
+    return encoded
+
+
+def encode_figure(fig):
+    # figure dict with numeric trace arrays, including those of animation frames, as typed arrays
+    fig = fig if isinstance(fig, dict) else fig.to_dict()
+    fig = dict(fig)
+    fig['data'] = [encode_trace(trace) for trace in fig.get('data', [])]
+    if fig.get('frames'):
+        fig['frames'] = [dict(frame, data=[encode_trace(trace) for trace in frame.get('data', [])])
+                         for frame in fig['frames']]
+    return fig
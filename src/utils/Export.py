@@ -0,0 +1,83 @@
+import zlib
+
+# filtered attacks streamed one chunk of rows at a time, so memory stays flat however many rows
+# are exported. text columns are read from the text store for the rows of each chunk
+
+
+def export_chunks(dff, columns, text_store, chunk_size, rows=None):
+    # chunks of the rows of dff at the positions rows, or of all its rows.
+    # at least one chunk, so an empty export still has its header or schema
+    text_columns = [col for col in columns if col in text_store.columns]
+    n_rows = dff.shape[0] if rows is None else len(rows)
+    for start in range(0, max(n_rows, 1), chunk_size):
+        chunk = dff.iloc[start:start + chunk_size] if rows is None else dff.iloc[rows[start:start + chunk_size]]
+        text_rows = chunk['text_row'].to_numpy()
+        chunk = chunk[[col for col in columns if col not in text_columns]]
+        chunk = chunk.assign(**{col: [text_store.get(col, row) for row in text_rows] for col in text_columns})
+        yield chunk[columns]
+
+
+def write_csv(chunks):
+    for i, chunk in enumerate(chunks):
+        yield chunk.to_csv(index=False, header=i == 0).encode('utf-8')
+
+
+def write_gzip(stream, level=6):
+    # gzip framing, so the stream is a .gz file
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for data in stream:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet
+        return True
+    except ImportError:
+        return False
+
+
+class ChunkSink:
+    # file the parquet writer writes to, the bytes written so far are taken after every row group
+    def __init__(self):
+        self.buffer = []
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.buffer)
+        self.buffer = []
+        return data
+
+
+def write_parquet(chunks, compression='snappy'):
+    # optional dependency, only needed for parquet exports
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = ChunkSink()
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            # a text column that is missing in every row of the first chunk is typed null
+            schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                for field in table.schema], metadata=table.schema.metadata)
+            writer = pq.ParquetWriter(sink, schema, compression=compression)
+        # one row group per chunk
+        writer.write_table(table.cast(writer.schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
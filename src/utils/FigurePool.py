@@ -0,0 +1,89 @@
+import time
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# the figures of one interaction built at the same time in worker processes, so its wall time is
+# that of the slowest figure rather than the sum. the workers are spawned rather than forked, as a
+# fork of a threaded server may copy locks held by its other threads, and are replaced when another
+# version is served. a new worker imports the app and loads the dataset, which the first interaction
+# after a version is served waits for.
+# the time between submitting a figure and receiving it that is not spent building it is the
+# dispatch overhead: pickling the arguments and the result, and waiting for a free worker
+
+
+def timed_call(fn, args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class FigurePool:
+    def __init__(self, workers, initializer=None, window=100):
+        # workers=0 builds every figure in the calling thread
+        self.workers = workers
+        self.initializer = initializer
+        self.executor = None
+        self.version = None
+        self.lock = threading.Lock()
+        # seconds of the last window figures and calls
+        self.build_times = deque(maxlen=window)
+        self.overheads = deque(maxlen=window)
+        self.wall_times = deque(maxlen=window)
+        self.stats = dict(calls=0, figures=0, failed=0, restarts=0)
+
+    def get_executor(self, version):
+        with self.lock:
+            if self.executor is None or self.version != version:
+                if self.executor is not None:
+                    self.executor.shutdown(wait=False, cancel_futures=True)
+                    self.stats['restarts'] += 1
+                # processes are started on the first submit, and initialized with the dataset of that moment
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=self.initializer)
+                self.version = version
+            return self.executor
+
+    def run(self, version, tasks):
+        # tasks maps a name to a function and its arguments. results of failed tasks are missing,
+        # so the caller can build them itself
+        executor = self.get_executor(version)
+        start = time.perf_counter()
+        submitted = {}
+        futures = {}
+        for name, (fn, args) in tasks.items():
+            submitted[name] = time.perf_counter()
+            futures[executor.submit(timed_call, fn, args)] = name
+
+        results = {}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name], build_time = future.result()
+            except Exception as e:
+                logger.exception('figure pool: %s failed', name)
+                self.stats['failed'] += 1
+                if isinstance(e, BrokenProcessPool):
+                    # a worker died, the next call starts new ones
+                    with self.lock:
+                        self.executor = None if self.executor is executor else self.executor
+                continue
+            self.build_times.append(build_time)
+            self.overheads.append(time.perf_counter() - submitted[name] - build_time)
+
+        self.wall_times.append(time.perf_counter() - start)
+        self.stats['calls'] += 1
+        self.stats['figures'] += len(results)
+        return results
+
+    def summary(self):
+        def median_ms(times):
+            return round(float(np.median(times)) * 1000, 1) if times else None
+        return dict(workers=self.workers, **self.stats, build_ms=median_ms(self.build_times),
+                    overhead_ms=median_ms(self.overheads), wall_ms=median_ms(self.wall_times))
@@ -0,0 +1,64 @@
+import os
+import plotly.graph_objects as go
+from constants import default
+from utils.Encoding import encode_figure
+
+# figures are assembled as plain dicts from numpy arrays, which skips plotly's validation and
+# copying of every array. set VALIDATE_FIGURES=1 to validate each figure with go.Figure during development
+validate_figures = os.environ.get('VALIDATE_FIGURES', '0') == '1'
+
+
+###############################################################################
+# layout templates, built once from the defaults
+title_template = dict(
+    yref="container",
+    yanchor="top",
+    xref="paper",
+    xanchor="center",
+    x=0.5,
+    font=default.title_dict.value
+)
+
+axis_template = dict(
+    zeroline=True,
+    zerolinecolor=default.gridline_color.value,
+    zerolinewidth=default.gridline_width.value,
+    showgrid=True,
+    gridcolor=default.gridline_color.value,
+    gridwidth=default.gridline_width.value
+)
+
+hoverlabel_template = dict(
+    bordercolor=default.hover_bordercolor.value,
+    font=default.hover_font_dict.value
+)
+
+attack_hovertemplate = ("<b>%{customdata[3]}-%{customdata[4]}-%{customdata[5]} %{customdata[9]}, %{customdata[6]}</b><br>"
+                        "Group: %{customdata[23]}<br>"
+                        "Attack type: %{customdata[15]}<br>"
+                        "Weapon type: %{customdata[18]}<br>"
+                        "Target type: %{customdata[20]}<br>")
+
+
+def title(text, y):
+    return dict(title_template, text=text, y=y)
+
+
+def axis(text, **kwargs):
+    return dict(axis_template, title=dict(text=text, font=default.label_dict.value), **kwargs)
+
+
+def hoverlabel(bgcolor):
+    return dict(hoverlabel_template, bgcolor=bgcolor)
+
+
+###############################################################################
+# figure
+def build_figure(data, layout, frames=None):
+    fig = dict(data=data, layout=layout)
+    if frames is not None:
+        fig['frames'] = frames
+    if validate_figures:
+        # raises on any invalid property, like building the figure with graph objects
+        go.Figure(fig)
+    return encode_figure(fig)
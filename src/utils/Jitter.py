@@ -1,26 +1,50 @@
 import numpy as np
 import pandas as pd
-from copy import deepcopy
-np.random.seed(42)
-
-def add_jitter_coordinates(df, latitude_col, longitude_col, latitude_jitter_col, longitude_jitter_col, jitter_amount=0.0005):
-    np.random.seed(42)
-    df = deepcopy(df)
-    # Find rows where the same longitude and latitude appear more than once for the same year
-    duplicate_mask = df.duplicated(subset=[latitude_col, longitude_col], keep=False)
-    
-    # Add jitter to only the duplicate coordinates
-    df.loc[duplicate_mask, latitude_jitter_col] = df.loc[duplicate_mask, latitude_col] + np.random.uniform(-jitter_amount, jitter_amount, df[duplicate_mask].shape[0])
-    df.loc[duplicate_mask, longitude_jitter_col] = df.loc[duplicate_mask, longitude_col] + np.random.uniform(-jitter_amount, jitter_amount, df[duplicate_mask].shape[0])
-
-    # For non-duplicates, just copy the original latitude and longitude values
-    df[latitude_jitter_col].fillna(df[latitude_col], inplace=True)
-    df[longitude_jitter_col].fillna(df[longitude_col], inplace=True)
+
+# jitter is derived from a hash of the eventid, so a point always moves the same way
+# regardless of row order, load order or random seeds
+
+salt_latitude = 1
+salt_longitude = 2
+salt_beeswarm = 3
+
+
+def hash_uniform(ids, salt, low, high):
+    # splitmix64 finalizer of the id, mapped to [low, high)
+    with np.errstate(over='ignore'):
+        x = np.asarray(ids).astype(np.uint64) + np.uint64(salt) * np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        x = x ^ (x >> np.uint64(31))
+    unit = (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+    return low + (high - low) * unit
+
+
+def near_duplicate_mask(latitude, longitude, tolerance):
+    # points sharing a grid cell with another point, checked on two grids offset by half
+    # a cell so that close points on either side of a cell border are found as well
+    mask = np.zeros(latitude.shape[0], dtype=bool)
+    for offset in [0, 0.5]:
+        cells = pd.DataFrame({'lat': np.floor(latitude / tolerance + offset),
+                              'lon': np.floor(longitude / tolerance + offset)})
+        mask |= cells.duplicated(keep=False).to_numpy() & ~np.isnan(latitude) & ~np.isnan(longitude)
+    return mask
+
+
+def add_jitter_coordinates(df, latitude_col, longitude_col, latitude_jitter_col, longitude_jitter_col,
+                           jitter_amount=0.0005, tolerance=0.0005, id_col='eventid'):
+    latitude = df[latitude_col].to_numpy(dtype=np.float64)
+    longitude = df[longitude_col].to_numpy(dtype=np.float64)
+    ids = df[id_col].to_numpy()
+
+    # add jitter to only the coordinates that are (near) duplicates
+    duplicate_mask = near_duplicate_mask(latitude, longitude, tolerance)
+    df[latitude_jitter_col] = np.where(duplicate_mask, latitude + hash_uniform(ids, salt_latitude, -jitter_amount, jitter_amount), latitude)
+    df[longitude_jitter_col] = np.where(duplicate_mask, longitude + hash_uniform(ids, salt_longitude, -jitter_amount, jitter_amount), longitude)
 
     return df
 
 
-def add_jitter_beeswarm(df, jitter_amount=0.2):
-    nrows = df.shape[0]
-    df['beeswarm_jitter'] = np.random.uniform(-jitter_amount, jitter_amount, size=nrows)
-    return df
\ No newline at end of file
+def add_jitter_beeswarm(df, jitter_amount=0.2, id_col='eventid'):
+    df['beeswarm_jitter'] = hash_uniform(df[id_col].to_numpy(), salt_beeswarm, -jitter_amount, jitter_amount)
+    return df
@@ -0,0 +1,108 @@
+import os
+import json
+import numpy as np
+from utils.Embedding import train_centroids, assign_to_centroids
+
+# every block of the feature vector is a unit vector, so blocks are weighted against each other
+# and the dot product between two events orders them the same way as their euclidean distance
+feature_weights = {
+    'location': 3.0,
+    'date': 1.0,
+    'attacktype1_txt': 0.1,
+    'weaptype1_txt': 0.1,
+    'targtype1_txt': 0.1,
+    'casualties': 0.5,
+}
+
+
+def angle_block(values, lower, upper):
+    # scalar mapped to a point on a quarter circle
+    theta = np.pi / 2 * np.clip((values - lower) / max(upper - lower, 1e-9), 0, 1)
+    return np.column_stack([np.cos(theta), np.sin(theta)])
+
+
+def build_event_features(df):
+    blocks = []
+
+    # location on the unit sphere, attacks without location get no location block
+    lat = np.radians(df['latitude'].to_numpy(dtype=np.float64))
+    lon = np.radians(df['longitude'].to_numpy(dtype=np.float64))
+    location = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+    blocks.append(feature_weights['location'] * np.nan_to_num(location))
+
+    # date, unknown months count as the middle of the year
+    date = df['iyear'].to_numpy(dtype=np.float64) + (df['imonth'].fillna(6.5).to_numpy(dtype=np.float64) - 1) / 12
+    blocks.append(feature_weights['date'] * angle_block(date, date.min(), date.max()))
+
+    # attack, weapon and target type one hot, unknown codes get no block
+    for col in ['attacktype1_txt', 'weaptype1_txt', 'targtype1_txt']:
+        codes = df[col].cat.codes.to_numpy()
+        one_hot = np.zeros((codes.shape[0], len(df[col].cat.categories)))
+        one_hot[np.flatnonzero(codes >= 0), codes[codes >= 0]] = 1
+        blocks.append(feature_weights[col] * one_hot)
+
+    # casualties on a log scale, unknown counts as none
+    casualties = np.log1p(df['total_casualties'].fillna(0).to_numpy(dtype=np.float64))
+    blocks.append(feature_weights['casualties'] * angle_block(casualties, 0, casualties.max()))
+
+    features = np.hstack(blocks).astype(np.float32)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.where(norms > 0, norms, 1)
+
+
+def build_knn_graph(features, k, n_lists=None, n_probe=4):
+    # approximate k nearest neighbours, every row is compared with the rows in its own
+    # and the n_probe closest ivf lists
+    n_rows = features.shape[0]
+    n_lists = n_lists or max(1, int(np.sqrt(n_rows)))
+    centroids = train_centroids(features, n_lists)
+    assignment = assign_to_centroids(features, centroids)
+
+    ivf_rows = np.argsort(assignment, kind='stable')
+    ivf_offsets = np.searchsorted(assignment[ivf_rows], np.arange(n_lists + 1))
+    closest_lists = np.argsort(-(centroids @ centroids.T), axis=1)[:, :n_probe]
+
+    neighbours = np.full((n_rows, k), -1, dtype=np.int32)
+    distances = np.full((n_rows, k), np.inf, dtype=np.float16)
+    for i in range(n_lists):
+        members = ivf_rows[ivf_offsets[i]:ivf_offsets[i + 1]]
+        if members.shape[0] == 0:
+            continue
+        candidates = np.concatenate([ivf_rows[ivf_offsets[j]:ivf_offsets[j + 1]] for j in closest_lists[i]])
+
+        similarity = features[members] @ features[candidates].T
+        similarity[members[:, None] == candidates[None, :]] = -np.inf
+
+        k_found = min(k, candidates.shape[0] - 1)
+        if k_found <= 0:
+            continue
+        top = np.argpartition(-similarity, k_found - 1, axis=1)[:, :k_found]
+        top_scores = np.take_along_axis(similarity, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+
+        neighbours[members, :k_found] = candidates[np.take_along_axis(top, order, axis=1)]
+        # stored as cosine distance, which keeps float16 precision for close neighbours
+        distances[members, :k_found] = 1 - np.take_along_axis(top_scores, order, axis=1)
+
+    return neighbours, distances
+
+
+def write_knn_graph(neighbours, distances, path, version):
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'neighbours.npy'), neighbours)
+    np.save(os.path.join(path, 'distances.npy'), distances)
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(dict(version=version, k=int(neighbours.shape[1])), f)
+
+
+def read_knn_manifest(path):
+    manifest_path = os.path.join(path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def read_knn_graph(path):
+    # fixed width neighbour rows, -1 where fewer than k neighbours were found
+    return np.load(os.path.join(path, 'neighbours.npy'), mmap_mode='r')
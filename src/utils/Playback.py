@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+# per-year playback of the heatmap: attacks are binned into a fixed grid of cells once,
+# the cell centers are sent as the trace geometry and every year frame only carries z
+# of every cell rather than its changes from the year before. more cells change between two years
+# than have attacks in one, plotly.js can only apply deltas with client side code that replays
+# every year up to the one picked on the slider, and mostly zero z compresses well
+
+
+def build_density_bins(dff, weights, cell_size):
+    # sum of weights per (cell, year), as a cells x years matrix
+    lat_cell = np.floor(dff['latitude'].to_numpy(dtype=np.float64) / cell_size)
+    lon_cell = np.floor(dff['longitude'].to_numpy(dtype=np.float64) / cell_size)
+    valid = ~(np.isnan(lat_cell) | np.isnan(lon_cell))
+
+    years = dff['iyear'].to_numpy()[valid]
+    first_year = years.min() if years.shape[0] else 0
+    n_years = int(years.max() - first_year + 1) if years.shape[0] else 0
+
+    cells, cell_index = np.unique(np.column_stack([lat_cell[valid], lon_cell[valid]]), axis=0, return_inverse=True)
+    cell_index = cell_index.ravel()
+    weights = np.broadcast_to(weights, valid.shape)[valid].astype(np.float64)
+
+    z = np.bincount(cell_index * n_years + (years - first_year), weights=weights,
+                    minlength=cells.shape[0] * n_years).reshape(cells.shape[0], n_years)
+
+    return dict(
+        lat=(cells[:, 0] + 0.5) * cell_size,
+        lon=(cells[:, 1] + 0.5) * cell_size,
+        years=np.arange(first_year, first_year + n_years),
+        z=z,
+    )
+
+
+def build_year_summaries(dff, weights):
+    # total and most active group per year, shown as the frame title
+    summary = pd.DataFrame({'iyear': dff['iyear'].to_numpy(), 'gname': dff['gname'].astype(str).to_numpy(),
+                            'weight': np.broadcast_to(weights, (dff.shape[0],)).astype(np.float64)})
+    totals = summary.groupby('iyear')['weight'].sum()
+    known = summary[summary['gname'] != 'Unknown']
+    groups = known.groupby(['iyear', 'gname'])['weight'].sum().reset_index()
+    top_groups = groups.sort_values('weight', ascending=False).drop_duplicates('iyear').set_index('iyear')['gname']
+    return {year: (totals[year], top_groups.get(year)) for year in totals.index}
+
+
+def build_playback_frames(bins, summaries, title, frame_duration):
+    # frames only update z of the density trace, the geometry stays in the initial trace
+    frames = []
+    steps = []
+    for i, year in enumerate(bins['years']):
+        total, top_group = summaries.get(year, (0, None))
+        frame_title = f'{title} {year}: {total:,.0f}'
+        if top_group is not None:
+            frame_title += f', most active: {top_group}'
+        frames.append(dict(name=str(year), data=[dict(type='densitymap', z=bins['z'][:, i])], traces=[0],
+                           layout=dict(title=dict(text=frame_title))))
+        steps.append(dict(label=str(year), method='animate',
+                          args=[[str(year)], dict(mode='immediate', frame=dict(duration=0, redraw=True),
+                                                  transition=dict(duration=0))]))
+
+    play = dict(label='Play', method='animate',
+                args=[None, dict(frame=dict(duration=frame_duration, redraw=True), transition=dict(duration=0),
+                                 fromcurrent=True)])
+    pause = dict(label='Pause', method='animate',
+                 args=[[None], dict(mode='immediate', frame=dict(duration=0, redraw=False), transition=dict(duration=0))])
+
+    updatemenus = [dict(type='buttons', direction='left', showactive=False, buttons=[play, pause],
+                        x=0.02, y=0.02, xanchor='left', yanchor='bottom')]
+    sliders = [dict(steps=steps, active=0, x=0.2, len=0.7, y=0.02, yanchor='bottom',
+                    currentvalue=dict(visible=False), pad=dict(t=0, b=0))]
+
+    return frames, updatemenus, sliders
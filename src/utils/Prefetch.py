@@ -0,0 +1,94 @@
+import time
+import functools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# speculative work in a small background pool. a task is admitted only if it is not already
+# pending, the queue has room and prefetching has used less than its cpu budget recently.
+# admitted tasks wait until no live request is being served, and are dropped if that takes too long
+
+
+class Prefetcher:
+    def __init__(self, max_workers=2, max_pending=16, cpu_budget=0.25, window=10.0, max_wait=2.0):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+        self.max_pending = max_pending
+        # fraction of one core that prefetching may use, measured over the last window seconds
+        self.cpu_budget = cpu_budget
+        self.window = window
+        self.max_wait = max_wait
+
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.pending = set()
+        self.live_requests = 0
+        self.cpu_used = deque()
+        self.stats = dict(submitted=0, rejected=0, dropped=0, completed=0, failed=0)
+
+    def cpu_used_recently(self):
+        # caller holds the lock
+        now = time.monotonic()
+        while self.cpu_used and self.cpu_used[0][0] < now - self.window:
+            self.cpu_used.popleft()
+        return sum(cpu for _, cpu in self.cpu_used)
+
+    def admit(self, key):
+        with self.lock:
+            if key in self.pending or len(self.pending) >= self.max_pending \
+                    or self.cpu_used_recently() >= self.cpu_budget * self.window:
+                self.stats['rejected'] += 1
+                return False
+            self.pending.add(key)
+            self.stats['submitted'] += 1
+            return True
+
+    def submit(self, key, fn, *args, **kwargs):
+        if self.admit(key):
+            self.executor.submit(self.run, key, fn, *args, **kwargs)
+
+    def run(self, key, fn, *args, **kwargs):
+        # live requests go first, a speculative result is stale once the user has moved on
+        with self.idle:
+            is_idle = self.idle.wait_for(lambda: self.live_requests == 0, timeout=self.max_wait)
+
+        outcome = 'dropped'
+        start = time.thread_time()
+        try:
+            if is_idle:
+                fn(*args, **kwargs)
+                outcome = 'completed'
+        except Exception:
+            outcome = 'failed'
+        finally:
+            with self.lock:
+                self.stats[outcome] += 1
+                if outcome != 'dropped':
+                    self.cpu_used.append((time.monotonic(), time.thread_time() - start))
+                self.pending.discard(key)
+
+    def live(self, fn):
+        # marks a function as serving a live request
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.lock:
+                self.live_requests += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.idle:
+                    self.live_requests -= 1
+                    if self.live_requests == 0:
+                        self.idle.notify_all()
+        return wrapper
+
+
+def neighbouring_year_ranges(year_range, year_min, year_max, steps=(1, 2)):
+    # ranges one handle of the slider is likely to be dragged to next, closest first
+    year_lower, year_upper = int(year_range[0]), int(year_range[1])
+    ranges = []
+    for step in steps:
+        for lower, upper in [(year_lower, year_upper + step), (year_lower - step, year_upper),
+                             (year_lower, year_upper - step), (year_lower + step, year_upper)]:
+            if year_min <= lower <= upper <= year_max and [lower, upper] not in ranges:
+                ranges.append([lower, upper])
+    return ranges
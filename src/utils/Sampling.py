@@ -0,0 +1,30 @@
+import numpy as np
+from utils.Jitter import hash_uniform
+
+# coarse views of large results: the rows that stand out are always kept, the rest is thinned
+# by a hash of the row's id, so the same rows are kept every time a view is drawn
+
+
+def sample_with_outliers(ids, values, groups, size, n_outliers, keep=None, salt=4):
+    # mask of about size rows: the n_outliers largest values of every group, the rows in keep
+    # and an even sample of the others
+    n_rows = ids.shape[0]
+    mask = np.zeros(n_rows, dtype=bool) if keep is None else keep.copy()
+
+    # rank within each group by descending value, missing values last
+    key = np.where(np.isnan(values), np.inf, -values)
+    order = np.lexsort((key, groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    rank = np.arange(n_rows) - np.repeat(starts, np.diff(np.r_[starts, n_rows]))
+    mask[order[rank < n_outliers]] = True
+
+    n_kept = mask.sum()
+    fraction = max(size - n_kept, 0) / max(n_rows - n_kept, 1)
+    mask |= hash_uniform(ids, salt, 0.0, 1.0) < fraction
+    return mask
+
+
+def log_cells(values, cells_per_decade):
+    # index of the log spaced cell of each non-negative value, cell 0 starts at 0
+    return np.floor(np.log10(np.maximum(values, 0) + 1) * cells_per_decade).astype(np.int64)
@@ -0,0 +1,62 @@
+import os
+import json
+import pickle
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+
+def build_search_index(summaries, path, version):
+    os.makedirs(path, exist_ok=True)
+
+    # missing summaries get an empty document so row positions line up with the artifact
+    vectorizer = TfidfVectorizer(dtype=np.float32)
+    tfidf_matrix = vectorizer.fit_transform(['' if s is None else s for s in summaries])
+
+    # stored column major, so a query only touches the postings of its own terms
+    sp.save_npz(os.path.join(path, 'tfidf.npz'), tfidf_matrix.tocsc())
+    with open(os.path.join(path, 'vectorizer.pkl'), 'wb') as f:
+        pickle.dump(vectorizer, f)
+
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(dict(version=version, n_rows=tfidf_matrix.shape[0]), f)
+
+
+def read_search_manifest(path):
+    manifest_path = os.path.join(path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+class SearchIndex:
+    def __init__(self, path):
+        self.manifest = read_search_manifest(path)
+        self.tfidf_matrix = sp.load_npz(os.path.join(path, 'tfidf.npz')).tocsc()
+        with open(os.path.join(path, 'vectorizer.pkl'), 'rb') as f:
+            self.vectorizer = pickle.load(f)
+
+    def scores(self, query):
+        # cosine similarity, as rows of the tfidf matrix are l2 normalized
+        query_vector = self.vectorizer.transform([query])
+        if query_vector.nnz == 0:
+            return None
+        return self.tfidf_matrix[:, query_vector.indices] @ query_vector.data
+
+    def search(self, query, rows=None, k=10):
+        # top k row positions matching the query, restricted to rows if given
+        scores = self.scores(query)
+        if scores is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        rows = np.arange(scores.shape[0]) if rows is None else np.asarray(rows)
+        scores = scores[rows]
+
+        # only rows sharing at least one term with the query
+        matching = np.flatnonzero(scores > 0)
+        if matching.shape[0] > k:
+            matching = matching[np.argpartition(scores[matching], -k)[-k:]]
+        matching = matching[np.argsort(scores[matching])[::-1]]
+
+        return rows[matching], scores[matching]
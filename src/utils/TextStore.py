@@ -0,0 +1,68 @@
+import os
+import json
+import numpy as np
+
+
+def write_text_store(df, columns, path):
+    os.makedirs(path, exist_ok=True)
+
+    for col in columns:
+        values = df[col]
+        missing = values.isna().to_numpy()
+
+        # utf-8 encode every row, missing values become empty strings flagged in the mask
+        encoded = [b'' if is_missing else str(value).encode('utf-8') for value, is_missing in zip(values, missing)]
+
+        # offsets[i]:offsets[i+1] is the byte range of row i in the heap
+        lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        with open(os.path.join(path, f'{col}.heap'), 'wb') as f:
+            f.write(b''.join(encoded))
+        np.save(os.path.join(path, f'{col}.offsets.npy'), offsets)
+        np.save(os.path.join(path, f'{col}.missing.npy'), missing)
+
+    # manifest is written last so a half written store is never opened
+    manifest = dict(columns=list(columns), n_rows=int(df.shape[0]))
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+
+class TextStore:
+    # read-only view of a store written by write_text_store, fetched on demand per row position
+    def __init__(self, path):
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        self.columns = manifest['columns']
+        self.n_rows = manifest['n_rows']
+
+        self.heaps = {}
+        self.offsets = {}
+        self.missing = {}
+        for col in self.columns:
+            heap_path = os.path.join(path, f'{col}.heap')
+            # np.memmap cannot map an empty file
+            if os.path.getsize(heap_path) > 0:
+                self.heaps[col] = np.memmap(heap_path, dtype=np.uint8, mode='r')
+            else:
+                self.heaps[col] = np.empty(0, dtype=np.uint8)
+            self.offsets[col] = np.load(os.path.join(path, f'{col}.offsets.npy'), mmap_mode='r')
+            self.missing[col] = np.load(os.path.join(path, f'{col}.missing.npy'), mmap_mode='r')
+
+    def get(self, column, row):
+        if self.missing[column][row]:
+            return None
+        start, stop = self.offsets[column][row], self.offsets[column][row + 1]
+        return self.heaps[column][start:stop].tobytes().decode('utf-8')
+
+    def read_column(self, column):
+        # decode a whole column at once, used when building indexes over the text
+        heap = self.heaps[column].tobytes()
+        offsets = np.asarray(self.offsets[column])
+        missing = np.asarray(self.missing[column])
+        return [None if missing[i] else heap[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(self.n_rows)]
+
+    def get_row(self, row, columns=None):
+        columns = self.columns if columns is None else columns
+        return {col: self.get(col, row) for col in columns}
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+# attacks over time below the resolution of a year. the crossfilter keeps aggregates per day of
+# the dataset's years, which are rolled up into the weeks or months of the years shown, so a
+# filter change is answered from the day aggregates rather than a groupby over the filtered rows.
+# day code 0 is an attack of unknown month, day code d is the day d - 1 days after january 1 of the first year
+
+
+def attack_dates(df):
+    # an unknown day counts as the first of its month, the date of an unknown month is unknown
+    return pd.to_datetime(pd.DataFrame({'year': df['iyear'],
+                                        'month': df['imonth'].where(df['imonth'] > 0),
+                                        'day': df['iday'].where(df['iday'] > 0, 1)}), errors='coerce')
+
+
+def first_day(year_min):
+    return pd.Timestamp(year_min, 1, 1)
+
+
+def n_day_codes(year_min, year_max):
+    return (pd.Timestamp(year_max, 12, 31) - first_day(year_min)).days + 2
+
+
+def day_codes(dates, year_min):
+    days = (dates - first_day(year_min)).dt.days
+    return days.fillna(-1).to_numpy(dtype=np.int64) + 1
+
+
+def date_selection(date_range, year_min, n_codes):
+    # boolean per day code of the dates in the range, attacks of unknown date are outside any range
+    if date_range is None:
+        return None
+    start, end = (pd.Timestamp(date) for date in date_range)
+    codes = np.arange(n_codes)
+    return (codes >= (start - first_day(year_min)).days + 1) & (codes <= (end - first_day(year_min)).days + 1)
+
+
+def period_starts(year_range, resolution):
+    # first day of each week or month of the years
+    freq = '7D' if resolution == 'week' else 'MS'
+    return pd.date_range(pd.Timestamp(year_range[0], 1, 1), pd.Timestamp(year_range[1], 12, 31), freq=freq)
+
+
+def rollup(per_day, year_min, starts, year_max):
+    # sums of a per day code aggregate over the periods beginning at starts and ending with year_max
+    offsets = (starts - first_day(year_min)).days.to_numpy() + 1
+    end = (pd.Timestamp(year_max, 12, 31) - first_day(year_min)).days + 1
+    return np.add.reduceat(per_day[:end + 1], offsets)
+
+
+def snap_date_range(x_range, starts, year_max):
+    # a brushed range of dates widened to the whole periods it touches, as iso dates
+    low, high = (pd.Timestamp(x) for x in x_range)
+    first = max(starts.searchsorted(low, side='right') - 1, 0)
+    last = max(starts.searchsorted(high, side='right') - 1, first)
+    end = starts[last + 1] - pd.Timedelta(days=1) if last + 1 < len(starts) else pd.Timestamp(year_max, 12, 31)
+    return [starts[first].date().isoformat(), end.date().isoformat()]
@@ -0,0 +1,53 @@
+from datetime import date
+from urllib.parse import urlencode, urlparse, parse_qs
+
+# the filters of a view in the query string of its url, so a shared link opens the same view.
+# only values different from the default state are written, lists are repeated parameters,
+# the year range is written as years=1990-2010 and the date range as dates=2001-09-01_2001-12-31
+
+list_params = ['attacktype', 'weapontype', 'targettype', 'group']
+value_params = ['search', 'search_mode', 'metric']
+
+
+def encode_url_state(state, default_state):
+    params = {}
+    if list(state['year_range']) != list(default_state['year_range']):
+        params['years'] = '{}-{}'.format(*state['year_range'])
+    if state['date_range']:
+        params['dates'] = '{}_{}'.format(*state['date_range'])
+    for name in list_params + value_params:
+        if state[name] and state[name] != default_state[name]:
+            params[name] = state[name]
+    return '?' + urlencode(params, doseq=True) if params else ''
+
+
+def decode_url_state(url, default_state, year_min, year_max, options):
+    # options holds the valid values of each parameter, anything else falls back to the default
+    state = dict(default_state)
+    params = parse_qs(urlparse(url or '').query)
+
+    try:
+        year_lower, year_upper = (int(year) for year in params['years'][0].split('-'))
+        if year_min <= year_lower <= year_upper <= year_max:
+            state['year_range'] = [year_lower, year_upper]
+    except (KeyError, ValueError):
+        pass
+
+    # dates within the years
+    try:
+        date_lower, date_upper = (date.fromisoformat(day) for day in params['dates'][0].split('_'))
+        if state['year_range'][0] <= date_lower.year and date_lower <= date_upper and date_upper.year <= state['year_range'][1]:
+            state['date_range'] = [date_lower.isoformat(), date_upper.isoformat()]
+    except (KeyError, ValueError):
+        pass
+
+    for name in list_params:
+        values = [value for value in params.get(name, []) if value in options[name]]
+        if values:
+            state[name] = values
+    for name in value_params:
+        value = params.get(name, [None])[0]
+        if value and (name not in options or value in options[name]):
+            state[name] = value
+
+    return state
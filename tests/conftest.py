@@ -0,0 +1,58 @@
+import os
+import sys
+import pytest
+
+# the app reads its dataset from src/data relative to the repository root, as when run with python src/map.py
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, 'src'))
+os.chdir(root)
+
+
+@pytest.fixture(scope='session')
+def dashboard():
+    import map as dashboard
+    if dashboard.read_dataset_version(dashboard.data_path) is None:
+        pytest.skip('no dataset in src/data, run python src/etl.py first')
+    # dash registers the callbacks with the first app of the process, so the tests share one
+    dashboard.app = dashboard.create_app()
+    dashboard.wait_until_loaded()
+    return dashboard
+
+
+@pytest.fixture(scope='session')
+def client(dashboard):
+    return dashboard.app.server.test_client()
+
+
+@pytest.fixture(scope='session')
+def callbacks(dashboard, client):
+    # key and registration of each callback by function name, dash takes them over on the first request
+    client.get('/_dash-dependencies')
+    return {callback['callback'].__name__: (key, callback) for key, callback in dashboard.app.callback_map.items()}
+
+
+# inputs of the charts callback on page load, by component property
+default_inputs = {'global-clickData.data': {'data': None, 'trigger': None}, 'crossfilter-year-slider.value': [1990, 2000],
+                  'toggle-search-mode.value': 'keyword', 'toggle-metric.value': 'attacks', 'toggle-playback.value': [],
+                  'map-level.data': 'attacks'}
+default_states = {'map-state.data': {'zoom': 3, 'center': {'lat': 0, 'lon': 0}}, 'session-id.data': 'test',
+                  'scatter-expanded.data': []}
+
+
+@pytest.fixture(scope='session')
+def post_charts(client, callbacks):
+    # posts a change of the inputs to the charts callback as the browser does, and returns the response
+    key, callback = callbacks['update_charts']
+
+    def post(changed, inputs=None, headers=None):
+        # changed and the keys of inputs are component properties, e.g. 'crossfilter-search-input.value'
+        values = dict(default_inputs, **(inputs or {}))
+        body = dict(output=key,
+                    outputs=[dict(id=output.split('.')[0], property=output.split('.')[1]) for output in key.strip('.').split('...')],
+                    inputs=[dict(id=i['id'], property=i['property'], value=values.get(f"{i['id']}.{i['property']}"))
+                            for i in callback['inputs']],
+                    state=[dict(id=s['id'], property=s['property'], value=default_states.get(f"{s['id']}.{s['property']}"))
+                           for s in callback['state']],
+                    changedPropIds=changed)
+        return client.post('/_dash-update-component', json=body, headers=headers)
+    return post
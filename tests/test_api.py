@@ -0,0 +1,14 @@
+import types
+
+
+def test_index(client):
+    response = client.get('/api/v1')
+    assert response.status_code == 200
+    assert set(response.get_json()['kinds']) == {'count', 'groups', 'flows', 'top_events', 'rows'}
+
+
+def test_index_of_pinned_dataset(dashboard):
+    # a request keeps the version it started with while a new one is swapped in
+    with dashboard.app.server.test_request_context('/api/v1'):
+        with dashboard.use_dataset(types.SimpleNamespace(version='pinned')):
+            assert dashboard.api_index().get_json()['version'] == 'pinned'
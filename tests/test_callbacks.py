@@ -0,0 +1,67 @@
+import json
+import pytest
+
+charts = {'heatmap': 'build_map_heatmap', 'parallel-sets': 'build_chart_parallel_sets', 'beeswarm': 'build_chart_beeswarm',
+          'scatter': 'build_chart_scatter', 'timeline': 'build_chart_timeline'}
+
+
+@pytest.fixture
+def builds(dashboard, monkeypatch):
+    # number of times each chart is built
+    counts = dict.fromkeys(charts, 0)
+    for chart, name in charts.items():
+        def counted(*args, _build=getattr(dashboard, name), _chart=chart):
+            counts[_chart] += 1
+            return _build(*args)
+        monkeypatch.setattr(dashboard, name, counted)
+    return counts
+
+
+def response_of(response):
+    assert response.status_code == 200
+    return json.loads(response.get_data())['response']
+
+
+def test_parallel_sets_click(post_charts, builds):
+    # the click sets the dropdowns and draws every chart once, in one callback
+    response = response_of(post_charts(['chart-parallel-sets.clickData'],
+                                       {'chart-parallel-sets.clickData': {'points': [{'pointNumber': 0}]}}))
+    assert builds == dict.fromkeys(charts, 1)
+    assert response['crossfilter-attacktype-dropdown']['value']
+
+
+def test_scatter_click(dashboard, post_charts, builds):
+    group = dashboard.get_dataset().df['gname'].iloc[0]
+    response = response_of(post_charts(['chart-scatter.clickData'],
+                                       {'chart-scatter.clickData': {'points': [{'customdata': [group, 1, 1, None]}]}}))
+    assert builds == dict.fromkeys(charts, 1)
+    assert response['crossfilter-group-dropdown']['value'] == [group]
+
+
+def test_metric_toggle(post_charts, builds):
+    response_of(post_charts(['toggle-metric.value'], {'toggle-metric.value': 'casualties'}))
+    assert builds == dict(dict.fromkeys(charts, 0), heatmap=1)
+
+
+def test_failing_chart(dashboard, post_charts, monkeypatch, caplog, capsys):
+    # a chart that fails keeps its figure and the others are drawn, and the failure is logged
+    def fail(*args):
+        raise ValueError('failed')
+    monkeypatch.setattr(dashboard, 'build_chart_beeswarm', fail)
+    response = response_of(post_charts(['crossfilter-year-slider.value']))
+    assert 'chart-beeswarm' not in response
+    assert {'map-heatmap', 'chart-parallel-sets', 'chart-scatter', 'chart-timeline'} <= set(response)
+    assert [(r.levelname, r.getMessage()) for r in caplog.records] == [('ERROR', 'chart beeswarm: failed to build')]
+    assert 'ValueError' in caplog.text
+    assert capsys.readouterr().out == ''
+
+
+def test_no_cascade(callbacks):
+    # the dropdowns written by the charts callback only draw charts again through the charts callback itself,
+    # and the refinement it requests only for large results
+    key, _ = callbacks['update_charts']
+    outputs = set(key.strip('.').split('...'))
+    for name, (key, callback) in callbacks.items():
+        inputs = set(f"{i['id']}.{i['property']}" for i in callback['inputs'])
+        if name not in ('update_charts', 'refine_charts') and inputs & outputs:
+            assert not any(output.split('@')[0].endswith('.figure') for output in key.strip('.').split('...')), name
@@ -0,0 +1,34 @@
+import json
+import pytest
+
+no_click = {'data': None, 'trigger': None}
+no_matches = ([1990, 2000], None, None, None, None, None, 'zzzzqqq', 'keyword')
+
+
+@pytest.mark.parametrize('chart', ['heatmap', 'parallel-sets', 'beeswarm', 'scatter', 'timeline'])
+def test_search_without_matches(dashboard, chart):
+    # every chart draws its empty axes rather than failing
+    build, args = dashboard.chart_tasks(dashboard.default_map_state, no_click, False, no_matches, 'attacks', [], set(), [])[chart]
+    figure = build(*args)
+    assert figure['layout']['title']
+    # axes, lines and annotations are placed at numbers
+    json.dumps(figure['layout'], allow_nan=False, default=str)
+
+
+def test_search_without_matches_callback(post_charts):
+    response = post_charts(['crossfilter-search-input.value'], {'crossfilter-search-input.value': 'zzzzqqq'})
+    assert response.status_code == 200
+    figures = json.loads(response.get_data())['response']
+    assert {'map-heatmap', 'chart-parallel-sets', 'chart-beeswarm', 'chart-scatter', 'chart-timeline'} <= set(figures)
+
+
+def test_search_matches_are_shared(dashboard, monkeypatch):
+    # a chart that leaves out the type filters marks the same matching attacks as one that applies them,
+    # with few enough matches that ranking within the types would pick others
+    monkeypatch.setattr(dashboard.default.search_top_k, '_value_', 20)
+    dataset = dashboard.get_dataset()
+    attacktype = [dataset.df['attacktype1_txt'].value_counts().index[0]]
+    without_types = dashboard.filter_data(dataset, [1971, 2019], None, None, None, None, None, 'police', 'keyword')
+    with_types = dashboard.filter_data(dataset, [1971, 2019], None, attacktype, None, None, None, 'police', 'keyword')
+    assert with_types.shape[0] > 0
+    assert with_types.index.equals(without_types.index[without_types['attacktype1_txt'].isin(attacktype)])
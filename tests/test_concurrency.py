@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+year_ranges = [[1970, 1980], [1985, 1995], [1990, 2000], [2000, 2019]]
+
+
+def post_year_range(post_charts, year_range):
+    response = post_charts(['crossfilter-year-slider.value'], {'crossfilter-year-slider.value': year_range})
+    assert response.status_code == 200
+    return response.get_data()
+
+
+def test_concurrent_callbacks(dashboard, post_charts):
+    # callbacks served at the same time give the responses they give one after another,
+    # and leave the shared frame as it was
+    dataset = dashboard.get_dataset()
+    columns = list(dataset.df.columns)
+    checksum = pd.util.hash_pandas_object(dataset.df[['eventid', 'iyear', 'latitude_jitter']]).sum()
+
+    sequential = {tuple(year_range): post_year_range(post_charts, year_range) for year_range in year_ranges}
+    # filtered again at the same time rather than read from the cache
+    dashboard.cache.clear()
+    with ThreadPoolExecutor(8) as executor:
+        futures = [(year_range, executor.submit(post_year_range, post_charts, year_range)) for year_range in year_ranges * 2]
+        for year_range, future in futures:
+            assert future.result() == sequential[tuple(year_range)]
+
+    assert list(dataset.df.columns) == columns
+    assert pd.util.hash_pandas_object(dataset.df[['eventid', 'iyear', 'latitude_jitter']]).sum() == checksum
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+from utils.Cleaning import build_country_dimension, build_population_array
+from utils.Data import attack_population
+
+
+def test_country_dimension():
+    df = pd.DataFrame({'country_txt': ['Peru', 'France', 'Peru', 'Soviet Union'],
+                       'region_txt': ['South America', 'Western Europe', 'South America', 'Eastern Europe']})
+    flags = pd.DataFrame({'country': ['France', 'Peru'], 'flag': ['fr.png', 'pe.png']})
+    countries, country_id = build_country_dimension(df, flags)
+
+    # attacks are keyed by a small integer into the country dimension, which holds their region and flag
+    assert countries['country_txt'].to_numpy()[country_id].tolist() == df['country_txt'].tolist()
+    assert countries['region_txt'].to_numpy()[country_id].tolist() == df['region_txt'].tolist()
+    assert countries['flag'].tolist() == ['fr.png', 'pe.png', '']
+    assert countries['region_id'].tolist() == [2, 1, 0]
+
+    population = pd.DataFrame({'country': ['Peru', 'Peru', 'France'], 'year': [1990, 1991, 1991],
+                               'population_estimate': [22.0, 22.5, 58.0]})
+    array = build_population_array(countries, population, np.arange(1990, 1993))
+    np.testing.assert_array_equal(array, [[np.nan, 58.0, np.nan], [22.0, 22.5, np.nan], [np.nan] * 3])
+
+
+def test_attack_population(dashboard):
+    # the population of each attack's country in its year, as in the population table
+    dataset = dashboard.get_dataset()
+    df_pop = pd.read_csv('src/data/population_cleaned.csv').drop_duplicates(['country', 'year'])
+    population = attack_population(dataset.df, dataset.population, dataset.population_years)
+    expected = (dataset.df[['country_txt', 'iyear']].astype({'country_txt': str})
+                .merge(df_pop, how='left', left_on=['country_txt', 'iyear'], right_on=['country', 'year'])
+                ['population_estimate'].to_numpy())
+    np.testing.assert_array_equal(population, expected)
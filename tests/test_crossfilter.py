@@ -0,0 +1,42 @@
+import numpy as np
+from utils.Crossfilter import Crossfilter
+
+
+def test_groups_match_a_recount():
+    # after every filter change the groups equal a recount of the rows passing all other filters
+    rng = np.random.default_rng(0)
+    n_rows = 5000
+    codes = dict(a=rng.integers(0, 5, n_rows), b=rng.integers(0, 7, n_rows), c=rng.integers(0, 3, n_rows))
+    values = np.where(rng.random(n_rows) < 0.2, np.nan, rng.random(n_rows))
+
+    crossfilter = Crossfilter(n_rows)
+    for name, n_codes in [('a', 5), ('b', 7), ('c', 3)]:
+        crossfilter.add_dimension(name, codes[name], n_codes)
+    crossfilter.add_group('b_sums', 'b', values=values, ignore=['b'])
+    crossfilter.add_group('a_counts', 'a', ignore=['a', 'c'])
+
+    selected = dict(a=np.ones(5, dtype=bool), b=np.ones(7, dtype=bool), c=np.ones(3, dtype=bool))
+    for _ in range(50):
+        name = rng.choice(['a', 'b', 'c'])
+        selected[name] = rng.random(len(selected[name])) < rng.choice([0.2, 0.8])
+        result = crossfilter.query({name: selected[name]}, ['b_sums', 'a_counts'])
+
+        passing = {d: selected[d][codes[d]] for d in codes}
+        included = passing['a'] & passing['c']
+        assert np.array_equal(result['b_sums']['rows'], np.bincount(codes['b'][included], minlength=7))
+        known = included & ~np.isnan(values)
+        assert np.array_equal(result['b_sums']['count'], np.bincount(codes['b'][known], minlength=7))
+        np.testing.assert_allclose(result['b_sums']['sum'], np.bincount(codes['b'][known], weights=values[known], minlength=7),
+                                   atol=1e-9)
+        assert np.array_equal(result['a_counts']['rows'], np.bincount(codes['a'][passing['b']], minlength=5))
+
+
+def test_dataset_groups(dashboard):
+    # the attack type counts of a year range match the filtered frame
+    dataset = dashboard.get_dataset()
+    with dashboard.use_dataset(dataset):
+        result = dashboard.query_crossfilter(['attack_counts'], year=[1990, 2000])
+        counts = dashboard.crossfilter_series(result['attack_counts'], 'attacktype')
+    dff = dashboard.filter_years(dataset, [1990, 2000])
+    expected = dff.groupby('attacktype1_txt', observed=True).size()
+    assert counts.to_dict() == expected.to_dict()
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from utils.Embedding import EmbeddingIndex, build_embeddings, build_ivf_index, get_encoder
+
+
+@pytest.fixture(scope='module')
+def index(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('embeddings'))
+    rng = np.random.default_rng(0)
+    words = ['bomb', 'bus', 'bridge', 'police', 'station', 'armed', 'assault', 'mayor', 'kidnapping', 'market',
+             'embassy', 'hijacking', 'village', 'soldiers', 'checkpoint', 'church', 'school', 'pipeline']
+    texts = [' '.join(rng.choice(words, 4)) for _ in range(2000)]
+    build_ivf_index(build_embeddings(texts, get_encoder('hashing'), path, version='v'), path, n_lists=16)
+    return EmbeddingIndex(path)
+
+
+def exact_scores(index, query, rows, k):
+    # top k scores by brute force, compared as scores since rows with equal scores may come in any order
+    scores = np.asarray(index.embeddings[rows], dtype=np.float32) @ index.encoder.encode([query])[0]
+    return np.sort(scores)[::-1][:k]
+
+
+def test_ivf_lists_cover_every_row(index):
+    assert np.array_equal(np.sort(index.ivf_rows), np.arange(index.embeddings.shape[0]))
+    assert index.ivf_offsets[0] == 0 and index.ivf_offsets[-1] == index.embeddings.shape[0]
+
+
+def test_search_all_lists_is_exact(index):
+    # probing every list scores every row, as the exact search does
+    rows, scores = index.search('bomb on a bus', k=10, n_probe=16)
+    expected = exact_scores(index, 'bomb on a bus', np.arange(index.embeddings.shape[0]), 10)
+    np.testing.assert_allclose(scores, expected, rtol=1e-6)
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_search_restricted_rows(index):
+    # small restrictions are scanned exactly, large ones probed and then restricted
+    restricted = np.arange(0, 2000, 3)
+    rows, scores = index.search('kidnapping of a mayor', rows=restricted, k=10)
+    expected = exact_scores(index, 'kidnapping of a mayor', restricted, 10)
+    np.testing.assert_allclose(scores, expected, rtol=1e-6)
+    rows, _ = index.search('kidnapping of a mayor', rows=restricted, k=10, exact_below=100)
+    assert set(rows.tolist()) <= set(restricted.tolist())
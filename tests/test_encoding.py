@@ -0,0 +1,51 @@
+import base64
+import gzip
+import numpy as np
+import pytest
+from utils.Encoding import encode_figure, typed_array
+
+
+def decode(encoded):
+    values = np.frombuffer(base64.b64decode(encoded['bdata']), dtype=encoded['dtype'])
+    return values.reshape([int(n) for n in encoded['shape'].split(', ')]) if 'shape' in encoded else values
+
+
+@pytest.mark.parametrize('values, dtype', [([0, 5, 120], 'i1'), ([0, 200], 'u1'), ([-1, 40000], 'i4'),
+                                           ([1.0, 3.0], 'i1'), ([0.5, 1.25], 'f4'), ([True, False], 'i1'),
+                                           ([0, 2**40], 'f4')])
+def test_typed_array(values, dtype):
+    # the smallest type that holds the values, whole floats as integers
+    encoded = typed_array(np.array(values))
+    assert encoded['dtype'] == dtype
+    np.testing.assert_allclose(decode(encoded), values, rtol=1e-6)
+
+
+def test_typed_array_not_for_missing_values():
+    assert typed_array(np.array([1.0, np.nan]))['dtype'] == 'f4'
+    assert typed_array(np.array(['a', 'b'])) is None
+    assert typed_array(np.array([])) is None
+
+
+def test_encode_figure():
+    # numeric arrays of traces and frames are encoded, text and customdata are left as they are
+    z = np.arange(6, dtype=np.float64).reshape(2, 3)
+    fig = dict(data=[dict(type='scatter', x=[1, 2], y=np.array([0.5, 1.5]), text=['a', 'b'], customdata=[[1], [2]],
+                          marker=dict(color=['red', 'blue'], size=np.array([3, 4])))],
+               frames=[dict(name='1990', data=[dict(type='heatmap', z=z)])],
+               layout=dict())
+    encoded = encode_figure(fig)
+    trace = encoded['data'][0]
+    assert decode(trace['x']).tolist() == [1, 2] and decode(trace['y']).tolist() == [0.5, 1.5]
+    assert trace['text'] == ['a', 'b'] and trace['customdata'] == [[1], [2]]
+    assert trace['marker']['color'] == ['red', 'blue'] and decode(trace['marker']['size']).tolist() == [3, 4]
+    np.testing.assert_array_equal(decode(encoded['frames'][0]['data'][0]['z']), z)
+
+
+def test_responses_are_gzipped(post_charts):
+    # figure responses are gzipped for clients that accept it, and only gzip is offered
+    plain = post_charts(['crossfilter-year-slider.value'])
+    compressed = post_charts(['crossfilter-year-slider.value'], headers={'Accept-Encoding': 'br, gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+    assert b'"bdata"' in plain.get_data()
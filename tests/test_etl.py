@@ -0,0 +1,51 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+import etl
+from utils.Artifact import read_artifact, read_artifact_manifest
+
+
+def write_raw(data_dir, raw):
+    raw.to_csv(os.path.join(data_dir, 'globalterrorism_2020.csv'), index=False, encoding='ISO-8859-1')
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    # the first years of the raw export next to the country and population tables
+    raw = etl.read_raw_chunks('src/data/globalterrorism_2020.csv', None, keep_default_na=False)
+    write_raw(tmp_path, raw[raw['iyear'].isin(['1970', '1971', '1972'])])
+    for name in ['countries_flags_cleaned.csv', 'population_cleaned.csv']:
+        shutil.copy(os.path.join('src/data', name), tmp_path)
+    return str(tmp_path)
+
+
+def run(data_dir, capsys):
+    # stage name to whether it ran
+    etl.run(data_dir, 500, 'hashing', False)
+    lines = [line.split(': ') for line in capsys.readouterr().out.splitlines()]
+    return {line[0]: line[1].startswith('done') for line in lines if line[1].startswith(('done', 'skipped'))}
+
+
+def test_run(data_dir, capsys):
+    assert run(data_dir, capsys) == dict.fromkeys(etl.stage_versions, True)
+    raw = pd.read_csv(os.path.join(data_dir, 'globalterrorism_2020.csv'), encoding='ISO-8859-1', dtype=str)
+    df = read_artifact(os.path.join(data_dir, 'artifact'))
+    assert df.shape[0] == raw.shape[0]
+    assert df['eventid'].is_monotonic_increasing
+
+    # nothing changed, nothing is built again
+    assert run(data_dir, capsys) == dict.fromkeys(etl.stage_versions, False)
+
+
+def test_changed_year(data_dir, capsys):
+    run(data_dir, capsys)
+    version = read_artifact_manifest(os.path.join(data_dir, 'artifact'))['version']
+
+    # only the year of the changed attack is cleaned again
+    raw = etl.read_raw_chunks(os.path.join(data_dir, 'globalterrorism_2020.csv'), None, keep_default_na=False)
+    raw.loc[raw.index[raw['iyear'] == '1971'][0], 'summary'] = 'changed summary'
+    write_raw(data_dir, raw)
+    etl.run(data_dir, 500, 'hashing', False)
+    assert 'partition: 1 changed years, 0 removed years' in capsys.readouterr().out
+    assert read_artifact_manifest(os.path.join(data_dir, 'artifact'))['version'] != version
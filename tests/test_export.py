@@ -0,0 +1,36 @@
+import csv
+import gzip
+import io
+
+
+def test_export_rows(dashboard, client):
+    dataset = dashboard.get_dataset()
+    response = client.get('/export?years=1980-2010&search=police&columns=eventid,iyear,summary')
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    dff = dashboard.filter_data.uncached(dataset, [1980, 2010], None, None, None, None, None, 'police', 'keyword')
+    assert rows[0] == ['eventid', 'iyear', 'summary']
+    assert [int(row[0]) for row in rows[1:]] == dff['eventid'].tolist()
+
+
+def test_export_is_not_cached(dashboard, client):
+    # the exported rows are streamed from the dataset's frame, not kept in the cache
+    store = dashboard.cache.cache._cache
+    keys = set(store)
+    response = client.get('/export?years=1975-2015&compression=gzip')
+    assert response.status_code == 200 and response.get_data()
+    assert set(store) == keys
+
+
+def test_export_of_several_chunks(dashboard, client, monkeypatch):
+    # every chunk of a large export is written, with one header
+    dataset = dashboard.get_dataset()
+    monkeypatch.setattr(dashboard.default.export_chunk_size, '_value_', 1000)
+    for query in ['', '&compression=gzip']:
+        response = client.get('/export?years=1970-2020&columns=eventid,summary' + query)
+        assert response.status_code == 200
+        data = response.get_data()
+        text = (gzip.decompress(data) if query else data).decode('utf-8')
+        rows = list(csv.reader(io.StringIO(text)))
+        assert rows[0] == ['eventid', 'summary']
+        assert [int(row[0]) for row in rows[1:]] == dataset.df['eventid'].tolist()
@@ -0,0 +1,20 @@
+import json
+from utils.FigurePool import FigurePool
+
+
+def test_pool_figures(dashboard, monkeypatch):
+    # figures built by the workers are those the callback builds
+    filters = ([1990, 2000], None, None, None, None, None, None, 'keyword')
+    tasks = dashboard.chart_tasks(dashboard.default_map_state, {'data': None, 'trigger': None}, False, filters, 'attacks',
+                                  [], set(), [])
+    expected = dashboard.build_charts(tasks)
+
+    pool = FigurePool(2, initializer=dashboard.init_figure_worker)
+    monkeypatch.setattr(dashboard, 'figure_pool', pool)
+    try:
+        figures = dashboard.build_charts(tasks)
+    finally:
+        pool.executor.shutdown()
+    assert pool.summary()['figures'] == len(tasks)
+    for chart in tasks:
+        assert json.loads(dashboard.to_json_plotly(figures[chart])) == json.loads(dashboard.to_json_plotly(expected[chart]))
@@ -0,0 +1,45 @@
+import pytest
+import utils.Figures as figures
+
+no_click = {'data': None, 'trigger': None}
+filters = ([1990, 2000], None, None, None, None, None, None, 'keyword')
+zoomed_in = {'zoom': 4, 'center': {'lat': 30, 'lon': 40}}
+
+
+@pytest.fixture(autouse=True)
+def validate_figures(monkeypatch):
+    # the figures are plain dicts, build_figure checks them with go.Figure as VALIDATE_FIGURES=1 does
+    monkeypatch.setattr(figures, 'validate_figures', True)
+
+
+def chart_figure(dashboard, chart, map_state=None, metric='attacks', playback=(), coarse=()):
+    build, args = dashboard.chart_tasks(map_state or dashboard.default_map_state, no_click, False, filters, metric,
+                                        list(playback), set(coarse), [])[chart]
+    return build(*args)
+
+
+@pytest.mark.parametrize('metric', ['attacks', 'casualties', 'attacks_per_million', 'casualties_per_million'])
+def test_map_rollup(dashboard, metric):
+    assert dashboard.map_level(dashboard.default_map_state) == 'countries'
+    chart_figure(dashboard, 'heatmap', metric=metric)
+
+
+@pytest.mark.parametrize('coarse', [(), ('heatmap',)])
+def test_map_heatmap(dashboard, coarse):
+    assert dashboard.map_level(zoomed_in) == 'attacks'
+    chart_figure(dashboard, 'heatmap', map_state=zoomed_in, coarse=coarse)
+
+
+def test_map_playback(dashboard):
+    figure = chart_figure(dashboard, 'heatmap', playback=['play'])
+    assert len(figure['frames']) == 11
+
+
+@pytest.mark.parametrize('chart', ['parallel-sets', 'beeswarm', 'scatter', 'timeline'])
+def test_chart(dashboard, chart):
+    chart_figure(dashboard, chart)
+
+
+def test_invalid_figure_fails():
+    with pytest.raises(ValueError):
+        figures.build_figure([dict(type='scatter', markers=[])], {})
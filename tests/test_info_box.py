@@ -0,0 +1,40 @@
+import json
+import pytest
+
+
+@pytest.fixture(scope='session')
+def post_click(client, callbacks):
+    # posts a click with the given customdata to the info box callback, and returns the text of the box
+    key, callback = callbacks['update_info_box']
+
+    def post(customdata):
+        body = dict(output=key, outputs=dict(id='info-box', property='children'),
+                    inputs=[dict(id='global-clickData', property='data', value=dict(data=customdata, trigger='map-heatmap.clickData'))],
+                    changedPropIds=['global-clickData.data'])
+        response = client.post('/_dash-update-component', json=body)
+        assert response.status_code == 200
+        return json.dumps(json.loads(response.get_data())['response'])
+    return post
+
+
+def customdata_of(dashboard, row):
+    dataset = dashboard.get_dataset()
+    return json.loads(dataset.df[dashboard.customdata_list].iloc[[row]].to_json(orient='values'))[0]
+
+
+def test_click_is_resolved_by_eventid(dashboard, post_click):
+    # a click from a previous dataset version may carry another row position, the attack is found by its eventid
+    dataset = dashboard.get_dataset()
+    summaries = dataset.text_store.read_column('summary')
+    row = next(r for r in range(len(summaries)) if summaries[r])
+    customdata = customdata_of(dashboard, row)
+    customdata[dashboard.customdata_list.index('text_row')] = len(dataset.df) + 10
+
+    box = post_click(customdata)
+    assert json.dumps(summaries[row])[1:-1] in box
+
+
+def test_click_on_missing_attack(dashboard, post_click):
+    customdata = customdata_of(dashboard, 0)
+    customdata[0] = -1
+    assert 'Click on an attack to see details.' in post_click(customdata)
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+from utils.Jitter import add_jitter_beeswarm, add_jitter_coordinates, hash_uniform
+
+
+def attacks():
+    return pd.DataFrame({'eventid': [197001000001, 197001000002, 197001000003, 197001000004],
+                         'latitude': [10.0, 10.0002, 40.0, np.nan],
+                         'longitude': [20.0, 20.0, -3.0, np.nan]})
+
+
+def test_jitter_is_independent_of_row_order():
+    # a point moves the same way wherever it is in the frame
+    df = add_jitter_beeswarm(add_jitter_coordinates(attacks(), 'latitude', 'longitude', 'lat', 'lon'))
+    shuffled = attacks().iloc[[3, 1, 0, 2]].reset_index(drop=True)
+    shuffled = add_jitter_beeswarm(add_jitter_coordinates(shuffled, 'latitude', 'longitude', 'lat', 'lon'))
+    pd.testing.assert_frame_equal(df.set_index('eventid').sort_index(), shuffled.set_index('eventid').sort_index())
+
+
+def test_only_near_duplicates_move():
+    df = add_jitter_coordinates(attacks(), 'latitude', 'longitude', 'lat', 'lon', jitter_amount=0.0005)
+    moved = ((df['lat'] != df['latitude']) & df['latitude'].notna()).to_numpy()
+    assert moved.tolist() == [True, True, False, False]
+    assert (np.abs(df['lat'] - df['latitude'])[moved] < 0.0005).all()
+    assert df['lat'].isna().tolist() == [False, False, False, True]
+
+
+def test_hash_uniform_range():
+    values = hash_uniform(np.arange(100000), 3, -0.2, 0.2)
+    assert values.min() >= -0.2 and values.max() < 0.2
+    assert abs(values.mean()) < 0.01
+    # a different salt gives an independent draw for the same ids
+    assert abs(np.corrcoef(values, hash_uniform(np.arange(100000), 1, -0.2, 0.2))[0, 1]) < 0.01
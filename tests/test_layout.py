@@ -0,0 +1,63 @@
+import pytest
+
+
+def find(node, component_id):
+    # props of the component with the id in a layout as json
+    if isinstance(node, dict):
+        if node.get('props', {}).get('id') == component_id:
+            return node['props']
+        node = list(node.values())
+    if isinstance(node, list):
+        for child in node:
+            props = find(child, component_id)
+            if props is not None:
+                return props
+    return None
+
+
+def get_layout(client, query):
+    # dash fetches the layout from the page, which is the referrer
+    response = client.get('/_dash-layout', headers={'Referer': 'http://localhost:8050/' + query})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+@pytest.mark.parametrize('query', ['?search=zzzzqqq', '?search=zzzzqqq&years=1990-1990&group=bogus'])
+def test_link_without_matches(client, query):
+    layout = get_layout(client, query)
+    assert find(layout, 'crossfilter-search-input')['value'] == 'zzzzqqq'
+    assert find(layout, 'chart-beeswarm')['figure']['layout']['title']
+
+
+@pytest.mark.parametrize('query', ['?years=abc', '?dates=2001-13-45_x', '?metric=bogus'])
+def test_invalid_link(dashboard, client, query):
+    layout = get_layout(client, query)
+    assert find(layout, 'crossfilter-year-slider')['value'] == dashboard.default_state['year_range']
+
+
+def test_link_that_fails_to_draw(dashboard, client, monkeypatch):
+    # the default view rather than a blank page
+    def fail(*args):
+        raise ValueError('failed')
+    monkeypatch.setattr(dashboard, 'build_chart_scatter', fail)
+    layout = get_layout(client, '?search=layout%20fallback')
+    assert find(layout, 'crossfilter-search-input')['value'] is None
+    assert find(layout, 'chart-scatter')['figure']['layout']['title']
+
+
+def test_url_state_round_trip(dashboard):
+    state = dict(dashboard.default_state, year_range=[1990, 2000], date_range=['1995-01-01', '1995-06-30'],
+                 group=['Unknown'], search='bus', metric='casualties')
+    query = dashboard.encode_url_state(state, dashboard.default_state)
+    assert dashboard.encode_url_state(dashboard.default_state, dashboard.default_state) == ''
+    options = dict(group={'Unknown'}, attacktype=set(), weapontype=set(), targettype=set(), metric={'casualties'})
+    assert dashboard.decode_url_state('http://localhost:8050/' + query, dashboard.default_state, 1970, 2019, options) == state
+
+
+def test_link_opens_its_view(client, post_charts):
+    # the figures embedded in the layout are those the callback draws for the same filters
+    layout = get_layout(client, '?years=1990-2000')
+    assert find(layout, 'crossfilter-year-slider')['value'] == [1990, 2000]
+    response = post_charts(['crossfilter-year-slider.value'], {'crossfilter-year-slider.value': [1990, 2000]}).get_json()
+    for chart in ['chart-beeswarm', 'chart-parallel-sets', 'chart-timeline']:
+        assert find(layout, chart)['figure'] == response['response'][chart]['figure']
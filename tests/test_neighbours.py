@@ -0,0 +1,39 @@
+import numpy as np
+from utils.Neighbours import build_event_features, build_knn_graph
+
+
+def test_knn_graph_probing_every_list_is_exact():
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(500, 8)).astype(np.float32)
+    features /= np.linalg.norm(features, axis=1, keepdims=True)
+    neighbours, distances = build_knn_graph(features, 5, n_lists=8, n_probe=8)
+
+    # the k most similar other rows, closest first
+    similarity = features @ features.T
+    np.fill_diagonal(similarity, -np.inf)
+    expected = np.sort(similarity, axis=1)[:, ::-1][:, :5]
+    np.testing.assert_allclose(1 - distances.astype(np.float32), expected, atol=2e-3)
+    assert not (neighbours == np.arange(500)[:, None]).any()
+    assert np.all(np.diff(distances.astype(np.float32), axis=1) >= 0)
+
+
+def test_small_lists_pad_with_missing():
+    # a row with fewer than k candidates gets -1 in the remaining places
+    features = np.eye(3, dtype=np.float32)
+    neighbours, distances = build_knn_graph(features, 4, n_lists=1, n_probe=1)
+    assert (neighbours[:, 2:] == -1).all() and np.isinf(distances[:, 2:]).all()
+    assert sorted(neighbours[0, :2].tolist()) == [1, 2]
+
+
+def test_similar_attacks(dashboard):
+    # the similar attacks of a click exclude the attack itself and are close to it
+    dataset = dashboard.get_dataset()
+    eventid = int(dataset.df['eventid'].iloc[100])
+    with dashboard.use_dataset(dataset):
+        rows = dashboard.get_similar_rows(eventid)
+    assert 0 < len(rows) <= dashboard.default.similar_count.value
+    assert 100 not in rows
+
+    features = build_event_features(dataset.df)
+    similarity = features[rows] @ features[100]
+    assert similarity.min() >= np.median(features @ features[100])
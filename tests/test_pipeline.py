@@ -0,0 +1,37 @@
+import os
+import numpy as np
+from utils.Artifact import building_directory
+from utils.Embedding import EmbeddingIndex, build_embeddings, build_ivf_index, get_encoder
+from utils.Neighbours import read_knn_graph, write_knn_graph
+
+
+def write_neighbours(path, neighbours):
+    with building_directory(path) as tmp_path:
+        write_knn_graph(neighbours, np.zeros(neighbours.shape, dtype=np.float32), tmp_path, version='v')
+
+
+def test_rewritten_neighbours_keep_mapped_data(tmp_path):
+    # a running app keeps the graph it mapped, even when the rebuild shrinks it
+    path = str(tmp_path / 'neighbours')
+    old = np.arange(4000, dtype=np.int32).reshape(-1, 4)
+    write_neighbours(path, old)
+    mapped = read_knn_graph(path)
+
+    write_neighbours(path, old[:10] + 1)
+    assert np.array_equal(mapped, old)
+    assert np.array_equal(read_knn_graph(path), old[:10] + 1)
+    assert sorted(os.listdir(tmp_path)) == ['neighbours']
+
+
+def test_rewritten_embeddings_keep_mapped_data(tmp_path):
+    path = str(tmp_path / 'embeddings')
+    encoder = get_encoder('hashing')
+    for texts in (['armed assault on a bus', 'bombing of a bridge'] * 50, ['kidnapping of a mayor']):
+        with building_directory(path) as tmp:
+            build_ivf_index(build_embeddings(texts, encoder, tmp, version='v'), tmp)
+        if len(texts) > 1:
+            mapped = EmbeddingIndex(path).embeddings
+            old = np.array(mapped)
+
+    assert np.array_equal(mapped, old)
+    assert EmbeddingIndex(path).embeddings.shape[0] == 1
@@ -0,0 +1,22 @@
+import numpy as np
+from utils.Playback import build_density_bins, build_playback_frames, build_year_summaries
+
+
+def test_density_bins(dashboard):
+    # every attack with a location is counted once, in its cell and year
+    dff = dashboard.filter_years(dashboard.get_dataset(), [1990, 2000])
+    bins = build_density_bins(dff, 1, 0.25)
+    located = dff[dff['latitude'].notna() & dff['longitude'].notna()]
+    assert bins['years'].tolist() == list(range(1990, 2001))
+    assert bins['z'].sum(axis=0).tolist() == located.groupby('iyear').size().reindex(bins['years'], fill_value=0).tolist()
+    assert bins['z'].shape == (bins['lat'].shape[0], 11)
+
+
+def test_frames_only_carry_z(dashboard):
+    dff = dashboard.filter_years(dashboard.get_dataset(), [1990, 2000])
+    bins = build_density_bins(dff, 1, 0.25)
+    frames, _, sliders = build_playback_frames(bins, build_year_summaries(dff, 1), 'Attacks in', 500)
+    years = [str(year) for year in range(1990, 2001)]
+    assert [frame['name'] for frame in frames] == [step['label'] for step in sliders[0]['steps']] == years
+    assert all(list(frame['data'][0]) == ['type', 'z'] for frame in frames)
+    np.testing.assert_array_equal(frames[3]['data'][0]['z'], bins['z'][:, 3])
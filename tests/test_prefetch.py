@@ -0,0 +1,77 @@
+import threading
+import time
+from utils.Prefetch import Prefetcher, neighbouring_year_ranges
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_neighbouring_year_ranges():
+    # one handle moved by one year first, then by two, within the slider
+    assert neighbouring_year_ranges([1970, 1975], 1970, 2020) == [
+        [1970, 1976], [1970, 1974], [1971, 1975], [1970, 1977], [1970, 1973], [1972, 1975]]
+    assert neighbouring_year_ranges([2020, 2020], 1970, 2020) == [[2019, 2020], [2018, 2020]]
+
+
+def test_pending_keys_are_not_submitted_again():
+    prefetcher = Prefetcher(max_workers=1, max_pending=2)
+    release = threading.Event()
+    prefetcher.submit('a', release.wait)
+    prefetcher.submit('a', release.wait)
+    prefetcher.submit('b', release.wait)
+    prefetcher.submit('c', release.wait)
+    assert prefetcher.stats['submitted'] == 2 and prefetcher.stats['rejected'] == 2
+
+    release.set()
+    assert wait_until(lambda: prefetcher.stats['completed'] == 2)
+    assert not prefetcher.pending
+
+
+def test_live_requests_go_first():
+    prefetcher = Prefetcher(max_workers=1, max_wait=5)
+    started = threading.Event()
+    finish = threading.Event()
+    ran = []
+
+    @prefetcher.live
+    def request():
+        started.set()
+        finish.wait()
+
+    live = threading.Thread(target=request)
+    live.start()
+    started.wait()
+    prefetcher.submit('a', ran.append, 'a')
+    time.sleep(0.1)
+    assert ran == []
+
+    finish.set()
+    live.join()
+    assert wait_until(lambda: ran == ['a'])
+
+
+def test_dropped_when_requests_keep_coming():
+    prefetcher = Prefetcher(max_workers=1, max_wait=0.1)
+    ran = []
+    prefetcher.live_requests = 1
+    prefetcher.submit('a', ran.append, 'a')
+    assert wait_until(lambda: prefetcher.stats['dropped'] == 1)
+    assert ran == [] and not prefetcher.pending
+
+
+def test_cpu_budget():
+    # once prefetching has used its share of the cpu, new work is rejected until the window passes
+    prefetcher = Prefetcher(max_workers=1, cpu_budget=0.01, window=10)
+
+    def busy():
+        start = time.thread_time()
+        while time.thread_time() - start < 0.15:
+            pass
+    prefetcher.submit('a', busy)
+    assert wait_until(lambda: prefetcher.stats['completed'] == 1)
+    prefetcher.submit('b', busy)
+    assert prefetcher.stats == dict(submitted=1, rejected=1, dropped=0, completed=1, failed=0)
@@ -0,0 +1,55 @@
+import json
+import pytest
+from conftest import default_states
+
+
+@pytest.fixture
+def post_refine(client, callbacks):
+    # posts a refinement requested by the charts callback, and returns the response
+    key, _ = callbacks['refine_charts']
+
+    def post(refine):
+        body = dict(output=key,
+                    outputs=[dict(id=output.split('.')[0], property=output.split('.')[1]) for output in key.strip('.').split('...')],
+                    inputs=[dict(id='refine-request', property='data', value=refine)],
+                    state=[dict(id='map-state', property='data', value=default_states['map-state.data']),
+                           dict(id='session-id', property='data', value=default_states['session-id.data'])],
+                    changedPropIds=['refine-request.data'])
+        return client.post('/_dash-update-component', json=body)
+    return post
+
+
+@pytest.fixture
+def large_results(dashboard, monkeypatch):
+    # every result of more than 100 attacks is drawn coarse first, the beeswarm with a sample of 100
+    monkeypatch.setattr(dashboard.default.progressive_rows, '_value_', 100)
+    monkeypatch.setattr(dashboard.default.coarse_sample_size, '_value_', 100)
+
+
+def changed_years(post_charts, year_range):
+    response = post_charts(['crossfilter-year-slider.value'], {'crossfilter-year-slider.value': year_range})
+    return json.loads(response.get_data())['response']
+
+
+def test_coarse_then_full(post_charts, post_refine, large_results):
+    response = changed_years(post_charts, [1990, 2000])
+    refine = response['refine-request']['data']
+    assert refine['charts'] == ['beeswarm', 'heatmap']
+
+    refined = json.loads(post_refine(refine).get_data())['response']
+    assert set(refined) == {'map-heatmap', 'chart-beeswarm'}
+    assert refined['chart-beeswarm']['figure'] != response['chart-beeswarm']['figure']
+    assert refined['map-heatmap']['figure'] != response['map-heatmap']['figure']
+
+
+def test_superseded_refinement_is_dropped(post_charts, post_refine, large_results):
+    # the user moved on before the first refinement ran, only the latest is drawn
+    first = changed_years(post_charts, [1990, 2000])['refine-request']['data']
+    latest = changed_years(post_charts, [1995, 2005])['refine-request']['data']
+    assert post_refine(first).status_code == 204
+    assert post_refine(latest).status_code == 200
+
+
+def test_small_results_are_drawn_in_full(post_charts):
+    response = changed_years(post_charts, [1990, 2000])
+    assert 'refine-request' not in response
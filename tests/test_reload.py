@@ -0,0 +1,44 @@
+import copy
+import pytest
+
+
+@pytest.fixture
+def new_version(dashboard, monkeypatch):
+    # the pipeline has written a new version, here the same data under another version
+    loaded = copy.copy(dashboard.get_dataset())
+    loaded.version = 'reloaded'
+    monkeypatch.setattr(dashboard, 'dataset', dashboard.get_dataset())
+    monkeypatch.setattr(dashboard, 'Dataset', lambda path: loaded)
+    monkeypatch.setattr(dashboard, 'read_dataset_version', lambda path: 'reloaded')
+    return loaded
+
+
+def test_reload(dashboard, client, new_version):
+    previous = dashboard.get_dataset()
+    with dashboard.use_dataset(previous):
+        dashboard.reload_dataset()
+        # a request that started before the swap keeps its version
+        assert dashboard.get_dataset() is previous
+    assert dashboard.get_dataset() is new_version
+    assert client.get('/api/v1').get_json()['version'] == 'reloaded'
+    assert client.get('/readyz').get_json()['version'] == 'reloaded'
+
+
+def test_version_changed_while_loading(dashboard, new_version, monkeypatch):
+    # a load that is outdated once it finishes is not swapped in
+    previous = dashboard.get_dataset()
+    monkeypatch.setattr(dashboard, 'read_dataset_version', lambda path: 'newer')
+    dashboard.reload_dataset()
+    assert dashboard.get_dataset() is previous
+
+
+def test_failed_reload_keeps_serving(dashboard, client, monkeypatch):
+    def fail(path):
+        raise OSError('truncated')
+    previous = dashboard.get_dataset()
+    monkeypatch.setattr(dashboard, 'dataset', previous)
+    monkeypatch.setattr(dashboard, 'Dataset', fail)
+    with pytest.raises(OSError):
+        dashboard.reload_dataset()
+    assert dashboard.get_dataset() is previous
+    assert client.get('/readyz').status_code == 200
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def region_rates(dataset, dff, values):
+    # per region and year, the total of the countries with a known population over their population
+    population_years = dataset.population_years
+    country_id = dff['country_id'].to_numpy()
+    years = dff['iyear'].to_numpy() - population_years[0]
+    region_id = dataset.countries['region_id'].to_numpy()
+    known = ~np.isnan(dataset.population[country_id, years])
+    rates = np.zeros(len(dataset.regions))
+    totals = pd.DataFrame({'region': region_id[country_id][known], 'year': years[known], 'value': values[known]})
+    for (region, year), total in totals.groupby(['region', 'year'])['value'].sum().items():
+        population = np.nansum(dataset.population[region_id == region, year])
+        rates[region] += total * 1e6 / population
+    return rates
+
+
+@pytest.mark.parametrize('search', [None, 'police'])
+@pytest.mark.parametrize('metric', ['attacks_per_million', 'casualties_per_million'])
+def test_region_rates(dashboard, metric, search):
+    dataset = dashboard.get_dataset()
+    dff = dashboard.filter_data.uncached(dataset, [1990, 2010], None, None, None, None, None, search, 'keyword')
+    values = np.ones(dff.shape[0]) if metric == 'attacks_per_million' else dff['total_casualties'].fillna(0).to_numpy()
+    totals = dashboard.country_totals([1990, 2010], None, None, None, None, None, search, 'keyword', metric)
+    assert np.allclose(totals['region'], region_rates(dataset, dff, values))
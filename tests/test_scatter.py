@@ -0,0 +1,45 @@
+import json
+import numpy as np
+from utils.Sampling import log_cells
+
+filters = ([1970, 2019], None, None, None, None, None, None, 'keyword')
+
+
+def test_log_cells():
+    assert log_cells(np.array([0, 1, 2, 9, 10, 99, 100]), 2).tolist() == [0, 0, 0, 2, 2, 4, 4]
+
+
+def scatter_groups(figure):
+    # groups drawn as markers and number of groups per cell
+    groups = [row[0] for trace in figure['data'][:2] for row in trace['customdata']]
+    cells = {row[3]: int(row[0].split()[0]) for row in figure['data'][2]['customdata']}
+    return groups, cells
+
+
+def test_every_group_is_drawn_once(dashboard):
+    figure = dashboard.build_chart_scatter(*filters)
+    groups, cells = scatter_groups(figure)
+    n_groups = dashboard.filter_years(dashboard.get_dataset(), filters[0])['gname'].nunique()
+    assert len(groups) == len(set(groups)) and len(groups) + sum(cells.values()) == n_groups
+    assert cells and len(figure['data'][2]['customdata']) < sum(cells.values())
+
+
+def test_expanded_cell(dashboard):
+    # the groups of an expanded cell are drawn as markers, the others stay in their cells
+    groups, cells = scatter_groups(dashboard.build_chart_scatter(*filters))
+    cell = max(cells, key=cells.get)
+    expanded_groups, expanded_cells = scatter_groups(dashboard.build_chart_scatter(*filters, [cell]))
+    assert expanded_cells == {c: n for c, n in cells.items() if c != cell}
+    assert len(expanded_groups) == len(groups) + cells[cell]
+
+
+def test_click_on_cell(post_charts):
+    # a click on a cell only redraws the scatter, with the cell expanded
+    figure = json.loads(post_charts(['crossfilter-year-slider.value'], {'crossfilter-year-slider.value': [1970, 2019]})
+                        .get_data())['response']['chart-scatter']['figure']
+    cell = figure['data'][2]['customdata'][0]
+    response = json.loads(post_charts(['chart-scatter.clickData'],
+                                      {'crossfilter-year-slider.value': [1970, 2019],
+                                       'chart-scatter.clickData': {'points': [{'customdata': cell}]}}).get_data())['response']
+    assert response['scatter-expanded']['data'] == [cell[3]]
+    assert set(response) & {'map-heatmap', 'chart-beeswarm', 'chart-parallel-sets', 'chart-timeline'} == set()
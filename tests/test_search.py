@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from utils.Search import SearchIndex, build_search_index
+
+summaries = ['A bomb exploded on a bus in the city.', None, 'Gunmen attacked a police station.',
+             'A bomb was found near the police station and defused.', 'Assailants kidnapped the mayor.']
+
+
+@pytest.fixture(scope='module')
+def index(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('search'))
+    build_search_index(summaries, path, version='v')
+    return SearchIndex(path)
+
+
+def test_search(index):
+    # rows sharing terms with the query, best match first, positions lining up with missing summaries
+    rows, scores = index.search('police station bomb')
+    assert rows.tolist() == [3, 2, 0]
+    assert np.all(np.diff(scores) < 0)
+    assert index.manifest['n_rows'] == len(summaries)
+
+
+def test_search_restricted_rows(index):
+    assert index.search('bomb', rows=np.array([2, 3, 4]))[0].tolist() == [3]
+    assert index.search('bomb', k=1)[0].shape[0] == 1
+
+
+def test_search_without_known_terms(index):
+    rows, scores = index.search('zzzzqqq')
+    assert rows.shape[0] == 0 and scores.shape[0] == 0
@@ -0,0 +1,24 @@
+import json
+import os
+import snapshots
+
+
+def test_read_states(tmp_path):
+    path = tmp_path / 'states.txt'
+    path.write_text('# report figures\n1990s/bombings ?years=1990-1999&attacktype=Bombing%2FExplosion\n\n'
+                    '?years=2001-2010&metric=casualties\n')
+    assert snapshots.read_states(str(path)) == [('1990s-bombings', '?years=1990-1999&attacktype=Bombing%2FExplosion'),
+                                                ('001', '?years=2001-2010&metric=casualties')]
+
+
+def test_run(dashboard, tmp_path, capsys):
+    # every chart of every state, built in a spawned worker
+    states = tmp_path / 'states.txt'
+    states.write_text('nineties ?years=1990-1999\n?years=2001-2010&metric=casualties\n')
+    snapshots.run(str(states), str(tmp_path / 'out'), ['json'], 1)
+
+    for name in ['nineties', '001']:
+        assert sorted(os.listdir(tmp_path / 'out' / name)) == sorted(f'{chart}.json' for chart in snapshots.figure_builders)
+    with open(tmp_path / 'out' / 'nineties' / 'timeline.json') as f:
+        assert json.load(f)['data']
+    assert '2 states, 10 figures' in capsys.readouterr().out
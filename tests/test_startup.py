@@ -0,0 +1,35 @@
+import threading
+import pytest
+
+
+def test_ready(dashboard, client):
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['status'] == 'ready' and body['version'] == dashboard.get_dataset().version
+    assert set(dashboard.startup_phases) <= set(body['timings'])
+    assert client.get('/healthz').get_json() == dict(status='ok')
+
+
+@pytest.fixture
+def loading(dashboard, monkeypatch):
+    # the state of the app while the dataset is loaded in the background
+    monkeypatch.setattr(dashboard, 'dataset_loaded', threading.Event())
+    monkeypatch.setattr(dashboard, 'dataset', None)
+    monkeypatch.setitem(dashboard.startup, 'timings', {'artifact': 0.5})
+
+
+def test_loading(dashboard, client, loading):
+    # the server answers while loading, with the phase it is in and a page that waits for it
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'loading' and response.get_json()['phase'] == 'text_store'
+    assert client.get('/healthz').status_code == 200
+    assert 'startup-interval' in client.get('/_dash-layout').get_data(as_text=True)
+
+
+def test_failed(dashboard, client, loading, monkeypatch):
+    # a dataset that fails to load fails the health check, so the process is restarted
+    monkeypatch.setitem(dashboard.startup, 'error', "FileNotFoundError('manifest.json')")
+    assert client.get('/healthz').status_code == 500
+    assert client.get('/readyz').get_json()['status'] == 'failed'
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+from utils.TextStore import TextStore, write_text_store
+
+
+def test_rows_round_trip(tmp_path):
+    # missing values, empty strings and multi byte characters come back as written
+    df = pd.DataFrame({'summary': ['Bombing in Zürich', None, '', 'Attentat à Paris – 2015'],
+                       'motive': [None, None, None, None]})
+    write_text_store(df, ['summary', 'motive'], str(tmp_path))
+    store = TextStore(str(tmp_path))
+
+    assert [store.get('summary', row) for row in range(4)] == ['Bombing in Zürich', None, '', 'Attentat à Paris – 2015']
+    assert store.read_column('summary') == [store.get('summary', row) for row in range(4)]
+    assert store.get_row(3) == {'summary': 'Attentat à Paris – 2015', 'motive': None}
+    assert store.read_column('motive') == [None] * 4
+
+
+def test_store_of_the_dataset(dashboard):
+    # the text fields are not in the frame, and the store has a row per attack
+    dataset = dashboard.get_dataset()
+    assert not set(dashboard.text_columns) & set(dataset.df.columns)
+    assert dataset.text_store.n_rows == dataset.df.shape[0]
+    assert isinstance(dataset.text_store.offsets['summary'], np.memmap)
@@ -0,0 +1,35 @@
+import base64
+import numpy as np
+from utils.Timeline import day_codes, n_day_codes, period_starts, rollup, snap_date_range
+
+
+def bar_values(trace):
+    y = trace['y']
+    return np.frombuffer(base64.b64decode(y['bdata']), dtype=y['dtype']) if isinstance(y, dict) else np.asarray(y)
+
+
+def test_monthly_rollup(dashboard):
+    # attacks per day rolled up into months equal the attacks of known date per month
+    dataset = dashboard.get_dataset()
+    dff = dashboard.filter_years(dataset, [1990, 2000])
+    per_day = np.bincount(day_codes(dff['date'], dataset.year_min), minlength=n_day_codes(dataset.year_min, dataset.year_max))
+    starts = period_starts([1990, 2000], 'month')
+    expected = dff.groupby(dff['date'].dt.to_period('M')).size().reindex(starts.to_period('M'), fill_value=0)
+    assert rollup(per_day, dataset.year_min, starts, 2000).tolist() == expected.tolist()
+
+
+def test_timeline_counts_attacks_of_known_date(dashboard):
+    dff = dashboard.filter_years(dashboard.get_dataset(), [1990, 2000])
+    figure = dashboard.build_chart_timeline([1990, 2000], ['1995-01-01', '1995-12-31'], None, None, None, None, None, 'keyword')
+    highlighted = figure['data'][1]
+    assert sum(bar_values(trace).sum() for trace in figure['data'][:2]) == dff['date'].notna().sum()
+    assert bar_values(highlighted).sum() == (dff['date'].dt.year == 1995).sum()
+
+
+def test_snap_date_range():
+    # a brush is widened to the whole months or weeks it touches
+    months = period_starts([2001, 2002], 'month')
+    assert snap_date_range(['2001-03-15', '2001-05-02'], months, 2002) == ['2001-03-01', '2001-05-31']
+    assert snap_date_range(['2002-12-20', '2003-02-01'], months, 2002) == ['2002-12-01', '2002-12-31']
+    weeks = period_starts([2001, 2001], 'week')
+    assert snap_date_range(['2001-01-09', '2001-01-10'], weeks, 2001) == ['2001-01-08', '2001-01-14']